@@ -0,0 +1,81 @@
+"""
+定点金额模块
+金额以int64"分"计算和汇总，避免浮点数累加产生的分位误差
+标准成本差异计算系统（命令行版、图形界面版）、计算增值税.py和时间的货币价值.py共用本模块的舍入规则
+"""
+
+import numpy as np
+
+CENTS_PER_YUAN = 100
+ROUND_HALF_UP = "half_up"  # 四舍五入（0.5远离零进位）
+ROUND_HALF_EVEN = "half_even"  # 银行家舍入（四舍六入五成双）
+MONEY_ROUNDING = ROUND_HALF_UP  # 系统默认舍入规则
+
+
+def round_cents(scaled, rounding=None):
+    """
+    以分为单位的金额按舍入规则取整
+    参数:
+        scaled (float/array): 以分为单位、可能带小数的金额
+        rounding (str): 舍入规则，ROUND_HALF_UP或ROUND_HALF_EVEN，缺省为MONEY_ROUNDING
+    返回:
+        int/ndarray: 整数分（数组时为int64）
+    """
+    rounding = rounding or MONEY_ROUNDING
+    # 先消除二进制表示误差（如2.675元×100=267.49999999999997分），再按规则处理恰为0.5分的尾数
+    scaled = np.round(np.asarray(scaled, dtype=np.float64), 4)
+    if rounding == ROUND_HALF_UP:
+        cents = np.copysign(np.floor(np.abs(scaled) + 0.5), scaled)
+    elif rounding == ROUND_HALF_EVEN:
+        cents = np.rint(scaled)
+    else:
+        raise ValueError("未知的舍入规则：{}".format(rounding))
+    cents = cents.astype(np.int64)
+    return int(cents) if cents.ndim == 0 else cents
+
+
+def to_cents(amounts, rounding=None):
+    """
+    金额（元）转换为整数分
+    参数:
+        amounts (float/array): 金额（元）
+        rounding (str): 舍入规则，缺省为MONEY_ROUNDING
+    返回:
+        int/ndarray: 整数分
+    """
+    return round_cents(np.asarray(amounts, dtype=np.float64) * CENTS_PER_YUAN, rounding)
+
+
+def to_yuan(cents):
+    """整数分转换为元（浮点数，为最接近该金额的二进制值，供导出和存储使用）"""
+    return cents / CENTS_PER_YUAN
+
+
+def format_cents(cents, signed=True):
+    """
+    整数分格式化为带千分位的金额字符串，不经过浮点数
+    参数:
+        cents (int): 金额（分）
+        signed (bool): 是否总是显示正负号
+    返回:
+        str: 如 "+1,234.56"
+    """
+    cents = int(cents)
+    sign = "-" if cents < 0 else ("+" if signed else "")
+    yuan, fen = divmod(abs(cents), CENTS_PER_YUAN)
+    return "{}{:,}.{:02d}".format(sign, yuan, fen)
+
+
+def group_sum(groups, values, size):
+    """
+    按分组序号对整数求和，全程int64累加（np.bincount的权重会先转换为float64）
+    参数:
+        groups (array): 每个值的分组序号
+        values (array): 整数值，如金额（分）、产品数量
+        size (int): 分组数
+    返回:
+        ndarray: 各分组的合计（int64）
+    """
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, groups, np.asarray(values, dtype=np.int64))
+    return totals
@@ -0,0 +1,176 @@
+"""
+批量计算增量缓存测试
+未变化的块复用缓存、参数变化使缓存失效、按大小上限淘汰，以及写入历史记录时按文件位置去重
+运行: python -m unittest discover tests
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # 脚本导入同目录下的money等模块
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+CLI = load_script("标准成本差异计算系统2.0.py", "cost_cli")
+
+HEADER = "产品名称,计算类型,生产数量,实际用量,实际单价,实际成本\n"
+CHUNK_ROWS = 4  # 测试时每块的行数
+
+
+def make_rows(count, start=0):
+    rows = []
+    for i in range(start, start + count):
+        if i % 2:
+            rows.append("产品{},固定制造费用成本差异,{},,,{}\n".format(i % 3, i % 5 + 1, 10 + i))
+        else:
+            rows.append("产品{},直接材料成本差异,{},{},2.5,\n".format(i % 3, i % 5 + 1, i % 4 + 1))
+    return rows
+
+
+class BatchJobTestCase(unittest.TestCase):
+    """临时目录、缓存和小块行数"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = CLI.BatchCache(os.path.join(self.directory, "缓存"))
+        patcher = mock.patch.object(CLI.BatchCache, "CHUNK_ROWS", CHUNK_ROWS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, rows, mode="w"):
+        filename = os.path.join(self.directory, name)
+        with open(filename, mode, encoding="utf-8") as f:
+            if mode == "w":
+                f.write(HEADER)
+            f.writelines(rows)
+        return filename
+
+    def run_job(self, filename, history=None):
+        return CLI.run_batch_job(filename, self.cache, history)
+
+
+class BatchCacheTest(BatchJobTestCase):
+
+    def test_unchanged_chunks_reused(self):
+        filename = self.write("批量.csv", make_rows(10))
+        first = self.run_job(filename)
+        self.assertEqual((first.computed, first.reused, first.rows, first.valid), (3, 0, 10, 10))
+        second = self.run_job(filename)
+        self.assertEqual((second.computed, second.reused), (0, 3))
+        self.assertEqual(second.type_totals, first.type_totals)
+
+    def test_appended_rows_recompute_tail_only(self):
+        filename = self.write("批量.csv", make_rows(10))
+        self.run_job(filename)
+        self.write("批量.csv", make_rows(5, start=10), mode="a")
+        summary = self.run_job(filename)
+        # 原来不完整的第3块和新增的第4块重新计算
+        self.assertEqual((summary.computed, summary.reused, summary.rows), (2, 2, 15))
+        fresh = CLI.run_batch_job(filename, CLI.BatchCache(os.path.join(self.directory, "新缓存")))
+        self.assertEqual(summary.type_totals, fresh.type_totals)
+
+    def test_params_change_invalidates(self):
+        filename = self.write("批量.csv", make_rows(8))
+        before = self.run_job(filename)
+        with mock.patch.object(CLI.StandardParams, "MATERIAL_PRICE", 3.0):
+            after = self.run_job(filename)
+        self.assertEqual(after.computed, 2)
+        self.assertNotEqual(after.type_totals["直接材料成本差异"], before.type_totals["直接材料成本差异"])
+        self.assertEqual(after.type_totals["固定制造费用成本差异"], before.type_totals["固定制造费用成本差异"])
+
+    def test_eviction_keeps_recent_chunks(self):
+        old = self.write("旧.csv", make_rows(4))
+        self.run_job(old)
+        chunk_size = max(entry["size"] for entry in self.cache.index.values())
+        self.cache.max_bytes = chunk_size * 2
+        new = self.write("新.csv", make_rows(8, start=100))
+        self.run_job(new)
+        self.assertEqual(len(self.cache.index), 2)
+        self.assertEqual(self.run_job(new).reused, 2)
+        self.assertEqual(self.run_job(old).computed, 1)
+        files = [name for name in os.listdir(self.cache.directory) if name.endswith(".npz")]
+        self.assertEqual(len(files), len(self.cache.index))
+
+    def test_cache_index_persisted(self):
+        filename = self.write("批量.csv", make_rows(6))
+        self.run_job(filename)
+        self.cache = CLI.BatchCache(self.cache.directory)
+        self.assertEqual(self.run_job(filename).reused, 2)
+
+
+class BatchHistoryTest(BatchJobTestCase):
+    """计算结果写入历史记录"""
+
+    def setUp(self):
+        super().setUp()
+        self.history = CLI.HistoryManager(os.path.join(self.directory, "历史.hkh"))
+
+    def tearDown(self):
+        self.history.close()
+        super().tearDown()
+
+    def test_same_rows_in_another_file_are_saved(self):
+        rows = make_rows(6)
+        january = self.write("jan.csv", rows)
+        february = self.write("feb.csv", rows)
+        self.assertEqual(self.run_job(january, self.history).saved, 6)
+        summary = self.run_job(february, self.history)
+        # 内容相同的块复用缓存，但仍写入历史记录
+        self.assertEqual((summary.reused, summary.saved), (2, 6))
+        self.assertEqual(self.run_job(january, self.history).saved, 0)
+        self.assertEqual(len(self.history.records), 12)
+
+    def test_repeated_chunks_within_file_are_saved(self):
+        filename = self.write("批量.csv", make_rows(4) * 3)
+        self.assertEqual(self.run_job(filename, self.history).saved, 12)
+
+    def test_appended_rows_saved_once(self):
+        filename = self.write("批量.csv", make_rows(6))
+        self.run_job(filename, self.history)
+        self.write("批量.csv", make_rows(3, start=6), mode="a")
+        self.assertEqual(self.run_job(filename, self.history).saved, 3)
+        self.history.close()
+        self.history = CLI.HistoryManager(self.history.store.filename)
+        self.assertEqual(self.run_job(filename, self.history).saved, 0)
+        self.assertEqual(len(self.history.records), 9)
+
+    def test_legacy_ledger(self):
+        filename = self.write("批量.csv", make_rows(4))
+        self.run_job(filename, self.history)
+        ledger_path = self.history.store.filename + ".batches.json"
+        with open(ledger_path, encoding="utf-8") as f:
+            chunks = json.load(f)["chunks"]
+        with open(ledger_path, "w", encoding="utf-8") as f:
+            json.dump({"keys": [key for key, _ in chunks.values()], "tails": chunks}, f)
+        self.history.close()
+        self.history = CLI.HistoryManager(self.history.store.filename)
+        self.assertEqual(self.run_job(filename, self.history).saved, 0)
+
+    def test_unreadable_file_writes_nothing(self):
+        filename = self.write("批量.csv", make_rows(4))
+        with open(filename, "ab") as f:
+            f.write(b"\xff\xfe\n")
+        with self.assertRaises(UnicodeDecodeError):
+            self.run_job(filename, self.history)
+        self.assertEqual(len(self.history.records), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+不规则现金流折现测试
+计息天数惯例、XNPV/NPV计算、不规则数组的构建与导入
+运行: python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "不规则现金流折现.py")
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+CF = load_script("不规则现金流折现.py", "cash_flow")
+
+
+def dates(*values):
+    return np.array(values, dtype="datetime64[D]")
+
+
+class DayCountTest(unittest.TestCase):
+
+    def test_actual_conventions(self):
+        start, end = dates("2024-01-01"), dates("2024-12-31")
+        self.assertAlmostEqual(CF.DAY_COUNT_CONVENTIONS["ACT/365"](start, end)[0], 365 / 365)
+        self.assertAlmostEqual(CF.DAY_COUNT_CONVENTIONS["ACT/360"](start, end)[0], 365 / 360)
+
+    def test_thirty_360(self):
+        thirty_360 = CF.DAY_COUNT_CONVENTIONS["30/360"]
+        start = dates("2024-01-15", "2024-01-31", "2024-01-30", "2024-01-15", "2023-02-28")
+        end = dates("2024-07-15", "2024-03-31", "2024-03-31", "2024-03-31", "2024-02-29")
+        # 起始日31日按30日计；起始日为30/31日时到期日31日按30日计；起始日不是月末时到期日31日照计
+        expected = [180, 60, 60, 76, 361]
+        np.testing.assert_allclose(thirty_360(start, end) * 360, expected)
+
+
+class CashFlowPortfoliosTest(unittest.TestCase):
+
+    def setUp(self):
+        # Excel XNPV帮助中的示例，年利率9%时XNPV为2086.65
+        self.excel = [("2008-01-01", -10000), ("2008-03-01", 2750), ("2008-10-30", 4250),
+                      ("2009-02-15", 3250), ("2009-04-01", 2750)]
+
+    def build(self, rows):
+        names, flow_dates, values = zip(*rows)
+        return CF.CashFlowPortfolios.from_rows(names, flow_dates, values)
+
+    def test_xnpv_matches_excel(self):
+        portfolios = self.build([("示例",) + row for row in self.excel])
+        self.assertAlmostEqual(portfolios.xnpv(0.09)[0], 2086.6476, places=3)
+
+    def test_rows_sorted_within_portfolio(self):
+        shuffled = [("示例",) + row for row in reversed(self.excel)] + [("另一组", "2020-01-01", -1.0)]
+        portfolios = self.build(shuffled)
+        self.assertEqual(portfolios.names, ["示例", "另一组"])
+        np.testing.assert_array_equal(portfolios.offsets, [0, 5, 6])
+        self.assertEqual(str(portfolios.dates[0]), "2008-01-01")
+        self.assertAlmostEqual(portfolios.xnpv(0.09)[0], 2086.6476, places=3)
+
+    def test_valuation_date_and_conventions(self):
+        portfolios = self.build([("A", "2024-01-01", 100.0), ("B", "2024-07-01", 100.0)])
+        results = portfolios.xnpv(0.1, "ACT/360", "2023-01-01")
+        expected = [100 / 1.1 ** (365 / 360), 100 / 1.1 ** (547 / 360)]
+        np.testing.assert_allclose(results, expected)
+        # 缺省基准日为各组合首笔日期
+        np.testing.assert_allclose(portfolios.xnpv(0.1), [100.0, 100.0])
+        with self.assertRaises(ValueError):
+            portfolios.xnpv(0.1, "ACT/ACT")
+
+    def test_npv_by_period(self):
+        portfolios = self.build([("A", "2024-01-01", -100.0), ("A", "2024-03-01", 60.0), ("A", "2025-06-01", 60.0),
+                                 ("B", "2024-01-01", 10.0)])
+        np.testing.assert_allclose(portfolios.npv(0.1), [-100 + 60 / 1.1 + 60 / 1.21, 10.0])
+        np.testing.assert_allclose(portfolios.npv([0.1, 0.5]), [-100 + 60 / 1.1 + 60 / 1.21, 10.0])
+        with self.assertRaises(ValueError):
+            portfolios.npv([0.1, 0.2, 0.3])
+
+    def test_to_rows_round_trip(self):
+        portfolios = self.build([("A", "2024-02-01", 2.0), ("B", "2024-01-01", 3.0), ("A", "2024-01-01", 1.0)])
+        rebuilt = CF.CashFlowPortfolios.from_rows(*portfolios.to_rows())
+        self.assertEqual(rebuilt.names, portfolios.names)
+        np.testing.assert_array_equal(rebuilt.offsets, portfolios.offsets)
+        np.testing.assert_array_equal(rebuilt.dates, portfolios.dates)
+        np.testing.assert_array_equal(rebuilt.values, portfolios.values)
+
+
+class CsvImportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "现金流.csv")
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write("组合名称,日期,金额\nX,2024-01-01,-100\nX,2024-07-01,110\nY,2024-02-01,-50\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_columns(self):
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write("组合名称,金额\nX,1\n")
+        with self.assertRaisesRegex(ValueError, "日期"):
+            CF.CashFlowPortfolios.from_csv(self.filename)
+
+    def test_import_keeps_manual_portfolios(self):
+        # 先录入A，再导入X、Y，再录入B：四个组合都要保留
+        commands = ["1", "A", "2024-01-01,-100", "2024-12-31,108", "",
+                    "2", self.filename,
+                    "1", "B", "2024-01-01,-1", "2024-06-01,2", "",
+                    "4", "5", "q"]
+        output = subprocess.run([sys.executable, SCRIPT], input="\n".join(commands) + "\n", capture_output=True,
+                                text=True, encoding="utf-8", cwd=self.directory, check=True).stdout
+        table = output.split("【NPV】")[-1]
+        for name in ("A", "X", "Y", "B"):
+            self.assertRegex(table, r"\n{}\s".format(name))
+        self.assertIn("当前共3个组合", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+历史文件格式兼容性测试
+命令行版和图形界面版都从variance_core导入BinaryHistoryStore，两者读写同一种历史文件，
+任一方写入的文件都必须能被另一方完整读出
+运行: python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # 脚本导入同目录下的money等模块
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文和括号，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+import variance_core as core  # noqa: E402
+
+CLI = load_script("标准成本差异计算系统2.0.py", "cost_cli")
+GUI = load_script("标准成本差异计算系统2.0(GUI版).py", "cost_gui")
+
+ROWS = [
+    ("产品A", 10, "直接材料成本差异", 12.5, 133.5, datetime(2024, 1, 15, 8, 30)),
+    ("产品B", 3, "固定制造费用成本差异", -0.07, None, None),
+    ("产品A", 7, "直接人工标准成本差异", 1234567.89, 1234609.89, datetime(2024, 2, 1)),
+]
+
+
+class HistoryFileFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "历史.hkh")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_apps_share_engine(self):
+        for name in ("HistoryManager", "ReportGenerator", "SensitivityAnalyzer", "StandardParams",
+                     "VARIANCE_TYPES", "VARIANCE_VALIDATOR"):
+            self.assertIs(getattr(CLI, name), getattr(core, name), name)
+            self.assertIs(getattr(GUI, name), getattr(core, name), name)
+
+    def test_records_round_trip(self):
+        store = core.BinaryHistoryStore(self.filename)
+        store.append_many(ROWS[:2])
+        store.append(*ROWS[2])
+        store.close()
+
+        store = core.BinaryHistoryStore(self.filename)
+        try:
+            records = list(store)
+        finally:
+            store.close()
+        self.assertEqual(len(records), len(ROWS))
+        for record, (product, quantity, calc_type, result, actual_cost, moment) in zip(records, ROWS):
+            self.assertEqual(record["产品名称"], product)
+            self.assertEqual(record["产品数量"], quantity)
+            self.assertEqual(record["计算类型"], calc_type)
+            self.assertEqual(record["结果"], result)
+            self.assertEqual(record["实际成本"], actual_cost)
+            self.assertEqual(record["时间"], moment)
+
+    def test_appending_from_both_apps(self):
+        history = CLI.HistoryManager(self.filename)
+        history.add_record(*ROWS[0][:4])
+        history.close()
+        history = GUI.HistoryManager(self.filename)
+        history.add_record(*ROWS[1][:4])
+        history.close()
+        history = CLI.HistoryManager(self.filename)
+        try:
+            self.assertEqual([record["产品名称"] for record in history.records], ["产品A", "产品B"])
+        finally:
+            history.close()
+
+    def test_type_codes_round_trip(self):
+        history = CLI.HistoryManager(self.filename)
+        for quantity, calc_type in enumerate(CLI.VARIANCE_TYPES, 1):
+            history.add_record("产品A", quantity, calc_type, 1.0)
+        history.close()
+
+        history = GUI.HistoryManager(self.filename)
+        try:
+            data, strings = history.columns()
+            self.assertEqual([strings[code] for code in data["calc_type"]], list(GUI.VARIANCE_TYPES))
+            history.index.refresh()
+            for quantity, calc_type in enumerate(GUI.VARIANCE_TYPES, 1):
+                rows = history.index.exact_rows("calc_type", calc_type)
+                self.assertEqual(data["quantity"][rows].tolist(), [quantity])
+            quantities, _ = core.SensitivityAnalyzer(history)._summarize()
+            self.assertEqual(set(quantities), set(GUI.VARIANCE_TYPES))
+        finally:
+            history.close()
+
+    def test_legacy_gui_type_names_renamed(self):
+        store = core.BinaryHistoryStore(self.filename)
+        store.append_many([("产品A", 2, legacy, 1.0, None, None) for legacy in core.LEGACY_TYPE_NAMES])
+        store.append("产品A", 3, "直接人工标准成本差异", 2.0)
+        store.close()
+
+        for _ in range(2):
+            store = core.BinaryHistoryStore(self.filename)
+            try:
+                self.assertEqual([record["计算类型"] for record in store],
+                                 list(core.LEGACY_TYPE_NAMES.values()) + ["直接人工标准成本差异"])
+                data = store.data
+                self.assertEqual(data["calc_type"][0], data["calc_type"][3])
+            finally:
+                store.close()
+
+    def test_missing_string_table(self):
+        store = core.BinaryHistoryStore(self.filename)
+        store.append(*ROWS[0])
+        store.close()
+        os.remove(self.filename + ".str")
+        with self.assertRaisesRegex(ValueError, "字符串表缺失"):
+            core.BinaryHistoryStore(self.filename)
+
+    def test_incomplete_string_table(self):
+        store = core.BinaryHistoryStore(self.filename)
+        store.append_many(ROWS)
+        store.close()
+        with open(self.filename + ".str", "r+b") as f:
+            f.truncate(len(f.readline()))
+        with self.assertRaisesRegex(ValueError, "字符串表不完整"):
+            core.BinaryHistoryStore(self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
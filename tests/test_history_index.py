@@ -0,0 +1,114 @@
+"""
+历史记录索引查询测试
+条件查询和不利差异Top-K的结果与逐行筛选一致，追加记录后索引增量更新
+运行: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from variance_core import UNIT_STANDARD_COST, HistoryManager  # noqa: E402
+
+PRODUCTS = ["产品A", "产品B", "零件A1", "零件C"]
+
+
+def random_rows(count, seed):
+    generator = random.Random(seed)
+    # 差异金额互不相同，Top-K结果唯一
+    results = generator.sample(range(-500000, 500000), count)
+    return [(generator.choice(PRODUCTS), generator.randint(1, 50), generator.choice(list(UNIT_STANDARD_COST)),
+             result / 100, None, None) for result in results]
+
+
+class HistoryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = HistoryManager()
+        self.rows = random_rows(3000, seed=7)
+        self.history.add_records(self.rows)
+        self.index = self.history.index
+
+    def brute_force(self, product=None, calc_type=None, quantity_range=None, result_range=None):
+        matched = []
+        for row, (name, quantity, type_name, result, _, _) in enumerate(self.rows):
+            if product and product not in name or calc_type and calc_type not in type_name:
+                continue
+            if quantity_range and not ((quantity_range[0] is None or quantity >= quantity_range[0])
+                                       and (quantity_range[1] is None or quantity <= quantity_range[1])):
+                continue
+            if result_range and not ((result_range[0] is None or result >= result_range[0])
+                                     and (result_range[1] is None or result <= result_range[1])):
+                continue
+            matched.append(row)
+        return matched
+
+    def test_query_matches_brute_force(self):
+        cases = [
+            {"product": "产品"},
+            {"product": "A", "calc_type": "人工"},
+            {"quantity_range": (10, 20)},
+            {"result_range": (None, -1000.0), "product": "零件"},
+            {"quantity_range": (45, None), "result_range": (0.0, 2500.0), "calc_type": "材料"},
+            {"product": "不存在的产品"},
+        ]
+        for conditions in cases:
+            rows, total = self.index.query(**conditions)
+            expected = self.brute_force(**conditions)
+            self.assertEqual(rows.tolist(), expected, conditions)
+            self.assertEqual(total, len(expected))
+
+    def test_query_limit_and_magnitude_order(self):
+        expected = self.brute_force(product="产品B")
+        rows, total = self.index.query(product="产品B", limit=5)
+        self.assertEqual(total, len(expected))
+        self.assertEqual(rows.tolist(), expected[:5])
+        rows, _ = self.index.query(product="产品B", sort_by_magnitude=True, limit=5)
+        by_magnitude = sorted(expected, key=lambda row: -abs(self.rows[row][3]))
+        self.assertEqual(rows.tolist(), by_magnitude[:5])
+        with self.assertRaises(ValueError):
+            self.index.query(limit=-1)
+
+    def expected_top(self, k, **conditions):
+        matched = [row for row in self.brute_force(**conditions) if self.rows[row][3] > 0]
+        return sorted(matched, key=lambda row: -self.rows[row][3])[:k]
+
+    def test_top_unfavorable(self):
+        self.assertEqual(self.index.top_unfavorable(10).tolist(), self.expected_top(10))
+        self.assertEqual(self.index.top_unfavorable(10, product="零件C").tolist(),
+                         self.expected_top(10, product="零件C"))
+        self.assertEqual(self.index.top_unfavorable(0).tolist(), [])
+        with self.assertRaises(ValueError):
+            self.index.top_unfavorable(-1)
+
+    def test_top_unfavorable_scans_sorted_index(self):
+        # 候选行超过HEAP_LIMIT时沿有序索引分块查找
+        self.index.HEAP_LIMIT = 10
+        conditions = {"product": "产品", "quantity_range": (1, 40)}
+        self.assertEqual(self.index.top_unfavorable(15, **conditions).tolist(), self.expected_top(15, **conditions))
+
+    def test_incremental_refresh(self):
+        self.index.query(product="产品A")
+        extra = random_rows(500, seed=8)
+        extra = [(name, quantity, type_name, result + 0.001 * (row + 1), actual, moment)
+                 for row, (name, quantity, type_name, result, actual, moment) in enumerate(extra)]
+        self.history.add_records(extra)
+        self.rows += extra
+        for conditions in ({"product": "产品A"}, {"result_range": (100.0, 200.0)}):
+            rows, _ = self.index.query(**conditions)
+            self.assertEqual(rows.tolist(), self.brute_force(**conditions))
+        self.assertEqual(self.index.names("product"), sorted(PRODUCTS))
+        self.assertEqual(self.index.exact_rows("product", "零件C").tolist(),
+                         [row for row, record in enumerate(self.rows) if record[0] == "零件C"])
+        self.assertEqual(len(self.index.exact_rows("product", "零件")), 0)
+        self.assertIsInstance(self.index.exact_rows("product", "零件"), np.ndarray)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+"""
+生产日志实时监控测试
+滑动窗口合计、过期、按产品汇总和阈值告警，以及空闲一段时间后新写入的行也要在50毫秒内处理（inotify唤醒和定时轮询两种方式）
+运行: python -m unittest discover tests
+"""
+
+import asyncio
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # 脚本导入同目录下的money等模块
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文和括号，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+CLI = load_script("标准成本差异计算系统2.0.py", "cost_cli")
+
+HEADER = "产品名称,计算类型,生产数量,实际用量,实际单价,实际成本\n"
+LATENCY_BUDGET = 0.05  # 秒
+FIXED = "固定制造费用成本差异"
+
+
+def batch(*rows):
+    """(产品名称, 计算类型, 生产数量, 实际成本) → 微批的列"""
+    return {"产品名称": [row[0] for row in rows], "计算类型": [row[1] for row in rows],
+            "生产数量": [str(row[2]) for row in rows], "实际成本": [str(row[3]) for row in rows]}
+
+
+def fixed_variance(quantity, actual_cost):
+    """固定制造费用差异（分）"""
+    return CLI.variance_cents(actual_cost, quantity, FIXED)
+
+
+def inotify_available():
+    watcher = CLI.FileWatcher(__file__)
+    available = watcher.available
+    watcher.close()
+    return available
+
+
+class SlidingWindowTest(unittest.TestCase):
+
+    def test_window_expiry(self):
+        window = CLI.SlidingWindow(10)
+        window.add(0, 100, 1)
+        window.add(5, 50, 2)
+        self.assertEqual((window.total, window.count), (150, 3))
+        window.add(10, 7, 1)  # 时刻0的项恰好移出窗口
+        self.assertEqual((window.total, window.count, len(window.entries)), (57, 3, 2))
+        window.expire(100)
+        self.assertEqual((window.total, window.count, len(window.entries)), (0, 0, 0))
+
+    def test_format_window(self):
+        self.assertEqual(CLI.format_window(300), "5分钟")
+        self.assertEqual(CLI.format_window(7200), "2小时")
+        self.assertEqual(CLI.format_window(90), "90秒")
+        with self.assertRaises(ValueError):
+            CLI.LiveMonitor(windows=(60, 0))
+
+
+class LiveMonitorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = []
+        self.monitor = CLI.LiveMonitor(windows=(60, 600), alert=self.messages.append)
+
+    def totals(self, product):
+        return [(window.total, window.count) for window in self.monitor.windows[product]]
+
+    def test_per_product_windows(self):
+        self.assertEqual(self.monitor.process(batch(("A", FIXED, 1, 100), ("B", FIXED, 2, 50), ("A", FIXED, 3, 80)),
+                                              moment=0), 3)
+        a = fixed_variance(1, 100) + fixed_variance(3, 80)
+        b = fixed_variance(2, 50)
+        self.assertEqual(self.totals("A"), [(a, 2), (a, 2)])
+        self.assertEqual(self.totals("B"), [(b, 1), (b, 1)])
+        # 每个产品每批只入队一项
+        self.assertEqual(len(self.monitor.windows["A"][0].entries), 1)
+        self.monitor.process(batch(("A", FIXED, 1, 10)), moment=100)
+        later = fixed_variance(1, 10)
+        self.assertEqual(self.totals("A"), [(later, 1), (a + later, 3)])
+        self.assertEqual(self.totals("B"), [(b, 1), (b, 1)])  # 没有新数据的产品不更新
+        self.assertEqual(self.monitor.rows, 4)
+
+    def test_invalid_rows_counted(self):
+        count = self.monitor.process(batch(("A", FIXED, 1, 100), ("", FIXED, 1, 100), ("A", "未知", 1, 100),
+                                           ("A", FIXED, 0, 100)), moment=0)
+        self.assertEqual((count, self.monitor.rows, self.monitor.invalid), (1, 4, 3))
+        self.assertEqual(self.monitor.process(batch(("A", FIXED, "x", 1)), moment=1), 0)
+        self.assertEqual((self.monitor.rows, self.monitor.invalid), (5, 4))
+        self.assertEqual(self.totals("A")[0][1], 1)
+
+    def test_row_threshold(self):
+        monitor = CLI.LiveMonitor(row_threshold=0.01, alert=self.messages.append)
+        rows = [("A", FIXED, 1, 10 ** 6 + i) for i in range(CLI.LiveMonitor.ALERT_LIMIT + 5)]
+        monitor.process(batch(*rows), moment=0)
+        self.assertEqual(monitor.alerts, CLI.LiveMonitor.ALERT_LIMIT + 1)
+        self.assertIn("本批另有5笔差异超过阈值", self.messages[-1])
+
+    def test_window_threshold_alerts_once_per_crossing(self):
+        threshold = abs(fixed_variance(1, 10 ** 6)) * 1.5 / 100
+        monitor = CLI.LiveMonitor(windows=(60,), window_threshold=threshold, alert=self.messages.append)
+        monitor.process(batch(("A", FIXED, 1, 10 ** 6)), moment=0)
+        self.assertEqual(monitor.alerts, 0)
+        monitor.process(batch(("A", FIXED, 1, 10 ** 6)), moment=10)
+        monitor.process(batch(("A", FIXED, 1, 10 ** 6)), moment=20)
+        self.assertEqual(monitor.alerts, 1)
+        self.assertIn("A 近1分钟差异合计", self.messages[0])
+        # 前两项过期后回落到阈值以下，再次越过时重新告警
+        monitor.process(batch(("A", FIXED, 1, 0)), moment=75)
+        self.assertFalse(monitor.windows["A"][0].alerted)
+        monitor.process(batch(("A", FIXED, 1, 10 ** 6)), moment=76)
+        monitor.process(batch(("A", FIXED, 1, 10 ** 6)), moment=77)
+        self.assertEqual(monitor.alerts, 2)
+
+
+class LiveMonitorLatencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "生产.csv")
+        with open(self.filename, "w", encoding="utf-8") as f:
+            f.write(HEADER)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    async def idle_latencies(self, idle=0.6, writes=5):
+        """空闲idle秒后逐行追加，返回每行从写入到处理完成的秒数"""
+        monitor = CLI.LiveMonitor(alert=lambda message: None)
+        processed = []
+        process = monitor.process
+
+        def timed_process(columns):
+            count = process(columns)
+            processed.append(time.perf_counter())
+            return count
+
+        monitor.process = timed_process
+        stop = asyncio.Event()
+        latencies = []
+
+        async def writer():
+            with open(self.filename, "a", encoding="utf-8") as f:
+                for i in range(writes):
+                    await asyncio.sleep(idle)
+                    done = len(processed)
+                    f.write("产品A,固定制造费用成本差异,{},,,100\n".format(i + 1))
+                    f.flush()
+                    written = time.perf_counter()
+                    while len(processed) == done and time.perf_counter() - written < 1:
+                        await asyncio.sleep(0.001)
+                    latencies.append(processed[-1] - written if len(processed) > done else float("inf"))
+            stop.set()
+
+        task = asyncio.create_task(writer())
+        await CLI.follow_log(self.filename, monitor, stop=stop, status_interval=None)
+        await task
+        self.assertEqual(monitor.rows, writes)
+        return latencies
+
+    def test_backoff_within_budget(self):
+        self.assertLessEqual(CLI.LogFollower.MAX_POLL_INTERVAL, 0.04)
+        follower = CLI.LogFollower(self.filename)
+        self.assertLessEqual(max(follower._interval(idle) for idle in range(100)), 0.04)
+
+    @unittest.skipUnless(inotify_available(), "不支持inotify")
+    def test_inotify_latency(self):
+        latencies = asyncio.run(self.idle_latencies())
+        self.assertLess(max(latencies), LATENCY_BUDGET, latencies)
+
+    def test_polling_latency(self):
+        with mock.patch.object(CLI.FileWatcher, "start", lambda self: None):
+            latencies = asyncio.run(self.idle_latencies())
+        self.assertLess(max(latencies), LATENCY_BUDGET, latencies)
+
+
+if __name__ == "__main__":
+    unittest.main()
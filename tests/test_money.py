@@ -0,0 +1,100 @@
+"""
+定点金额测试
+舍入规则、整数分汇总和格式化，以及增值税、成本差异按分计算的结果
+运行: python -m unittest discover tests
+"""
+
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from money import (  # noqa: E402
+    ROUND_HALF_EVEN, ROUND_HALF_UP, format_cents, group_sum, round_cents, to_cents, to_yuan)
+from variance_core import StandardParams, variance_cents  # noqa: E402
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# 计算增值税.py导入时读取一个金额并输出结果
+with mock.patch("builtins.input", return_value="100"), contextlib.redirect_stdout(io.StringIO()):
+    VAT = load_script("计算增值税.py", "vat")
+
+
+class RoundingTest(unittest.TestCase):
+
+    def test_half_up(self):
+        self.assertEqual(to_cents(2.675, ROUND_HALF_UP), 268)  # 2.675×100 = 267.49999999999997
+        self.assertEqual(to_cents(-2.675, ROUND_HALF_UP), -268)
+        self.assertEqual(to_cents(0.125, ROUND_HALF_UP), 13)
+        self.assertEqual(to_cents(1.004, ROUND_HALF_UP), 100)
+
+    def test_half_even(self):
+        self.assertEqual(to_cents(0.125, ROUND_HALF_EVEN), 12)
+        self.assertEqual(to_cents(0.135, ROUND_HALF_EVEN), 14)
+        self.assertEqual(to_cents(-0.125, ROUND_HALF_EVEN), -12)
+        self.assertEqual(to_cents(2.675, ROUND_HALF_EVEN), 268)
+
+    def test_arrays_and_types(self):
+        cents = to_cents([0.005, 0.015, 0.025, -0.005], ROUND_HALF_EVEN)
+        self.assertEqual(cents.dtype, np.int64)
+        self.assertEqual(cents.tolist(), [0, 2, 2, 0])
+        self.assertEqual(to_cents([0.005, 0.015, 0.025, -0.005], ROUND_HALF_UP).tolist(), [1, 2, 3, -1])
+        self.assertIsInstance(to_cents(1.5), int)
+        self.assertEqual(round_cents(np.array([[149.5, 150.5]]), ROUND_HALF_EVEN).tolist(), [[150, 150]])
+
+    def test_unknown_rounding(self):
+        with self.assertRaises(ValueError):
+            round_cents(1.5, "ceiling")
+
+    def test_format_cents(self):
+        self.assertEqual(format_cents(123456789), "+1,234,567.89")
+        self.assertEqual(format_cents(-5), "-0.05")
+        self.assertEqual(format_cents(0, signed=False), "0.00")
+        self.assertEqual(format_cents(2 ** 62 + 1, signed=False), "{:,}.{:02d}".format(*divmod(2 ** 62 + 1, 100)))
+        self.assertEqual(to_yuan(12345), 123.45)
+
+    def test_group_sum_exact(self):
+        # 超过2**53的合计，浮点数累加会丢失末位
+        values = np.array([2 ** 53, 1, 1, 7], dtype=np.int64)
+        totals = group_sum(np.array([0, 0, 0, 1]), values, 3)
+        self.assertEqual(totals.tolist(), [2 ** 53 + 2, 7, 0])
+        self.assertEqual(totals.dtype, np.int64)
+        self.assertEqual(group_sum(np.array([1, 1]), to_cents([0.1, 0.2]), 2).tolist(), [0, 30])
+
+
+class MoneyPathsTest(unittest.TestCase):
+
+    def test_value_added_tax(self):
+        self.assertEqual(VAT.Value_added_tax(2.675), (0.35, 3.03))
+        self.assertEqual(VAT.Value_added_tax(0.5, 0.05, ROUND_HALF_EVEN), (0.02, 0.52))  # 2.5分 → 2分
+        self.assertEqual(VAT.Value_added_tax(0.5, 0.05, ROUND_HALF_UP), (0.03, 0.53))
+        tax, total = VAT.Value_added_tax(np.array([100, 0.1, 2.675]))
+        np.testing.assert_array_equal(tax, [13.0, 0.01, 0.35])
+        np.testing.assert_array_equal(total, [113.0, 0.11, 3.03])
+
+    def test_variance_rounds_each_side(self):
+        # 实际成本和标准成本各自取整到分后相减
+        unit = StandardParams.MATERIAL_USAGE * StandardParams.MATERIAL_PRICE
+        cents = variance_cents(100.005, 3, "直接材料成本差异")
+        self.assertEqual(cents, to_cents(100.005) - to_cents(3 * unit))
+        batch = variance_cents(np.array([100.005, 1.0]), np.array([3, 1]), np.array([0, 0]))
+        self.assertEqual(batch.tolist(), [cents, to_cents(1.0) - to_cents(unit)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+月度差异汇总报表测试
+单次扫描分组汇总与逐笔累加一致，Excel报表的工作表和合计行正确
+运行: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+from openpyxl import load_workbook
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from money import to_cents  # noqa: E402
+from variance_core import HistoryManager, ReportGenerator  # noqa: E402
+
+ROWS = [
+    ("产品A", 10, "直接材料成本差异", 12.5, None, datetime(2024, 1, 15)),
+    ("产品A", 5, "直接材料成本差异", -2.25, None, datetime(2024, 1, 31, 23, 59)),
+    ("产品B", 3, "直接人工标准成本差异", 0.1, None, datetime(2024, 1, 2)),
+    ("产品A", 7, "直接材料成本差异", 0.2, None, datetime(2024, 2, 1)),
+    ("产品B", 1, "固定制造费用成本差异", -100.0, None, datetime(2023, 12, 31)),
+    ("产品C", 2, "直接材料成本差异", 1.0, None, None),
+]
+
+
+def month_index(year, month):
+    return (year - 1970) * 12 + month - 1
+
+
+class ReportGeneratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = HistoryManager(os.path.join(self.directory, "历史.hkh"))
+        self.history.add_records(ROWS)
+        self.report = ReportGenerator(self.history)
+
+    def tearDown(self):
+        self.history.close()
+        shutil.rmtree(self.directory)
+
+    def test_group_matches_records(self):
+        expected = {}
+        for product, quantity, calc_type, result, _, moment in ROWS:
+            month = ReportGenerator.UNDATED if moment is None else month_index(moment.year, moment.month)
+            totals = expected.setdefault((month, product, calc_type), [0, 0, 0, 0])
+            cents = to_cents(result)
+            totals[0] += 1
+            totals[1] += quantity
+            totals[2 if cents > 0 else 3] += cents
+        self.assertEqual(self.report.group(), expected)
+
+    def test_group_small_chunks(self):
+        # 分块扫描的合并结果与一次扫描相同
+        whole = self.report.group()
+        self.report.CHUNK_SIZE = 2
+        self.assertEqual(self.report.group(), whole)
+
+    def test_group_by_year(self):
+        groups = self.report.group(2024)
+        self.assertEqual({month for month, _, _ in groups}, {month_index(2024, 1), month_index(2024, 2)})
+        self.assertEqual(groups[(month_index(2024, 1), "产品A", "直接材料成本差异")], [2, 15, 1250, -225])
+
+    def test_period_title(self):
+        self.assertEqual(ReportGenerator.period_title(month_index(2024, 2)), "2024-02")
+        self.assertEqual(ReportGenerator.period_title(ReportGenerator.UNDATED), "未记录时间")
+
+    def test_generate_workbook(self):
+        filename = os.path.join(self.directory, "差异月报.xlsx")
+        self.assertEqual(self.report.generate(filename), 4)
+        wb = load_workbook(filename, read_only=True)
+        try:
+            self.assertEqual(wb.sheetnames, ["汇总", "未记录时间", "2023-12", "2024-01", "2024-02"])
+            january = list(wb["2024-01"].values)
+            self.assertEqual(january[0], tuple(ReportGenerator.HEADERS))
+            self.assertEqual(january[1], ("产品A", "直接材料成本差异", 2, 15, 12.5, -2.25, 10.25))
+            self.assertEqual(january[2], ("产品A", "小计", 2, 15, 12.5, -2.25, 10.25))
+            self.assertEqual(january[-1], ("合计", None, 3, 18, 12.6, -2.25, 10.35))
+            summary = {row[0]: row for row in wb["汇总"].values}
+            self.assertEqual(summary["期间"][-1], "差异合计")
+            self.assertEqual(summary["2024-01"][-1], 10.35)
+            self.assertEqual(summary["2023-12"][-1], -100.0)
+        finally:
+            wb.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+标准参数敏感性分析测试
+网格曲面、龙卷风排序与逐笔计算的总差异一致
+运行: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from money import to_yuan  # noqa: E402
+from variance_core import (  # noqa: E402
+    PARAM_LABELS, HistoryManager, SensitivityAnalyzer, StandardParams, variance_cents)
+
+# (产品名称, 产品数量, 计算类型, 实际成本)
+RECORDS = [
+    ("产品A", 10, "直接材料成本差异", 130.0),
+    ("产品A", 4, "直接人工标准成本差异", 50.25),
+    ("产品B", 7, "直接材料成本差异", 80.4),
+    ("产品B", 3, "变动制造费用成本差异", 17.0),
+]
+
+
+def total_variance(params):
+    """逐笔计算的总差异（元）"""
+    return sum(to_yuan(variance_cents(actual_cost, quantity, calc_type, params))
+               for _, quantity, calc_type, actual_cost in RECORDS)
+
+
+class SensitivityAnalyzerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = HistoryManager()
+        for product, quantity, calc_type, actual_cost in RECORDS:
+            self.history.add_record(product, quantity, calc_type,
+                                    to_yuan(variance_cents(actual_cost, quantity, calc_type)), actual_cost)
+        self.analyzer = SensitivityAnalyzer(self.history)
+
+    def params(self, **changes):
+        values = {name: float(getattr(StandardParams, name)) for name in PARAM_LABELS}
+        values.update(changes)
+        return SimpleNamespace(**values)
+
+    def test_baseline_matches_records(self):
+        self.assertAlmostEqual(self.analyzer.baseline(), total_variance(StandardParams), delta=0.005 * len(RECORDS))
+
+    def test_grid_matches_recalculation(self):
+        usages = [5.0, 5.5, 6.0]
+        prices = [2.0, 2.2]
+        surface = self.analyzer.grid("MATERIAL_USAGE", usages, "MATERIAL_PRICE", prices)
+        self.assertEqual(surface.shape, (len(prices), len(usages)))
+        for i, price in enumerate(prices):
+            for j, usage in enumerate(usages):
+                expected = total_variance(self.params(MATERIAL_USAGE=usage, MATERIAL_PRICE=price))
+                self.assertAlmostEqual(surface[i, j], expected, delta=0.005 * len(RECORDS))
+
+    def test_grid_rejects_same_parameter(self):
+        with self.assertRaises(ValueError):
+            self.analyzer.grid("HOURS", [1, 2], "HOURS", [1, 2])
+
+    def test_tornado_ranking(self):
+        ranking = self.analyzer.tornado(0.1)
+        self.assertEqual({name for name, _, _, _ in ranking}, set(PARAM_LABELS))
+        swings = [swing for _, _, _, swing in ranking]
+        self.assertEqual(swings, sorted(swings, reverse=True))
+        by_name = {name: (low, high) for name, low, high, _ in ranking}
+        # 没有固定制造费用记录，固定制造费率不影响总差异
+        self.assertEqual(by_name["FIXED_RATE"][0], by_name["FIXED_RATE"][1])
+        # 标准工时上浮，标准成本增加，总差异减小
+        low, high = by_name["HOURS"]
+        self.assertGreater(low, high)
+        self.assertAlmostEqual(high, total_variance(self.params(HOURS=StandardParams.HOURS * 1.1)),
+                               delta=0.005 * len(RECORDS))
+
+    def test_unknown_types_stay_constant(self):
+        self.history.add_record("产品C", 5, "已删除的差异类型", 12.34, None)
+        baseline = self.analyzer.baseline()
+        surface = self.analyzer.grid("HOURS", [1, 3], "LABOR_RATE", [5, 7])
+        self.assertAlmostEqual(baseline - 12.34, total_variance(StandardParams), delta=0.005 * len(RECORDS))
+        self.assertTrue(np.all(np.isfinite(surface)))
+
+
+if __name__ == "__main__":
+    unittest.main()
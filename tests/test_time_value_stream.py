@@ -0,0 +1,104 @@
+"""
+时间货币价值流式批量计算测试
+脚本导入时即进入交互模式，因此以子进程方式运行流式模式
+运行: python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "时间的货币价值.py")
+
+REQUESTS = [
+    {"formula": "复利终值", "rate": 10, "n": 2, "m": 1, "pv": 1000},
+    {"formula": "单利终值", "rate": "5", "n": "3", "pv": "1000"},
+    {"formula": "永续年金现值", "rate": 5, "A": 100},
+    {"formula": "增长型永续年金", "rate": 10, "g": 5, "A": 100},
+    {"formula": "普通年金现值", "rate": 0, "n": 3, "A": 100},
+    {"formula": "复利现值", "rate": 10, "n": 0, "fv": 100},
+    {"formula": "未知公式"},
+]
+EXPECTED = [
+    {"line": 1, "formula": "复利终值", "result": 1210.0},
+    {"line": 2, "formula": "单利终值", "result": 1150.0},
+    {"line": 3, "formula": "永续年金现值", "result": 2000.0},
+    {"line": 4, "formula": "增长型永续年金", "result": 2000.0},
+    {"line": 5, "error": "年利率不能为0"},
+    {"line": 6, "error": "期限不能小于1"},
+    {"line": 7, "error": "计算类型取值无效"},
+]
+
+
+def run_stream(*args, stdin=None):
+    return subprocess.run([sys.executable, SCRIPT] + list(args), input=stdin, capture_output=True, text=True,
+                          encoding="utf-8")
+
+
+class TimeValueStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        filename = os.path.join(self.directory, name)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(text)
+        return filename
+
+    def test_jsonl_results_in_input_order(self):
+        lines = [json.dumps(request, ensure_ascii=False) for request in REQUESTS]
+        completed = run_stream(self.write("请求.jsonl", "\n".join(lines) + "\n"))
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual([json.loads(line) for line in completed.stdout.splitlines()], EXPECTED)
+        self.assertIn("共7行，计算成功4行，出错3行", completed.stderr)
+
+    def test_jsonl_from_stdin_with_bad_lines(self):
+        text = json.dumps(REQUESTS[0], ensure_ascii=False) + "\n\n{不是JSON\n[1, 2]\n"
+        completed = run_stream("-", "jsonl", stdin=text)
+        self.assertEqual([json.loads(line) for line in completed.stdout.splitlines()], [
+            EXPECTED[0],
+            {"line": 3, "error": "JSON格式错误"},
+            {"line": 4, "error": "JSON格式错误：每行必须是一个对象"}])
+
+    def test_csv_stream(self):
+        text = ("formula,rate,n,m,A,pv,fv,g\n"
+                "复利终值,10,2,1,,1000,,\n"
+                "单利现值,10,1,,,,110,\n"
+                "复利终值,10,2\n"
+                "递延年金现值,10,3,-1,100,,,\n")
+        completed = run_stream(self.write("请求.csv", text))
+        self.assertEqual(completed.stdout.splitlines(), [
+            "line,formula,result,error",
+            "2,复利终值,1210.00,",
+            "3,单利现值,100.00,",
+            "4,,,CSV列数与表头不一致",
+            "5,,,递延期不能小于0"])
+
+    def test_chunk_boundaries(self):
+        count = 10000  # 超过两个CHUNK
+        lines = ['{{"formula": "单利终值", "rate": 1, "n": 1, "pv": {}}}'.format(i) for i in range(count)]
+        completed = run_stream("-", "jsonl", stdin="\n".join(lines) + "\n")
+        results = [json.loads(line) for line in completed.stdout.splitlines()]
+        self.assertEqual([result["line"] for result in results], list(range(1, count + 1)))
+        self.assertEqual(results[-1]["result"], round((count - 1) * 1.01, 2))
+
+    def test_bad_arguments(self):
+        completed = run_stream(os.path.join(self.directory, "不存在.jsonl"))
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn("请求文件不存在", completed.stderr)
+        completed = run_stream("-", "xml", stdin="")
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn("未知的文件格式", completed.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
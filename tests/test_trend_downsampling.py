@@ -0,0 +1,168 @@
+"""
+趋势图降采样测试
+最大最小值与LTTB降采样的保留点、趋势图按时间排列及增量更新与整体重算一致
+画布方法以内存记录代替，不需要显示器
+运行: python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # 脚本导入同目录下的money等模块
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文和括号，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+GUI = load_script("标准成本差异计算系统2.0(GUI版).py", "cost_gui")
+
+TYPE = "直接材料成本差异"
+START = datetime(2024, 1, 1)
+
+
+class RecordingChart(GUI.TrendChart):
+    """不创建Tk窗口的趋势图，记录折线坐标和文字"""
+
+    def __init__(self, history, width=800, height=400):
+        self.size = {"width": width, "height": height}
+        self.history = history
+        self.product = None
+        self.calc_types = []
+        self.method = "LTTB"
+        self.series = {}
+        self.total = 0
+        self.start = 0
+        self.capacity = 1
+        self.y_range = (-1.0, 1.0)
+        self.lines, self.texts = {}, []
+
+    def __getitem__(self, key):
+        return self.size[key]
+
+    def delete(self, *items):
+        self.lines, self.texts = {}, []
+
+    def create_line(self, *coords, **options):
+        item = len(self.lines) + 1
+        self.lines[item] = coords
+        return item
+
+    def create_text(self, *coords, **options):
+        self.texts.append(options.get("text"))
+
+    def create_rectangle(self, *coords, **options):
+        pass
+
+    def coords(self, item, *coords):
+        self.lines[item] = coords
+
+
+class DownsampleTest(unittest.TestCase):
+
+    def setUp(self):
+        generator = np.random.default_rng(3)
+        self.positions = np.sort(generator.choice(100000, 20000, replace=False))
+        self.values = generator.normal(size=len(self.positions)).cumsum()
+
+    def test_minmax_keeps_bucket_extremes(self):
+        picked = GUI.minmax_downsample(self.positions, self.values, 250)
+        self.assertTrue(np.all(np.diff(picked) > 0))
+        self.assertEqual(picked[-1], len(self.positions) - 1)
+        buckets = self.positions // 250
+        for bucket in np.unique(buckets):
+            rows = np.flatnonzero(buckets == bucket)
+            kept = np.intersect1d(picked, rows)
+            self.assertIn(self.values[rows].max(), self.values[kept])
+            self.assertIn(self.values[rows].min(), self.values[kept])
+            self.assertLessEqual(len(kept), 3)
+
+    def test_lttb_one_point_per_bucket(self):
+        picked = GUI.lttb_downsample(self.positions, self.values, 250)
+        self.assertEqual(picked[0], 0)
+        self.assertEqual(picked[-1], len(self.positions) - 1)
+        self.assertTrue(np.all(np.diff(picked) > 0))
+        buckets = self.positions[picked[1:-1]] // 250
+        self.assertEqual(len(buckets), len(np.unique(buckets)))
+
+    def test_empty_and_single_point(self):
+        for method in (GUI.minmax_downsample, GUI.lttb_downsample):
+            self.assertEqual(len(method(np.zeros(0, np.int64), np.zeros(0), 10)), 0)
+            self.assertEqual(method(np.array([5]), np.array([1.0]), 10).tolist(), [0])
+
+
+class TrendChartTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = GUI.HistoryManager()
+        hours = np.arange(5000)
+        rows = [("产品A", 1, TYPE, float(np.sin(hour / 40) * 100), None, START + timedelta(hours=int(hour)))
+                for hour in hours]
+        # 较早时间的导入记录、其他产品和未记录时间的记录
+        rows.insert(100, ("产品A", 1, TYPE, 50.0, None, START - timedelta(days=10)))
+        rows.append(("产品B", 1, TYPE, 1.0, None, START))
+        rows.append(("产品A", 1, TYPE, 2.0, None, None))
+        self.history.add_records(rows)
+        self.chart = RecordingChart(self.history)
+
+    def test_positions_are_sorted_timestamps(self):
+        self.chart.show("产品A", [TYPE])
+        series = self.chart.series[TYPE]
+        self.assertEqual(len(series.positions), 5001)
+        self.assertTrue(np.all(np.diff(series.positions) >= 0))
+        self.assertEqual(series.positions[0], GUI.to_timestamp(START - timedelta(days=10)))
+        self.assertEqual(series.values[0], 50.0)
+        xs = np.array(self.chart.lines[series.item][0::2])
+        left, _, right, _ = GUI.TrendChart.MARGIN
+        self.assertTrue(np.all(np.diff(xs) >= 0))
+        self.assertGreaterEqual(xs.min(), left)
+        self.assertLessEqual(xs.max(), 800 - right)
+        self.assertEqual(self.chart.start % self.chart.bucket_size, 0)
+
+    def test_axis_labels_are_dates(self):
+        self.chart.show("产品A", [TYPE])
+        labels = [text for text in self.chart.texts if text and text[:4].isdigit() and "-" in text]
+        # 横轴起点为首条记录所在的桶边界
+        first = self.chart.series[TYPE].positions[0]
+        self.assertTrue(self.chart.start <= first < self.chart.start + self.chart.bucket_size)
+        self.assertEqual(labels[0], GUI.from_timestamp(self.chart.start).strftime("%Y-%m-%d"))
+        self.assertEqual(len(labels), 3)
+        short = RecordingChart(self.history)
+        self.history.add_records([("产品C", 1, TYPE, 1.0, None, START + timedelta(minutes=m)) for m in range(0, 90, 5)])
+        short.show("产品C", [TYPE])
+        self.assertIn("01-01 00:00", short.texts)
+
+    def test_append_matches_full_downsampling(self):
+        for method in GUI.TrendChart.METHODS:
+            self.chart.show("产品A", [TYPE], method)
+            last = START + timedelta(hours=5000)
+            for i in range(20):
+                self.history.add_record("产品A", 1, TYPE, float(i % 7 - 3) * 10, None, last + timedelta(minutes=i))
+                self.chart.append()
+                series = self.chart.series[TYPE]
+                full = GUI.TrendChart.METHODS[method](series.positions, series.values, self.chart.bucket_size)
+                self.assertEqual(series.picked.tolist(), full.tolist(), method)
+
+    def test_append_out_of_order_redraws(self):
+        self.chart.show("产品A", [TYPE])
+        self.history.add_record("产品A", 1, TYPE, 5.0, None, START + timedelta(hours=10, minutes=30))
+        self.chart.append()
+        series = self.chart.series[TYPE]
+        self.assertTrue(np.all(np.diff(series.positions) >= 0))
+        self.assertEqual(len(series.positions), 5002)
+        full = GUI.lttb_downsample(series.positions, series.values, self.chart.bucket_size)
+        self.assertEqual(series.picked.tolist(), full.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
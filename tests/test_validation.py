@@ -0,0 +1,100 @@
+"""
+批量输入验证测试
+整列验证得到的逐行错误掩码与逐个单元格判断一致
+运行: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from variance_core import VARIANCE_VALIDATOR, BatchValidator  # noqa: E402
+
+VALIDATOR = BatchValidator(
+    [("名称", str, None, None, None),
+     ("类型", ("甲", "乙"), None, None, None),
+     ("数量", int, 1, 100, None),
+     ("单价", float, 0, None, ("甲",)),
+     ("金额", float, None, None, ("乙",))],
+    condition_field="类型",
+    checks=[("金额必须大于单价", ("乙",), lambda values: values["金额"] > values["单价"])])
+
+
+def mask(*rows, size=6):
+    result = np.zeros(size, dtype=bool)
+    result[list(rows)] = True
+    return result.tolist()
+
+
+class BatchValidatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.result = VALIDATOR.validate({
+            "名称": ["A", " ", "C", "D", "E", "F"],
+            "类型": ["甲", "乙", "丙", "甲", "乙", ""],
+            "数量": ["1", "2.5", "abc", "0", " 7 ", "101"],
+            "单价": ["2", "", "", "-1", "3", "inf"],
+            "金额": ["", "10", "", "", "2", "nan"],
+        })
+
+    def test_error_masks(self):
+        errors = {message: mask_.tolist() for message, mask_ in self.result.errors.items()}
+        self.assertEqual(errors, {
+            "名称不能为空": mask(1),
+            "类型不能为空": mask(5),
+            "类型取值无效": mask(2),
+            "数量格式错误": mask(1, 2),
+            "数量不能小于1": mask(3),
+            "数量不能大于100": mask(5),
+            # 单价只对类型甲检查：类型乙的空单价、类型无效行的inf都不报错
+            "单价不能小于0": mask(3),
+            # 跨字段规则只报告字段本身有效的行
+            "金额必须大于单价": mask(4),
+        })
+        self.assertEqual(self.result.invalid.tolist(), mask(1, 2, 3, 4, 5))
+
+    def test_parsed_values(self):
+        np.testing.assert_array_equal(self.result.codes["类型"], [0, 1, -1, 0, 1, -1])
+        self.assertEqual(self.result.values["数量"][4], 7.0)
+        # 无效数值解析为NaN，非有限数只在规则适用的行报错
+        self.assertTrue(np.isnan(self.result.values["单价"][5]))
+        self.assertTrue(np.isnan(self.result.values["数量"][2]))
+        self.assertEqual(self.result.values["名称"].tolist(), ["A", "", "C", "D", "E", "F"])
+
+    def test_summary_and_report(self):
+        self.assertEqual(self.result.summary()["数量格式错误"], 2)
+        self.assertEqual(self.result.row_errors(limit=1), [(1, ["名称不能为空", "数量格式错误"])])
+        self.assertEqual(self.result.report()[0], "第2行：名称不能为空；数量格式错误")
+        self.assertEqual(len(self.result.report(limit=3)), 3)
+
+    def test_numeric_columns_and_missing_fields(self):
+        result = VALIDATOR.validate({"名称": ["A", "B"], "类型": ["甲", "甲"], "数量": [3, 4.5], "单价": [1.5, None]})
+        self.assertEqual(result.summary(), {"数量格式错误": 1, "单价不能为空": 1})
+        np.testing.assert_array_equal(result.values["单价"][:1], [1.5])
+        # 缺少的字段视为整列为空，只对适用的行报错
+        self.assertNotIn("金额不能为空", result.errors)
+
+    def test_empty_input(self):
+        result = VALIDATOR.validate({})
+        self.assertEqual(result.size, 0)
+        self.assertEqual(result.errors, {})
+
+    def test_variance_fields(self):
+        result = VARIANCE_VALIDATOR.validate({
+            "产品名称": ["A", "B", "C"],
+            "计算类型": ["直接材料成本差异", "固定制造费用成本差异", "直接材料成本差异"],
+            "生产数量": ["10", "5", "3"],
+            "实际用量": ["2", "", "1"],
+            "实际单价": ["3", "", ""],
+            "实际成本": ["", "100", ""]})
+        self.assertEqual(result.summary(), {"实际单价不能为空": 1})
+        self.assertEqual(result.invalid.tolist(), [False, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
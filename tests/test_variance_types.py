@@ -0,0 +1,182 @@
+"""
+差异类型公式测试
+公式编译错误、函数参数个数、注册与注销，以及实际成本不是有限数的行按错误行处理
+运行: python -m unittest discover tests
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from variance_core import (  # noqa: E402
+    INVALID_ACTUAL_COST, PARAM_LABELS, VARIANCE_TYPES, VARIANCE_VALIDATOR, StandardParams, VarianceType,
+    compile_formula, load_variance_types, register_variance_type, save_variance_types, unregister_variance_type)
+
+
+def load_script(filename, module_name):
+    """按文件路径导入脚本（文件名含中文，不能直接import）"""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+CLI = load_script("标准成本差异计算系统2.0.py", "cost_cli")
+
+ELECTRICITY = {"name": "电费差异", "actual": "耗电量 / 产出率", "standard": "ELEC",
+               "params": {"ELEC": ["单位电费", 2.0]}}
+HEADER = ["产品名称", "计算类型", "生产数量", "实际用量", "实际单价", "实际成本", "耗电量", "产出率"]
+
+
+class CompileFormulaTest(unittest.TestCase):
+
+    def assertFormulaError(self, formula, message, allowed=("a", "b", "c")):
+        with self.assertRaises(ValueError) as context:
+            compile_formula(formula, allowed, "values")
+        self.assertIn(message, str(context.exception))
+
+    def test_compile_errors(self):
+        self.assertFormulaError("  ", "公式不能为空")
+        self.assertFormulaError("a *", "公式语法错误")
+        self.assertFormulaError("a + d", "未知名称：d")
+        self.assertFormulaError("a if b else c", "不支持的写法")
+        self.assertFormulaError("a.real", "不支持的写法")
+        self.assertFormulaError("a ** 11", "乘方的指数")
+        self.assertFormulaError("a ** b", "乘方的指数")
+        self.assertFormulaError("9 ** 9 ** 9", "乘方的指数")
+
+    def test_function_arity(self):
+        self.assertFormulaError("sqrt(a, b)", "sqrt函数需要1个参数")
+        self.assertFormulaError("abs()", "abs函数需要1个参数")
+        self.assertFormulaError("abs(a, b)", "abs函数需要1个参数")
+        self.assertFormulaError("max(a)", "max函数需要至少2个参数")
+        self.assertFormulaError("min()", "min函数需要至少2个参数")
+
+    def test_min_max_fold(self):
+        kernel, used = compile_formula("min(a, b, c) + max(a, b, c, 0)", None, "values")
+        self.assertEqual(used, ["a", "b", "c"])
+        values = {"a": np.array([1.0, 5.0, -3.0]), "b": np.array([2.0, 4.0, -1.0]), "c": np.array([3.0, 0.5, -2.0])}
+        np.testing.assert_array_equal(kernel(values), [1 + 3, 0.5 + 5, -3 + 0])
+        kernel, _ = compile_formula("sqrt(abs(a)) * 2", ("a",), "values")
+        self.assertEqual(kernel({"a": -4.0}), 4.0)
+
+    def test_params_target(self):
+        kernel, used = compile_formula("HOURS * LABOR_RATE", PARAM_LABELS, "params")
+        self.assertEqual(used, ["HOURS", "LABOR_RATE"])
+        self.assertEqual(kernel(StandardParams), StandardParams.HOURS * StandardParams.LABOR_RATE)
+
+
+class VarianceTypeTest(unittest.TestCase):
+
+    def test_inferred_inputs(self):
+        variance_type = VarianceType(**ELECTRICITY)
+        self.assertEqual(variance_type.inputs, {"耗电量": "耗电量", "产出率": "产出率"})
+        self.assertEqual(variance_type.label, "电费差异")
+        self.assertEqual(VarianceType(**variance_type.to_dict()).to_dict(), variance_type.to_dict())
+
+    def test_invalid_declarations(self):
+        with self.assertRaises(ValueError):
+            VarianceType("", "a", "HOURS")
+        with self.assertRaises(ValueError):
+            VarianceType("甲", "生产数量 * 2", "HOURS")  # 保留字段不能作为输入字段
+        with self.assertRaises(ValueError):
+            VarianceType("甲", "a", "HOURS", params={"_X": ["参数", 1]})
+        with self.assertRaises(ValueError):
+            VarianceType("甲", "a", "HOURS", params={"X": ["参数", "abc"]})
+        with self.assertRaises(ValueError):
+            VarianceType("甲", "a", "UNKNOWN_PARAM")
+        with self.assertRaises(ValueError):
+            VarianceType("甲", "a * b", "HOURS", inputs={"a": "输入a"})
+
+    def test_register_and_unregister(self):
+        register_variance_type(VarianceType(**ELECTRICITY))
+        self.addCleanup(lambda: "电费差异" in VARIANCE_TYPES and unregister_variance_type("电费差异"))
+        self.assertEqual(StandardParams.ELEC, 2.0)
+        self.assertEqual(PARAM_LABELS["ELEC"], "单位电费")
+        fields = {field[0]: field for field in VARIANCE_VALIDATOR.fields}
+        self.assertEqual(fields["耗电量"][4], ("电费差异",))
+        self.assertIn("电费差异", fields["计算类型"][1])
+        with self.assertRaises(ValueError):
+            register_variance_type(VarianceType(**ELECTRICITY))
+        unregister_variance_type("电费差异")
+        self.assertFalse(hasattr(StandardParams, "ELEC"))
+        self.assertNotIn("ELEC", PARAM_LABELS)
+        self.assertNotIn("耗电量", [field[0] for field in VARIANCE_VALIDATOR.fields])
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, "差异类型.json")
+        register_variance_type(VarianceType(**ELECTRICITY))
+        try:
+            save_variance_types(filename)
+        finally:
+            unregister_variance_type("电费差异")
+        with open(filename, encoding="utf-8") as f:
+            self.assertEqual([declaration["name"] for declaration in json.load(f)], ["电费差异"])
+        self.assertEqual(load_variance_types(filename), 1)
+        self.addCleanup(unregister_variance_type, "电费差异")
+        self.assertEqual(VARIANCE_TYPES["电费差异"].actual, "耗电量 / 产出率")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump({"name": "甲"}, f)
+        with self.assertRaises(ValueError):
+            load_variance_types(filename)
+
+
+class InvalidActualCostTest(unittest.TestCase):
+    """实际成本公式除以零等得到非有限数时，该行作为错误行，不参与汇总也不写入历史记录"""
+
+    def setUp(self):
+        register_variance_type(VarianceType(**ELECTRICITY))
+        self.addCleanup(unregister_variance_type, "电费差异")
+
+    def test_compute_chunk(self):
+        rows = [["A", "电费差异", "10", "", "", "", "100", "2"],
+                ["B", "电费差异", "10", "", "", "", "100", "0"],
+                ["C", "直接材料成本差异", "1", "2", "3", "", "", ""]]
+        arrays, meta = CLI.compute_chunk(HEADER, rows)
+        self.assertEqual(meta["errors"], {INVALID_ACTUAL_COST: 1})
+        self.assertEqual(meta["valid"], 2)
+        self.assertEqual(arrays["rows"].tolist(), [0, 2])
+        self.assertEqual(meta["row_errors"], [(1, [INVALID_ACTUAL_COST])])
+        # 100 / 2 - 10 × 2.0 = 30元
+        self.assertEqual(meta["type_totals"]["电费差异"], 3000)
+        self.assertTrue(np.all(np.abs(arrays["variance"]) < 2 ** 53))
+
+    def test_cost_calculator(self):
+        with mock.patch("builtins.input", side_effect=["100", "0"]), contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(ValueError) as context:
+                CLI.CostCalculator.calculate("电费差异", 10)
+        self.assertEqual(str(context.exception), INVALID_ACTUAL_COST)
+        with mock.patch("builtins.input", side_effect=["100", "4"]), contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(CLI.CostCalculator.calculate("电费差异", 10), 5.0)
+
+    def test_batch_job_skips_row(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, "批量.csv")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(",".join(HEADER) + "\n")
+            f.write("A,电费差异,10,,,,100,0\nB,电费差异,10,,,,100,4\n")
+        history = CLI.HistoryManager(os.path.join(directory, "历史.hkh"))
+        self.addCleanup(history.close)
+        summary = CLI.run_batch_job(filename, CLI.BatchCache(os.path.join(directory, "缓存")), history)
+        self.assertEqual((summary.rows, summary.valid, summary.saved), (2, 1, 1))
+        self.assertEqual(summary.errors, {INVALID_ACTUAL_COST: 1})
+        self.assertEqual([record["产品名称"] for record in history.records], ["B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1390 @@
+"""
+标准成本差异计算核心模块
+命令行版（标准成本差异计算系统2.0.py）和图形界面版（标准成本差异计算系统2.0(GUI版).py）共用的部分：
+1. 标准参数与差异类型（公式声明，编译为NumPy函数）
+2. 批量输入验证
+3. 定长二进制历史文件、历史记录管理与索引
+4. 月度差异汇总报表
+5. 标准参数敏感性分析
+两个程序读写同一种历史文件，格式和内置差异类型只在本模块中定义
+"""
+
+import ast
+import heapq
+import itertools
+import json
+import os
+import struct
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from money import group_sum, to_cents, to_yuan
+
+
+# ==================== 标准参数配置类 ====================
+class StandardParams:
+    """
+    存储系统标准参数的静态类
+    所有参数使用类属性方式存储，便于集中管理
+    参数说明：
+    - HOURS: 每件产品标准工时(小时/件)
+    - MATERIAL_USAGE: 每件产品标准材料用量(千克/件)
+    - MATERIAL_PRICE: 标准材料单价(元/千克)
+    - LABOR_RATE: 标准人工费率(元/小时)
+    - VARIABLE_RATE: 变动制造费用标准费率(元/小时)
+    - FIXED_RATE: 固定制造费用标准费率(元/小时)
+    """
+    HOURS = 2  # (小时/件)
+    MATERIAL_USAGE = 5.5  # (千克/件)
+    MATERIAL_PRICE = 2.2  # (元/千克)
+    LABOR_RATE = 6  # (元/小时)
+    VARIABLE_RATE = 3  # (元/小时)
+    FIXED_RATE = 1.5  # (元/小时)
+
+
+# 参数属性名与中文名称对照表（按显示顺序排列）
+PARAM_LABELS = {
+    "HOURS": "标准工时", "MATERIAL_USAGE": "标准材料用量", "MATERIAL_PRICE": "标准材料单价",
+    "LABOR_RATE": "标准人工费率", "VARIABLE_RATE": "变动制造费率", "FIXED_RATE": "固定制造费率"}
+
+
+# ==================== 成本差异金额 ====================
+# 舍入和格式化函数见money.py；差异的实际成本与标准成本各自取整到分后相减
+
+
+def variance_cents(actual_cost, quantity, calc_type, params=None, rounding=None):
+    """
+    成本差异（分）= 实际成本（分） - 标准成本（分），两项各自按舍入规则取整后相减
+    参数:
+        actual_cost (float/array): 实际成本（元）
+        quantity (int/array): 产品数量
+        calc_type (str/array): 计算类型名称；为整数数组时表示UNIT_STANDARD_COST中的序号
+        params: 标准参数，缺省为StandardParams
+        rounding (str): 舍入规则，缺省为MONEY_ROUNDING
+    返回:
+        int/ndarray: 成本差异（分）
+    """
+    params = params or StandardParams
+    if isinstance(calc_type, str):
+        unit_cost = UNIT_STANDARD_COST[calc_type](params)
+    else:
+        unit_cost = np.array([cost(params) for cost in UNIT_STANDARD_COST.values()])[calc_type]
+    return to_cents(actual_cost, rounding) - to_cents(np.multiply(quantity, unit_cost), rounding)
+
+
+# ==================== 批量输入验证模块 ====================
+class ValidationResult:
+    """
+    批量验证结果
+    属性:
+        size (int): 总行数
+        values (dict): 字段名 → 解析后的数组（数值字段无效处为NaN，文本字段为去除首尾空白的字符串）
+        codes (dict): 取值受限字段的字段名 → 取值序号数组（无效为-1）
+        errors (dict): 错误说明 → 逐行布尔掩码
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = {}
+        self.codes = {}
+        self.errors = {}
+
+    def add_error(self, message, mask):
+        """登记一条规则的逐行错误掩码"""
+        if mask.any():
+            self.errors[message] = self.errors[message] | mask if message in self.errors else mask
+
+    @property
+    def invalid(self):
+        """逐行错误掩码：任一规则未通过的行为True"""
+        mask = np.zeros(self.size, dtype=bool)
+        for error_mask in self.errors.values():
+            mask |= error_mask
+        return mask
+
+    def summary(self):
+        """
+        返回:
+            dict: 错误说明 → 出错行数
+        """
+        return {message: int(mask.sum()) for message, mask in self.errors.items()}
+
+    def row_errors(self, limit=20):
+        """
+        参数:
+            limit (int): 最多返回的行数
+        返回:
+            list: [(行号(从0开始), 错误说明列表), ...]
+        """
+        return [(int(row), [message for message, mask in self.errors.items() if mask[row]])
+                for row in np.flatnonzero(self.invalid)[:limit]]
+
+    def report(self, limit=20):
+        """
+        逐行错误报告
+        参数:
+            limit (int): 最多报告的行数
+        返回:
+            list: 形如"第3行：生产数量不能小于1；实际成本不能为空"的字符串列表（行号从1开始）
+        """
+        return ["第{}行：{}".format(row + 1, "；".join(messages)) for row, messages in self.row_errors(limit)]
+
+
+class BatchValidator:
+    """
+    按规则整列验证批量输入，不抛出异常，结果以逐行错误掩码返回
+    字段规则：(字段名, 数据类型, 最小值, 最大值, 适用取值)
+    - 数据类型为str表示非空文本，为元组表示只能取元组中的值，为int/float表示数值
+    - 适用取值为None表示规则适用于全部行，否则只适用于条件字段取这些值的行
+    跨字段规则：(错误说明, 适用取值, 函数)，函数接收解析后的values字典，返回逐行是否通过
+    """
+
+    def __init__(self, fields, condition_field=None, checks=()):
+        """
+        参数:
+            fields (list): 字段规则列表
+            condition_field (str): 适用取值所对应的字段，必须是取值受限的字段
+            checks (list): 跨字段规则列表
+        """
+        self.fields = fields
+        self.condition_field = condition_field
+        self.checks = checks
+
+    @staticmethod
+    def _is_empty(value):
+        return value is None or (isinstance(value, str) and not value.strip())
+
+    @staticmethod
+    def _to_float(value):
+        """单个值转换为浮点数，无法转换时返回NaN"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    @staticmethod
+    def _strip_texts(raw):
+        """整列均为字符串时返回去除首尾空白后的对象数组，否则返回None"""
+        try:
+            return np.array(list(map(str.strip, raw)), dtype=object)
+        except TypeError:
+            return None
+
+    def _parse_number(self, raw, size):
+        """
+        整列解析数值
+        返回:
+            tuple: (数值数组, 空值掩码, 格式错误掩码)
+        """
+        try:
+            texts = self._strip_texts(raw)
+            if texts is None:
+                # 数字列：None转换为NaN，按空单元格处理
+                values = np.asarray(raw, dtype=np.float64)
+                empty = np.fromiter((value is None for value in raw), dtype=bool, count=size)
+            else:
+                # 数值文本：找出空白单元格，只转换非空的部分
+                empty = texts == ""
+                filled = texts[~empty].tolist()
+                values = np.full(size, np.nan)
+                values[~empty] = np.fromiter(map(float, filled), dtype=np.float64, count=len(filled))
+            if values.shape != (size,):
+                raise ValueError
+        except (TypeError, ValueError):
+            # 含无法转换的值时逐个转换，定位出错行
+            values = np.fromiter((self._to_float(value) for value in raw), dtype=np.float64, count=size)
+            empty = np.fromiter((self._is_empty(value) for value in raw), dtype=bool, count=size)
+        bad = ~np.isfinite(values) & ~empty
+        values[~np.isfinite(values)] = np.nan
+        return values, empty, bad
+
+    def _condition_rows(self, result, applies):
+        """规则适用的行掩码"""
+        if applies is None:
+            return np.ones(result.size, dtype=bool)
+        choices = next(dtype for name, dtype, _, _, _ in self.fields if name == self.condition_field)
+        return np.isin(result.codes[self.condition_field], [choices.index(value) for value in applies])
+
+    def validate(self, columns):
+        """
+        整列验证
+        参数:
+            columns (dict): 字段名 → 原始值序列（字符串或数字），缺少的字段视为整列为空
+        返回:
+            ValidationResult: 验证结果
+        """
+        size = max((len(column) for column in columns.values()), default=0)
+        result = ValidationResult(size)
+        parsed = {}  # 数值字段名 → (空值掩码, 格式错误掩码)，同一字段有多条规则时只解析一次
+        # 条件字段排在最前，保证其取值序号先于其他规则得到
+        fields = sorted(self.fields, key=lambda field: field[0] != self.condition_field)
+        for name, dtype, min_val, max_val, applies in fields:
+            raw = columns.get(name, [None] * size)
+            rows = self._condition_rows(result, applies)
+            if dtype is str or isinstance(dtype, tuple):
+                if name not in result.values:
+                    texts = self._strip_texts(raw)
+                    if texts is None:
+                        texts = np.array(["" if value is None else str(value).strip() for value in raw], dtype=object)
+                    result.values[name] = texts
+                texts = result.values[name]
+                empty = texts == ""
+                result.add_error("{}不能为空".format(name), empty & rows)
+                if isinstance(dtype, tuple):
+                    index = {choice: idx for idx, choice in enumerate(dtype)}
+                    codes = np.fromiter(map(index.get, texts.tolist(), itertools.repeat(-1)), dtype=np.int64, count=size)
+                    result.codes[name] = codes
+                    result.add_error("{}取值无效".format(name), (codes < 0) & ~empty & rows)
+                continue
+            if name not in parsed:
+                result.values[name], *parsed[name] = self._parse_number(raw, size)
+            values = result.values[name]
+            empty, bad = parsed[name]
+            if dtype is int:
+                bad = bad | (np.isfinite(values) & (values != np.floor(values)))
+            result.add_error("{}不能为空".format(name), empty & rows)
+            result.add_error("{}格式错误".format(name), bad & rows)
+            with np.errstate(invalid="ignore"):
+                if min_val is not None:
+                    result.add_error("{}不能小于{}".format(name, min_val), (values < min_val) & rows)
+                if max_val is not None:
+                    result.add_error("{}不能大于{}".format(name, max_val), (values > max_val) & rows)
+        for message, applies, check in self.checks:
+            rows = self._condition_rows(result, applies)
+            with np.errstate(invalid="ignore"):
+                passed = check(result.values)
+            # 相关字段本身无效时只报告字段错误
+            result.add_error(message, ~passed & rows & ~result.invalid)
+        return result
+
+
+# ==================== 差异类型模块 ====================
+# 每种差异类型由两个公式声明：实际成本 = 输入字段的表达式，单位标准成本 = StandardParams字段的表达式
+# 差异 = 实际成本 - 产量 × 单位标准成本；公式在声明时解析验证一次，编译为逐元素计算的NumPy函数
+VARIANCE_TYPES_FILE = "差异类型.json"
+FORMULA_FUNCTIONS = {"abs": "abs", "min": "minimum", "max": "maximum", "sqrt": "sqrt"}  # 公式函数 → numpy函数
+FORMULA_ARITY = {"abs": (1, 1), "sqrt": (1, 1), "min": (2, None), "max": (2, None)}  # 参数个数(最少, 最多)，None为不限
+FORMULA_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Pow: "**",
+                     ast.UAdd: "+", ast.USub: "-"}
+MAX_EXPONENT = 10  # 乘方的指数只能是绝对值不超过该值的常数，避免 9**9**9 之类的公式长时间计算
+RESERVED_FIELDS = ("产品名称", "计算类型", "生产数量")
+INVALID_ACTUAL_COST = "实际成本计算结果无效（公式中除以零或对负数开方）"
+_KERNEL_CACHE = {}  # 生成的表达式源码 → 编译后的函数，相同公式只编译一次
+
+
+class _AnyName:
+    """允许任意名称（用于从公式中推断输入字段）"""
+
+    def __contains__(self, name):
+        return name not in FORMULA_FUNCTIONS
+
+
+def _formula_source(node, target, names):
+    """
+    公式语法树转换为NumPy表达式源码，同时检查只使用了允许的运算、函数和名称
+    参数:
+        node (ast.AST): 公式语法树节点
+        target (str): "values"表示名称取自字典参数v，"params"表示取自参数对象p的同名属性
+        names (SimpleNamespace): formula公式原文，allowed允许引用的名称，used按首次出现顺序记录引用到的名称
+    返回:
+        str: 表达式源码
+    """
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        exponent = node.right
+        if isinstance(exponent, ast.UnaryOp) and isinstance(exponent.op, (ast.UAdd, ast.USub)):
+            exponent = exponent.operand
+        if not (isinstance(exponent, ast.Constant) and type(exponent.value) in (int, float)
+                and abs(exponent.value) <= MAX_EXPONENT):
+            raise ValueError("乘方的指数必须是绝对值不超过{}的常数：{}".format(
+                MAX_EXPONENT, ast.get_source_segment(names.formula, node) or "**"))
+    if isinstance(node, ast.BinOp) and type(node.op) in FORMULA_OPERATORS:
+        return "({} {} {})".format(_formula_source(node.left, target, names), FORMULA_OPERATORS[type(node.op)],
+                                   _formula_source(node.right, target, names))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in FORMULA_OPERATORS:
+        return "({}{})".format(FORMULA_OPERATORS[type(node.op)], _formula_source(node.operand, target, names))
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        try:
+            return repr(float(node.value))  # 按浮点数计算，不做任意精度的整数运算
+        except OverflowError:
+            raise ValueError("公式中的常数过大：{}".format(node.value))
+    if isinstance(node, ast.Name):
+        if node.id not in names.allowed:
+            raise ValueError("公式引用了未知名称：{}".format(node.id))
+        if node.id not in names.used:
+            names.used.append(node.id)
+        return "p.{}".format(node.id) if target == "params" else "v[{!r}]".format(node.id)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FORMULA_FUNCTIONS
+            and not node.keywords):
+        # numpy的minimum/maximum只比较两个数，多余的位置参数会被当作out；min/max按两两比较展开
+        least, most = FORMULA_ARITY[node.func.id]
+        if len(node.args) < least or (most is not None and len(node.args) > most):
+            raise ValueError("{}函数需要{}个参数：{}".format(
+                node.func.id, least if least == most else "至少{}".format(least),
+                ast.get_source_segment(names.formula, node) or node.func.id))
+        function = "np.{}".format(FORMULA_FUNCTIONS[node.func.id])
+        args = [_formula_source(arg, target, names) for arg in node.args]
+        source = "{}({})".format(function, args[0]) if len(args) == 1 else args[0]
+        for arg in args[1:]:
+            source = "{}({}, {})".format(function, source, arg)
+        return source
+    raise ValueError("公式中不支持的写法：{}".format(ast.get_source_segment(names.formula, node) or type(node).__name__))
+
+
+def compile_formula(formula, allowed, target):
+    """
+    解析验证公式并编译为NumPy函数，相同公式只编译一次
+    参数:
+        formula (str): 公式，如 "实际用量 * 实际单价"，支持 + - * / **（指数为常数）、括号及abs/min/max/sqrt函数
+        allowed (iterable): 公式中允许引用的名称，None表示不限
+        target (str): "values"表示编译结果的参数为 名称 → 数值或数组 的字典，"params"表示参数为具有同名属性的对象
+    返回:
+        tuple: (编译后的函数, 公式引用的名称列表)
+    异常:
+        ValueError: 公式为空、语法错误、使用了不支持的写法或引用了未知名称
+    """
+    formula = str(formula).strip()
+    if not formula:
+        raise ValueError("公式不能为空")
+    try:
+        tree = ast.parse(formula, mode="eval")
+    except SyntaxError:
+        raise ValueError("公式语法错误：{}".format(formula))
+    names = SimpleNamespace(formula=formula, used=[],
+                            allowed=_AnyName() if allowed is None else set(allowed))
+    source = "lambda {}: {}".format("p" if target == "params" else "v", _formula_source(tree.body, target, names))
+    kernel = _KERNEL_CACHE.get(source)
+    if kernel is None:
+        kernel = _KERNEL_CACHE[source] = eval(source, {"np": np, "__builtins__": {}})
+    return kernel, names.used
+
+
+class VarianceType:
+    """
+    以公式声明的差异类型
+    - actual: 实际成本公式，引用输入字段（如 实际用量 * 实际单价）
+    - standard: 单位标准成本公式，引用StandardParams的字段（如 MATERIAL_USAGE * MATERIAL_PRICE）
+    - inputs: 输入字段名 → 输入提示，缺省时由实际成本公式引用的名称推断
+    - params: 该类型新增的标准参数，属性名 → [中文名称, 默认值]
+    """
+
+    def __init__(self, name, actual, standard, inputs=None, params=None, label=None):
+        """
+        参数:
+            name (str): 差异类型名称（同时是历史记录中的计算类型）
+            actual (str): 实际成本公式
+            standard (str): 单位标准成本公式
+            inputs (dict): 输入字段名 → 输入提示
+            params (dict): 新增标准参数，属性名 → [中文名称, 默认值]
+            label (str): 简称（GUI按钮文字），缺省为名称
+        异常:
+            ValueError: 名称、字段或公式不合法
+        """
+        self.name = str(name or "").strip()
+        if not self.name:
+            raise ValueError("差异类型名称不能为空")
+        self.label = label or self.name
+        self.params = {}
+        for attr_name, (param_label, value) in (params or {}).items():
+            if not attr_name.isidentifier() or attr_name.startswith("_"):
+                raise ValueError("参数属性名不合法：{}".format(attr_name))
+            try:
+                self.params[attr_name] = [str(param_label), float(value)]
+            except ValueError:
+                raise ValueError("参数 {} 的取值不是数字：{}".format(attr_name, value))
+        self.actual, self.standard = str(actual).strip(), str(standard).strip()
+        self.actual_kernel, used = compile_formula(self.actual, None if inputs is None else inputs, "values")
+        self.inputs = dict(inputs) if inputs is not None else {field: field for field in used}
+        for field in self.inputs:
+            if not field.isidentifier() or field in RESERVED_FIELDS:
+                raise ValueError("输入字段名不合法：{}".format(field))
+        self.standard_kernel, _ = compile_formula(self.standard, list(PARAM_LABELS) + list(self.params), "params")
+
+    def to_dict(self):
+        """
+        返回:
+            dict: 可JSON序列化的声明，与构造参数对应
+        """
+        declaration = {"name": self.name, "actual": self.actual, "standard": self.standard, "inputs": self.inputs}
+        if self.params:
+            declaration["params"] = self.params
+        if self.label != self.name:
+            declaration["label"] = self.label
+        return declaration
+
+
+# 已注册的差异类型（按菜单显示顺序）和各类型的单位标准成本(元/件)
+# 单位标准成本函数的参数p只需具有StandardParams的同名属性，属性为numpy数组时按广播规则逐元素计算
+VARIANCE_TYPES = {}
+UNIT_STANDARD_COST = {}
+CUSTOM_VARIANCE_TYPES = []  # 自定义差异类型名称（保存到差异类型文件的部分）
+VARIANCE_VALIDATOR = BatchValidator([], condition_field="计算类型")  # 已注册差异类型的批量验证器，注册和注销时更新规则
+# 旧版图形界面使用的内置类型名称 → 统一名称（两个程序共用历史文件，内置类型名称必须一致）
+LEGACY_TYPE_NAMES = {"直接人工成本差异": "直接人工标准成本差异", "直接变动成本差异": "变动制造费用成本差异",
+                     "直接固定成本差异": "固定制造费用成本差异"}
+
+
+def variance_fields():
+    """
+    由已注册的差异类型生成批量计算的字段规则：(字段名, 数据类型, 最小值, 最大值, 适用计算类型)
+    每个输入字段只对引用它的差异类型必填
+    """
+    fields = [
+        ("产品名称", str, None, None, None),
+        ("计算类型", tuple(VARIANCE_TYPES), None, None, None),
+        ("生产数量", int, 1, None, None)]
+    applies = {}
+    for variance_type in VARIANCE_TYPES.values():
+        for field in variance_type.inputs:
+            applies.setdefault(field, []).append(variance_type.name)
+    fields.extend((field, float, 0, None, tuple(names)) for field, names in applies.items())
+    return fields
+
+
+def register_variance_type(variance_type, custom=True):
+    """
+    注册差异类型，新增的标准参数写入StandardParams（已存在的参数保持当前值），并重建批量验证规则
+    参数:
+        variance_type (VarianceType): 差异类型
+        custom (bool): 是否为自定义类型（保存到差异类型文件）
+    异常:
+        ValueError: 同名差异类型已存在
+    """
+    if variance_type.name in VARIANCE_TYPES:
+        raise ValueError("差异类型已存在：{}".format(variance_type.name))
+    variance_type.added_params = [attr_name for attr_name in variance_type.params if attr_name not in PARAM_LABELS]
+    for attr_name in variance_type.added_params:
+        PARAM_LABELS[attr_name], value = variance_type.params[attr_name]
+        setattr(StandardParams, attr_name, value)
+    VARIANCE_TYPES[variance_type.name] = variance_type
+    UNIT_STANDARD_COST[variance_type.name] = variance_type.standard_kernel
+    if custom:
+        CUSTOM_VARIANCE_TYPES.append(variance_type.name)
+    VARIANCE_VALIDATOR.fields = variance_fields()
+
+
+def unregister_variance_type(name):
+    """
+    注销差异类型（用于注册后保存失败时撤销），同时删除注册时新增的标准参数
+    参数:
+        name (str): 差异类型名称
+    """
+    variance_type = VARIANCE_TYPES.pop(name)
+    del UNIT_STANDARD_COST[name]
+    if name in CUSTOM_VARIANCE_TYPES:
+        CUSTOM_VARIANCE_TYPES.remove(name)
+    for attr_name in variance_type.added_params:
+        del PARAM_LABELS[attr_name]
+        delattr(StandardParams, attr_name)
+    VARIANCE_VALIDATOR.fields = variance_fields()
+
+
+def load_variance_types(filename=VARIANCE_TYPES_FILE):
+    """
+    加载差异类型文件（JSON数组，每项为VarianceType的构造参数）
+    参数:
+        filename (str): 差异类型文件路径
+    返回:
+        int: 新注册的差异类型数
+    异常:
+        ValueError: 文件格式或某个声明不合法（该声明之前的类型已注册）
+    """
+    with open(filename, encoding="utf-8") as f:
+        declarations = json.load(f)
+    if not isinstance(declarations, list):
+        raise ValueError("差异类型文件应为JSON数组")
+    for number, declaration in enumerate(declarations, 1):
+        if not isinstance(declaration, dict):
+            raise ValueError("第{}项差异类型声明应为JSON对象".format(number))
+        try:
+            register_variance_type(VarianceType(**declaration))
+        except (TypeError, ValueError) as e:
+            raise ValueError("差异类型 {} 声明错误：{}".format(declaration.get("name", "?"), str(e)))
+    return len(declarations)
+
+
+def save_variance_types(filename=VARIANCE_TYPES_FILE):
+    """全部自定义差异类型写入差异类型文件（先写临时文件再替换，写入失败时原文件不变）"""
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "w", encoding="utf-8") as f:
+        json.dump([VARIANCE_TYPES[name].to_dict() for name in CUSTOM_VARIANCE_TYPES], f, ensure_ascii=False, indent=2)
+    os.replace(temp_filename, filename)
+
+
+for _declaration in (
+        {"name": "直接材料成本差异", "label": "材料成本差异", "actual": "实际用量 * 实际单价",
+         "standard": "MATERIAL_USAGE * MATERIAL_PRICE",
+         "inputs": {"实际用量": "实际耗用材料(千克)", "实际单价": "材料实际单价(元/千克)"}},
+        {"name": "直接人工标准成本差异", "label": "人工成本差异", "actual": "实际成本", "standard": "HOURS * LABOR_RATE",
+         "inputs": {"实际成本": "实际支付工资总额(元)"}},
+        {"name": "变动制造费用成本差异", "label": "变动费用差异", "actual": "实际成本", "standard": "HOURS * VARIABLE_RATE",
+         "inputs": {"实际成本": "实际发生变动制造费用(元)"}},
+        {"name": "固定制造费用成本差异", "label": "固定费用差异", "actual": "实际成本", "standard": "HOURS * FIXED_RATE",
+         "inputs": {"实际成本": "实际发生固定制造费用(元)"}}):
+    register_variance_type(VarianceType(**_declaration), custom=False)
+
+
+# ==================== 时间戳转换 ====================
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp(moment):
+    """
+    将本地时间转换为自1970-01-01起的秒数（不做时区换算，numpy可直接按本地日历分组）
+    参数:
+        moment (datetime): 本地时间，None表示未记录
+    返回:
+        int: 秒数，未记录时为0
+    """
+    return 0 if moment is None else int((moment - EPOCH).total_seconds())
+
+
+def from_timestamp(seconds):
+    """to_timestamp的逆运算，0返回None"""
+    return None if seconds == 0 else EPOCH + timedelta(seconds=int(seconds))
+
+
+# ==================== 二进制历史文件模块 ====================
+class BinaryHistoryStore:
+    """
+    定长二进制历史记录文件
+    文件结构：
+    - 数据文件：64字节文件头 + 定长记录区，记录区可直接用np.memmap映射
+    - 字符串表（数据文件名 + ".str"）：每行一个JSON字符串，行号即编号，存放产品名称和计算类型
+    追加流程（崩溃安全）：
+        1. 新字符串写入字符串表并落盘
+        2. 记录写入已提交记录之后并落盘
+        3. 更新文件头中的记录数并落盘
+    文件头记录数之后的数据视为未提交，打开文件时截除
+    旧版本文件在打开时自动转换为当前版本
+    对外表现为只读的记录序列，按下标或切片取得与HistoryManager相同格式的字典
+    """
+    MAGIC = b"HKHHIST\0"
+    VERSION = 2
+    HEADER = struct.Struct("<8sIIQ")  # 魔数, 版本, 记录长度, 已提交记录数
+    HEADER_SIZE = 64
+    # 实际成本未知时为NaN，时间为to_timestamp秒数（0表示未记录）
+    RECORD_DTYPE = np.dtype([("product", "<u4"), ("calc_type", "<u4"), ("quantity", "<i8"),
+                             ("result", "<f8"), ("actual_cost", "<f8"), ("timestamp", "<i8")])
+    LEGACY_DTYPES = {1: np.dtype([("product", "<u4"), ("calc_type", "<u4"), ("quantity", "<i8"),
+                                  ("result", "<f8"), ("actual_cost", "<f8")])}
+    CHUNK_SIZE = 65536  # 顺序遍历时每次读取的记录数
+
+    def __init__(self, filename):
+        """
+        打开或创建历史文件
+        参数:
+            filename (str): 数据文件路径
+        """
+        self.filename = filename
+        self.string_filename = filename + ".str"
+        exists = os.path.exists(filename) and os.path.getsize(filename) > 0
+        self._file = open(filename, "r+b" if exists else "w+b")
+        if exists:
+            magic, version, record_size, count = self.HEADER.unpack(self._file.read(self.HEADER.size))
+            if magic != self.MAGIC:
+                raise ValueError("不是有效的历史记录文件：{}".format(filename))
+            legacy_dtype = self.LEGACY_DTYPES.get(version)
+            if legacy_dtype is not None and record_size == legacy_dtype.itemsize:
+                self._upgrade(legacy_dtype, count)
+            elif version != self.VERSION or record_size != self.RECORD_DTYPE.itemsize:
+                raise ValueError("不支持的历史记录文件版本：{}".format(version))
+            self._count = count
+            self._file.truncate(self.HEADER_SIZE + count * self.RECORD_DTYPE.itemsize)
+        else:
+            self._count = 0
+            self._write_header()
+        self._data = None
+        self.strings = self._load_strings()
+        try:
+            self._check_strings()
+        except ValueError:
+            self._data = None
+            self._file.close()
+            raise
+        self._string_ids = {text: idx for idx, text in enumerate(self.strings)}
+        self._string_file = open(self.string_filename, "ab")
+        self._rename_legacy_types()
+
+    @staticmethod
+    def _sync(f):
+        """将文件缓冲写入磁盘"""
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _write_header(self):
+        """写入文件头并落盘，作为追加操作的提交点"""
+        self._file.seek(0)
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, self.RECORD_DTYPE.itemsize, self._count)
+        self._file.write(header.ljust(self.HEADER_SIZE, b"\0"))
+        self._sync(self._file)
+
+    def _upgrade(self, legacy_dtype, count):
+        """
+        将旧版本数据文件转换为当前版本：写入临时文件后整体替换，转换中断不影响原文件
+        参数:
+            legacy_dtype (np.dtype): 旧版本记录格式
+            count (int): 已提交记录数
+        """
+        temp_filename = self.filename + ".upgrade"
+        with open(temp_filename, "wb") as f:
+            header = self.HEADER.pack(self.MAGIC, self.VERSION, self.RECORD_DTYPE.itemsize, count)
+            f.write(header.ljust(self.HEADER_SIZE, b"\0"))
+            for start in range(0, count, self.CHUNK_SIZE):
+                self._file.seek(self.HEADER_SIZE + start * legacy_dtype.itemsize)
+                size = min(self.CHUNK_SIZE, count - start)
+                old = np.frombuffer(self._file.read(size * legacy_dtype.itemsize), dtype=legacy_dtype)
+                new = np.zeros(size, dtype=self.RECORD_DTYPE)
+                for name in legacy_dtype.names:
+                    new[name] = old[name]
+                f.write(new.tobytes())
+            self._sync(f)
+        self._file.close()
+        os.replace(temp_filename, self.filename)
+        self._file = open(self.filename, "r+b")
+
+    def _load_strings(self):
+        """读取字符串表，截除未写完整的最后一行"""
+        if not os.path.exists(self.string_filename):
+            return []
+        with open(self.string_filename, "r+b") as f:
+            content = f.read()
+            complete = content.rfind(b"\n") + 1
+            if complete < len(content):
+                f.truncate(complete)
+        return [json.loads(line) for line in content[:complete].decode("utf-8").splitlines()]
+
+    def _check_strings(self):
+        """
+        检查记录引用的字符串编号都在字符串表中
+        异常:
+            ValueError: 有记录时字符串表缺失或不完整
+        """
+        if not self._count:
+            return
+        if not os.path.exists(self.string_filename):
+            raise ValueError("历史文件的字符串表缺失：{}".format(self.string_filename))
+        data = self.data
+        referenced = max(int(data["product"].max()), int(data["calc_type"].max())) + 1
+        if referenced > len(self.strings):
+            raise ValueError("历史文件的字符串表不完整：{}（记录引用{}项，字符串表只有{}项）".format(
+                self.string_filename, referenced, len(self.strings)))
+
+    def _rename_legacy_types(self):
+        """
+        旧版图形界面写入的内置类型名称改为统一名称
+        记录中的类型编号改为统一名称的编号（字符串表只追加），改写可重复执行，中断后下次打开时继续
+        """
+        legacy = [idx for idx, text in enumerate(self.strings) if text in LEGACY_TYPE_NAMES]
+        if not legacy or not self._count:
+            return
+        records = np.memmap(self.filename, dtype=self.RECORD_DTYPE, mode="r+",
+                            offset=self.HEADER_SIZE, shape=(self._count,))
+        calc_type = records["calc_type"]
+        renamed = {idx: self._string_id(LEGACY_TYPE_NAMES[self.strings[idx]]) for idx in legacy
+                   if (calc_type == idx).any()}
+        if renamed:
+            self._sync(self._string_file)
+            for old, new in renamed.items():
+                calc_type[calc_type == old] = new
+            records.flush()
+        del records
+
+    def _string_id(self, text):
+        """取得字符串编号，新字符串追加到字符串表（由调用方负责落盘）"""
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            self._string_file.write((json.dumps(text, ensure_ascii=False) + "\n").encode("utf-8"))
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self._string_ids[text] = string_id
+        return string_id
+
+    def append_many(self, rows):
+        """
+        批量追加记录，全部写入后一次提交
+        参数:
+            rows (iterable): (产品名称, 产品数量, 计算类型, 结果, 实际成本, 时间) 元组序列
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        records = np.zeros(len(rows), dtype=self.RECORD_DTYPE)
+        for i, (cp_name, cp_number, calc_type, result, actual_cost, moment) in enumerate(rows):
+            records[i] = (self._string_id(cp_name), self._string_id(calc_type), cp_number, result,
+                          np.nan if actual_cost is None else actual_cost, to_timestamp(moment))
+        self._sync(self._string_file)
+        self._file.seek(self.HEADER_SIZE + self._count * self.RECORD_DTYPE.itemsize)
+        self._file.write(records.tobytes())
+        self._sync(self._file)
+        self._count += len(records)
+        self._write_header()
+
+    def append(self, cp_name, cp_number, calc_type, result, actual_cost=None, moment=None):
+        """追加单条记录"""
+        self.append_many([(cp_name, cp_number, calc_type, result, actual_cost, moment)])
+
+    @property
+    def data(self):
+        """
+        已提交记录的只读内存映射（零拷贝），按列访问如 data["result"]
+        记录数变化后重新映射
+        """
+        if self._data is None or len(self._data) != self._count:
+            if self._count:
+                self._data = np.memmap(self.filename, dtype=self.RECORD_DTYPE, mode="r",
+                                       offset=self.HEADER_SIZE, shape=(self._count,))
+            else:
+                self._data = np.zeros(0, dtype=self.RECORD_DTYPE)
+        return self._data
+
+    def _to_dict(self, row):
+        """将一条二进制记录转换为HistoryManager的字典格式"""
+        actual_cost = float(row["actual_cost"])
+        return {"产品名称": self.strings[row["product"]], "产品数量": int(row["quantity"]),
+                "计算类型": self.strings[row["calc_type"]], "结果": float(row["result"]),
+                "实际成本": None if np.isnan(actual_cost) else actual_cost, "时间": from_timestamp(row["timestamp"])}
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._to_dict(row) for row in self.data[index]]
+        return self._to_dict(self.data[index])
+
+    def __iter__(self):
+        data = self.data
+        for start in range(0, len(data), self.CHUNK_SIZE):
+            for row in np.array(data[start:start + self.CHUNK_SIZE]):
+                yield self._to_dict(row)
+
+    def close(self):
+        """关闭文件"""
+        self._data = None
+        self._file.close()
+        self._string_file.close()
+
+
+# ==================== 历史记录管理模块 ====================
+class HistoryManager:
+    """
+    历史记录管理类
+    功能：
+    1. 存储计算记录（内存列表或二进制历史文件）
+    2. 显示历史记录
+    3. 导出/导入Excel文件
+    """
+
+    def __init__(self, filename=None):
+        """
+        初始化历史记录存储结构
+        参数:
+            filename (str): 二进制历史文件路径，缺省时记录只保存在内存中
+        """
+        self.store = BinaryHistoryStore(filename) if filename else None
+        # 存储字典格式的记录；使用历史文件时为按需读取的只读序列
+        self.records = self.store if self.store is not None else []
+        self.headers = ["序号", "产品名称", "产品数量", "计算类型", "结果"]
+        self.index = HistoryIndex(self)  # 查询索引，首次查询时建立
+        self._column_cache = SimpleNamespace(  # 内存记录的列数组缓存，见columns
+            data=np.zeros(0, dtype=BinaryHistoryStore.RECORD_DTYPE), count=0, ids={}, strings=[])
+        # 已写入的CSV批量计算块：文件路径#块序号 → [缓存键, 行数]
+        # 按位置登记，内容相同的另一个文件（或同一文件的另一块）仍会写入；使用历史文件时保存在同名的.batches.json文件中
+        self.batch_ledger = {}
+        if self.store is not None and os.path.exists(self._ledger_path()):
+            with open(self._ledger_path(), encoding="utf-8") as f:
+                ledger = json.load(f)
+            self.batch_ledger = ledger.get("chunks", ledger.get("tails", {}))  # tails为旧版本的字段名
+
+    def _ledger_path(self):
+        return self.store.filename + ".batches.json"
+
+    def add_batch(self, rows, chunks):
+        """
+        写入一次批量计算的结果并登记对应的数据块
+        参数:
+            rows (list): 同add_records
+            chunks (list): [(文件路径#块序号, 缓存键, 行数), ...]
+        返回:
+            int: 添加的记录数
+        """
+        count = self.add_records(rows)
+        for position, key, lines in chunks:
+            self.batch_ledger[position] = [key, lines]
+        if self.store is not None:
+            temp_path = self._ledger_path() + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"chunks": self.batch_ledger}, f, ensure_ascii=False)
+            os.replace(temp_path, self._ledger_path())
+        return count
+
+    def add_record(self, cp_name, cp_number, calc_type, result, actual_cost=None, moment=None):
+        """
+        添加新记录
+        参数:
+            cp_name (str): 产品名称
+            cp_number (int): 产品数量
+            calc_type (str): 计算类型名称
+            result (float): 计算结果
+            actual_cost (float): 实际成本，缺省时按当前标准参数由结果反推
+            moment (datetime): 记录时间，缺省为当前时间
+        """
+        if actual_cost is None and calc_type in UNIT_STANDARD_COST:
+            actual_cost = to_yuan(to_cents(result) + to_cents(cp_number * UNIT_STANDARD_COST[calc_type](StandardParams)))
+        moment = moment or datetime.now().replace(microsecond=0)
+        if self.store is not None:
+            self.store.append(cp_name, cp_number, calc_type, result, actual_cost, moment)
+        else:
+            self.records.append({"产品名称": cp_name, "产品数量": cp_number, "计算类型": calc_type, "结果": result,
+                                 "实际成本": actual_cost, "时间": moment})
+
+    def columns(self):
+        """
+        以列数组形式返回全部记录，供汇总查询使用
+        返回:
+            tuple: (结构化数组，字段同BinaryHistoryStore.RECORD_DTYPE; 字符串表，产品和类型字段为其下标)
+            使用历史文件时直接返回内存映射，不做任何解析
+        """
+        if self.store is not None:
+            return self.store.data, self.store.strings
+        # 内存记录只追加不修改：缓存已转换的列数组和字符串表，每次只转换上次之后新增的记录
+        cache = self._column_cache
+        total = len(self.records)
+        if total > cache.count:
+            if total > len(cache.data):
+                # 容量按倍数增长，数组复制的均摊代价与新增记录数成正比
+                grown = np.zeros(max(total, 2 * len(cache.data), 1024), dtype=BinaryHistoryStore.RECORD_DTYPE)
+                grown[:cache.count] = cache.data[:cache.count]
+                cache.data = grown
+
+            def string_id(text):
+                if text not in cache.ids:
+                    cache.ids[text] = len(cache.strings)
+                    cache.strings.append(text)
+                return cache.ids[text]
+
+            new = self.records[cache.count:total]
+            block = cache.data[cache.count:total]
+            block["product"] = [string_id(record["产品名称"]) for record in new]
+            block["calc_type"] = [string_id(record["计算类型"]) for record in new]
+            block["quantity"] = [record["产品数量"] for record in new]
+            block["result"] = [record["结果"] for record in new]
+            block["actual_cost"] = [np.nan if record.get("实际成本") is None else record["实际成本"] for record in new]
+            block["timestamp"] = [to_timestamp(record.get("时间")) for record in new]
+            cache.count = total
+        return cache.data[:cache.count], cache.strings
+
+    def close(self):
+        """关闭历史文件"""
+        if self.store is not None:
+            self.store.close()
+
+    def export_excel(self, filename="历史记录.xlsx"):
+        """
+        导出历史记录到Excel文件
+        参数:
+            filename (str): 导出文件名
+        异常:
+            OSError: 文件无法写入
+        """
+        wb = Workbook()
+        ws = wb.active
+
+        # 设置标题行
+        ws.append(self.headers)
+
+        # 填充数据行
+        for idx, record in enumerate(self.records, 1):
+            ws.append([idx, record["产品名称"], record["产品数量"], record["计算类型"], record["结果"]])
+
+        # 自动调整列宽（需要openpyxl 2.6+）
+        for column in ws.columns:
+            max_length = 0
+            column = [cell for cell in column]
+            for cell in column:
+                try:
+                    if len(str(cell.value)) > max_length:
+                        max_length = len(str(cell.value))
+                except:
+                    pass
+            adjusted_width = (max_length + 2)
+            ws.column_dimensions[column[0].column_letter].width = adjusted_width
+
+        wb.save(filename)
+
+    def import_excel(self, filename="历史记录.xlsx", batch_size=100000):
+        """
+        导入export_excel导出的历史记录（只读模式流式读取）
+        实际成本按当前标准参数由结果反推，导入的记录不带时间
+        参数:
+            filename (str): Excel文件名
+            batch_size (int): 写入历史文件时每批提交的记录数
+        返回:
+            int: 导入的记录数
+        """
+        wb = load_workbook(filename, read_only=True)
+        batch, count = [], 0
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            if not row or row[1] is None:
+                continue
+            _, cp_name, cp_number, calc_type, result = row[:5]
+            calc_type = LEGACY_TYPE_NAMES.get(calc_type, calc_type)
+            result = to_cents(result)
+            actual_cost = None
+            if calc_type in UNIT_STANDARD_COST:
+                actual_cost = to_yuan(result + to_cents(cp_number * UNIT_STANDARD_COST[calc_type](StandardParams)))
+            batch.append((str(cp_name), int(cp_number), str(calc_type), to_yuan(result), actual_cost, None))
+            if len(batch) >= batch_size:
+                count += self.add_records(batch)
+                batch = []
+        count += self.add_records(batch)
+        wb.close()
+        return count
+
+    def add_records(self, rows):
+        """
+        批量添加记录
+        参数:
+            rows (list): (产品名称, 产品数量, 计算类型, 结果, 实际成本, 时间) 元组列表
+        返回:
+            int: 添加的记录数
+        """
+        if self.store is not None:
+            self.store.append_many(rows)
+        else:
+            self.records.extend({"产品名称": cp_name, "产品数量": cp_number, "计算类型": calc_type, "结果": result,
+                                 "实际成本": actual_cost, "时间": moment}
+                                for cp_name, cp_number, calc_type, result, actual_cost, moment in rows)
+        return len(rows)
+
+
+# ==================== 历史记录索引模块 ====================
+class HistoryIndex:
+    """
+    历史记录二级索引
+    索引结构：
+    - 哈希索引：产品编号/类型编号 → 按行号升序的行号数组
+    - 有序索引：按产品数量、结果升序排列的行号数组及对应键值，范围查询用二分查找
+    查询时先用最有选择性的索引取得候选行，其余条件在候选行上按列向量化过滤
+    记录追加后，下次查询时只为新增行建立索引并归并到已有索引中
+    """
+    HEAP_LIMIT = 65536  # 候选行不超过该数量时用堆求Top-K，否则沿有序索引分块查找
+
+    def __init__(self, history):
+        """
+        参数:
+            history (HistoryManager): 历史记录管理器
+        """
+        self.history = history
+        self._count = 0
+        self._hash = {"product": {}, "calc_type": {}}
+        self._sorted = {"quantity": (np.zeros(0, np.int64), np.zeros(0)), "result": (np.zeros(0, np.int64), np.zeros(0))}
+        self.data, self.strings = None, []
+
+    def refresh(self):
+        """同步索引与历史记录，只处理上次同步后新增的记录"""
+        self.data, self.strings = self.history.columns()
+        total = len(self.data)
+        if total == self._count:
+            return
+        start, new = self._count, self.data[self._count:]
+        rows = np.arange(start, total, dtype=np.int64)
+        for field, table in self._hash.items():
+            ids = new[field]
+            order = np.argsort(ids, kind="stable")
+            unique_ids, first = np.unique(ids[order], return_index=True)
+            for string_id, group in zip(unique_ids.tolist(), np.split(rows[order], first[1:])):
+                table[string_id] = np.concatenate((table[string_id], group)) if string_id in table else group
+        for field, (sorted_rows, keys) in self._sorted.items():
+            new_keys = new[field].astype(np.float64)
+            order = np.argsort(new_keys, kind="stable")
+            positions = np.searchsorted(keys, new_keys[order], side="right")
+            self._sorted[field] = (np.insert(sorted_rows, positions, rows[order]),
+                                   np.insert(keys, positions, new_keys[order]))
+        self._count = total
+
+    def _hash_rows(self, field, keyword):
+        """名称包含关键字的全部编号对应的行号（升序）"""
+        table = self._hash[field]
+        groups = [rows for string_id, rows in table.items() if keyword in self.strings[string_id]]
+        if not groups:
+            return np.zeros(0, np.int64)
+        return np.sort(np.concatenate(groups)) if len(groups) > 1 else groups[0]
+
+    def names(self, field):
+        """
+        某字段出现过的全部名称
+        参数:
+            field (str): product或calc_type
+        返回:
+            list: 名称列表（升序）
+        """
+        self.refresh()
+        return sorted(self.strings[string_id] for string_id in self._hash[field])
+
+    def exact_rows(self, field, name):
+        """
+        名称与name完全相同的行号，调用前应先refresh同步索引
+        参数:
+            field (str): product或calc_type
+            name (str): 名称
+        返回:
+            ndarray: 行号数组（升序）
+        """
+        if name not in self.strings:
+            return np.zeros(0, np.int64)
+        return self._hash[field].get(self.strings.index(name), np.zeros(0, np.int64))
+
+    def _range_rows(self, field, low, high):
+        """键值在[low, high]内的行号（按键值排序，None表示不限）"""
+        sorted_rows, keys = self._sorted[field]
+        left = 0 if low is None else np.searchsorted(keys, low, side="left")
+        right = len(keys) if high is None else np.searchsorted(keys, high, side="right")
+        return sorted_rows[left:right]
+
+    def _residual(self, rows, conditions, skip=None):
+        """在候选行上按列判断其余条件，skip为已由索引保证的条件名"""
+        for field in ("quantity", "result"):
+            bounds = conditions.get(field + "_range")
+            if bounds is None or skip == field or not len(rows):
+                continue
+            values = self.data[field][rows]
+            low, high = bounds
+            mask = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            rows = rows[mask]
+        for field in ("product", "calc_type"):
+            keyword = conditions.get(field)
+            if not keyword or skip == field or not len(rows):
+                continue
+            matched = np.array([keyword in text for text in self.strings], dtype=bool)
+            rows = rows[matched[self.data[field][rows]]]
+        return rows
+
+    def _filter(self, conditions):
+        """
+        按条件筛选行号
+        参数:
+            conditions (dict): product/calc_type/quantity_range/result_range 筛选条件
+        返回:
+            ndarray: 满足全部条件的行号（顺序不定）；没有任何条件时返回None
+        """
+        self.refresh()
+        candidates = []
+        for field in ("product", "calc_type"):
+            if conditions.get(field):
+                candidates.append((field, self._hash_rows(field, conditions[field])))
+        for field in ("quantity", "result"):
+            bounds = conditions.get(field + "_range")
+            if bounds is not None and tuple(bounds) != (None, None):
+                candidates.append((field, self._range_rows(field, *bounds)))
+        if not candidates:
+            return None
+        field, rows = min(candidates, key=lambda item: len(item[1]))
+        return self._residual(rows, conditions, skip=field)
+
+    def query(self, product=None, calc_type=None, quantity_range=None, result_range=None,
+              sort_by_magnitude=False, limit=None):
+        """
+        条件查询
+        参数:
+            product (str): 产品名称关键字
+            calc_type (str): 计算类型关键字
+            quantity_range (tuple): 产品数量范围(最小值, 最大值)，None表示不限
+            result_range (tuple): 差异金额范围(最小值, 最大值)，None表示不限
+            sort_by_magnitude (bool): 是否按差异绝对值降序排列，否则按记录顺序
+            limit (int): 最多返回的行数
+        返回:
+            tuple: (行号数组, 满足条件的总行数)
+        """
+        if limit is not None and limit < 0:
+            raise ValueError("返回行数不能为负数：{}".format(limit))
+        rows = self._filter({"product": product, "calc_type": calc_type,
+                             "quantity_range": quantity_range, "result_range": result_range})
+        if rows is None:
+            rows = np.arange(self._count, dtype=np.int64)
+        total = len(rows)
+        partial = limit is not None and limit < total
+        if sort_by_magnitude:
+            magnitude = np.abs(self.data["result"][rows])
+            if partial:
+                top = np.argpartition(-magnitude, limit)[:limit]
+                rows, magnitude = rows[top], magnitude[top]
+            rows = rows[np.argsort(-magnitude, kind="stable")]
+        else:
+            rows = np.sort(np.partition(rows, limit)[:limit] if partial else rows)
+        return rows, total
+
+    def top_unfavorable(self, k=10, **conditions):
+        """
+        差异金额最大的K条不利差异（差异>0）
+        参数:
+            k (int): 返回条数
+            conditions: 与query相同的筛选条件
+        返回:
+            ndarray: 行号数组，按差异金额降序
+        """
+        if k < 0:
+            raise ValueError("返回条数不能为负数：{}".format(k))
+        rows = self._filter(conditions)
+        sorted_rows, keys = self._sorted["result"]
+        positive_start = np.searchsorted(keys, 0, side="right")
+        if rows is None:
+            # 无筛选条件时直接取有序索引的尾部
+            return sorted_rows[max(positive_start, len(keys) - k):][::-1]
+        if len(rows) <= self.HEAP_LIMIT:
+            values = self.data["result"][rows]
+            positive = values > 0
+            pairs = zip(values[positive].tolist(), rows[positive].tolist())
+            return np.array([row for _, row in heapq.nlargest(k, pairs)], dtype=np.int64)
+        # 候选行较多说明条件选择性低，沿有序索引从大到小分块检查，找满K条即停止
+        found, end = [], len(keys)
+        while end > positive_start and sum(map(len, found)) < k:
+            start = max(positive_start, end - max(4 * k, 4096))
+            found.append(self._residual(sorted_rows[start:end][::-1], conditions))
+            end = start
+        return np.concatenate(found)[:k] if found else np.zeros(0, np.int64)
+
+
+# ==================== 报表生成模块 ====================
+class ReportGenerator:
+    """
+    多期间差异汇总报表
+    功能：
+    1. 对全部记录单次扫描，按 月份 × 产品 × 计算类型 哈希分组汇总
+       记录分块处理，内存占用只与分组数有关，与记录数无关
+       差异金额按整数分汇总，合计与逐笔相加的账面金额完全一致
+    2. 以只写模式流式写入Excel：
+       - "汇总"表：各月份各计算类型的差异合计
+       - 每个月份一张表：按产品列示各计算类型差异，附产品小计和月度合计
+    """
+    HEADERS = ["产品名称", "计算类型", "记录数", "产品数量", "不利差异", "有利差异", "差异合计"]
+    CHUNK_SIZE = 1 << 20  # 每次扫描的记录数
+    UNDATED = -1  # 未记录时间的记录所属的月份序号
+
+    def __init__(self, history):
+        """
+        参数:
+            history (HistoryManager): 历史记录管理器
+        """
+        self.history = history
+
+    def group(self, year=None):
+        """
+        按月份 × 产品 × 计算类型分组汇总
+        参数:
+            year (int): 只汇总该年度的记录，缺省汇总全部记录
+        返回:
+            dict: {(月份序号, 产品名称, 计算类型): [记录数, 产品数量, 不利差异(分), 有利差异(分)]}
+                  月份序号为自1970年1月起的月数，未记录时间为UNDATED
+        """
+        data, strings = self.history.columns()
+        width = max(len(strings), 1)
+        groups = {}
+        for start in range(0, len(data), self.CHUNK_SIZE):
+            chunk = data[start:start + self.CHUNK_SIZE]
+            timestamps = chunk["timestamp"]
+            months = timestamps.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+            months[timestamps == 0] = self.UNDATED
+            if year is not None:
+                keep = (months != self.UNDATED) & (months // 12 + 1970 == year)
+                chunk, months = chunk[keep], months[keep]
+            # 三个分组字段合成一个整数键，用np.unique得到本块的分组，再并入全局哈希表
+            keys = ((months - self.UNDATED) * width + chunk["product"]) * width + chunk["calc_type"]
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            cents = to_cents(chunk["result"])
+            sums = np.column_stack([
+                np.bincount(inverse, minlength=len(unique_keys)),
+                group_sum(inverse, chunk["quantity"], len(unique_keys)),
+                group_sum(inverse, np.maximum(cents, 0), len(unique_keys)),
+                group_sum(inverse, np.minimum(cents, 0), len(unique_keys))])
+            for key, row in zip(unique_keys.tolist(), sums.tolist()):
+                total = groups.get(key)
+                if total is None:
+                    groups[key] = row
+                else:
+                    for i, value in enumerate(row):
+                        total[i] += value
+        decoded = {}
+        for key, row in groups.items():
+            key, type_id = divmod(key, width)
+            month, product_id = divmod(key, width)
+            decoded[(month + self.UNDATED, strings[product_id], strings[type_id])] = row
+        return decoded
+
+    @classmethod
+    def period_title(cls, month):
+        """月份序号转换为工作表名称，如 2024-01"""
+        if month == cls.UNDATED:
+            return "未记录时间"
+        return "{:04d}-{:02d}".format(month // 12 + 1970, month % 12 + 1)
+
+    @staticmethod
+    def _values(totals):
+        """[记录数, 产品数量, 不利差异(分), 有利差异(分)] → 报表数值列（金额为元）"""
+        count, quantity, unfavorable, favorable = totals
+        return [count, quantity, to_yuan(unfavorable), to_yuan(favorable), to_yuan(unfavorable + favorable)]
+
+    @staticmethod
+    def _bold_row(ws, values):
+        """只写模式下的加粗行（小计、合计）"""
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
+
+    def generate(self, filename="差异月报.xlsx", year=None):
+        """
+        生成月度差异汇总报表
+        参数:
+            filename (str): 报表文件名
+            year (int): 只统计该年度，缺省统计全部记录
+        返回:
+            int: 生成的月度工作表数量
+        """
+        by_month = {}
+        for (month, product, calc_type), totals in self.group(year).items():
+            by_month.setdefault(month, []).append((product, calc_type, totals))
+
+        wb = Workbook(write_only=True)
+        summary = wb.create_sheet("汇总")
+        type_names = sorted({calc_type for rows in by_month.values() for _, calc_type, _ in rows})
+        summary.append(["期间"] + type_names + ["差异合计"])
+        summary_rows = []
+        for month in sorted(by_month):
+            title = self.period_title(month)
+            ws = wb.create_sheet(title)
+            ws.append(self.HEADERS)
+            month_total = [0] * 4
+            type_totals = dict.fromkeys(type_names, 0)
+            rows = sorted(by_month[month], key=lambda item: (item[0], item[1]))
+            for product, product_rows in itertools.groupby(rows, key=lambda item: item[0]):
+                subtotal = [0] * 4
+                for _, calc_type, totals in product_rows:
+                    ws.append([product, calc_type] + self._values(totals))
+                    subtotal = [a + b for a, b in zip(subtotal, totals)]
+                    type_totals[calc_type] += totals[2] + totals[3]
+                ws.append(self._bold_row(ws, [product, "小计"] + self._values(subtotal)))
+                month_total = [a + b for a, b in zip(month_total, subtotal)]
+            ws.append(self._bold_row(ws, ["合计", ""] + self._values(month_total)))
+            summary_rows.append([title] + [to_yuan(type_totals[name]) for name in type_names]
+                                + [to_yuan(month_total[2] + month_total[3])])
+        for row in summary_rows:
+            summary.append(row)
+        wb.save(filename)
+        return len(by_month)
+
+
+# ==================== 敏感性分析模块 ====================
+class SensitivityAnalyzer:
+    """
+    标准参数敏感性分析类
+    功能：
+    1. 在两个参数的取值网格上重新评估全部历史记录的总差异
+    2. 按单个参数上下浮动对总差异的影响进行龙卷风排序
+    原理：
+        单条记录差异 = 实际成本 - 产量 × 单位标准成本(参数)
+        先按计算类型汇总产量和实际成本，网格计算量只与类型数有关，与记录数无关
+        产量和实际成本按整数汇总；标准成本按汇总产量计算而不逐笔取整到分，
+        因此总差异是浮点估算值，与逐笔记账的合计每笔最多相差0.5分
+    """
+
+    def __init__(self, history):
+        """
+        参数:
+            history (HistoryManager): 历史记录管理器
+        """
+        self.history = history
+
+    def _summarize(self):
+        """
+        按计算类型汇总历史记录（按列分块扫描，历史文件无需整体读入内存）
+        返回:
+            tuple: (各类型产量合计字典, 实际成本合计 + 无法重算记录的差异合计(分))
+        """
+        data, strings = self.history.columns()
+        known = np.array([text in UNIT_STANDARD_COST for text in strings], dtype=bool)
+        quantity_sums = np.zeros(len(strings), dtype=np.int64)
+        constant = 0
+        for start in range(0, len(data), BinaryHistoryStore.CHUNK_SIZE * 16):
+            chunk = data[start:start + BinaryHistoryStore.CHUNK_SIZE * 16]
+            type_ids = chunk["calc_type"]
+            actual = chunk["actual_cost"]
+            valid = known[type_ids] & ~np.isnan(actual)
+            quantity_sums += group_sum(type_ids[valid], chunk["quantity"][valid], len(strings))
+            constant += int(to_cents(actual[valid]).sum()) + int(to_cents(chunk["result"][~valid]).sum())
+        quantities = {strings[i]: int(quantity_sums[i]) for i in np.flatnonzero(known)}
+        return quantities, constant
+
+    @staticmethod
+    def _evaluate(params, quantities, constant):
+        """在给定参数下计算总差异（元），参数为数组时结果按广播规则得到同形数组"""
+        total = to_yuan(constant)
+        for calc_type, quantity in quantities.items():
+            total = total - quantity * UNIT_STANDARD_COST[calc_type](params)
+        return total
+
+    @staticmethod
+    def _base_params():
+        """当前标准参数的字典副本"""
+        return {name: float(getattr(StandardParams, name)) for name in PARAM_LABELS}
+
+    def baseline(self):
+        """
+        返回:
+            float: 当前标准参数下的历史记录总差异
+        """
+        quantities, constant = self._summarize()
+        return float(self._evaluate(SimpleNamespace(**self._base_params()), quantities, constant))
+
+    def grid(self, x_name, x_values, y_name, y_values):
+        """
+        计算两个参数取值网格上的总差异曲面
+        参数:
+            x_name (str): 横轴参数属性名
+            x_values (array): 横轴参数取值序列
+            y_name (str): 纵轴参数属性名
+            y_values (array): 纵轴参数取值序列
+        返回:
+            ndarray: 形状为(len(y_values), len(x_values))的总差异曲面
+        """
+        if x_name == y_name:
+            raise ValueError("两个分析参数不能相同")
+        x_values = np.asarray(x_values, dtype=float)
+        y_values = np.asarray(y_values, dtype=float)
+        params = self._base_params()
+        params[x_name] = x_values[np.newaxis, :]
+        params[y_name] = y_values[:, np.newaxis]
+        quantities, constant = self._summarize()
+        surface = self._evaluate(SimpleNamespace(**params), quantities, constant)
+        return np.broadcast_to(surface, (len(y_values), len(x_values))).copy()
+
+    def tornado(self, spread=0.1):
+        """
+        龙卷风排序：每个参数单独上下浮动，其余参数保持当前值
+        参数:
+            spread (float): 浮动比例，默认10%
+        返回:
+            list: [(参数属性名, 下浮后总差异, 上浮后总差异, 波动幅度)]，按波动幅度降序
+        """
+        names = list(PARAM_LABELS)
+        base = self._base_params()
+        # 第i行对应第i个参数浮动，两列分别为下浮和上浮，一次广播计算全部情形
+        params = {name: np.full((len(names), 2), value) for name, value in base.items()}
+        for i, name in enumerate(names):
+            params[name][i] = base[name] * np.array([1 - spread, 1 + spread])
+        quantities, constant = self._summarize()
+        totals = np.broadcast_to(self._evaluate(SimpleNamespace(**params), quantities, constant), (len(names), 2))
+        ranking = [(name, float(totals[i, 0]), float(totals[i, 1]), float(abs(totals[i, 1] - totals[i, 0])))
+                   for i, name in enumerate(names)]
+        return sorted(ranking, key=lambda item: item[3], reverse=True)
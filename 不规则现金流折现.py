@@ -0,0 +1,346 @@
+"""
+不规则现金流折现计算系统
+版本: 1.0
+功能说明:
+1. 按实际发生日期计算不规则现金流的净现值（NPV/XNPV）
+2. 支持 ACT/365、ACT/360、30/360 三种计息天数惯例
+3. 多个现金流组合以"扁平数组 + 偏移量"方式存储，折现因子一次向量化计算
+4. 支持手工录入与CSV文件批量导入
+"""
+
+import csv
+import sys
+
+import numpy as np
+
+
+# ==================== 计息天数惯例模块 ====================
+def _split_dates(dates):
+    """
+    将datetime64[D]数组拆分为年、月、日三个整数数组
+    参数:
+        dates (ndarray): datetime64[D]日期数组
+    返回:
+        tuple: (年, 月, 日)
+    """
+    months = dates.astype("datetime64[M]")
+    year = months.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (dates - months).astype(np.int64) + 1
+    return year, month, day
+
+
+def _act_365(start, end):
+    """ACT/365：实际天数 / 365"""
+    return (end - start).astype(np.int64) / 365.0
+
+
+def _act_360(start, end):
+    """ACT/360：实际天数 / 360"""
+    return (end - start).astype(np.int64) / 360.0
+
+
+def _thirty_360(start, end):
+    """
+    30/360（债券基准）：每月按30天、每年按360天计
+    规则：起始日为31日时按30日计；起始日为30或31日且到期日为31日时，到期日按30日计
+    """
+    y1, m1, d1 = _split_dates(start)
+    y2, m2, d2 = _split_dates(end)
+    d1 = np.minimum(d1, 30)
+    d2 = np.where((d2 == 31) & (d1 == 30), 30, d2)
+    return (360 * (y2 - y1) + 30 * (m2 - m1) + (d2 - d1)) / 360.0
+
+
+# 计息天数惯例名称与年化天数计算函数对照表
+DAY_COUNT_CONVENTIONS = {"ACT/365": _act_365, "ACT/360": _act_360, "30/360": _thirty_360}
+
+
+# ==================== 现金流组合模块 ====================
+class CashFlowPortfolios:
+    """
+    现金流组合集合类
+    存储结构（不规则数组）：
+    - values: 全部现金流金额的扁平数组
+    - dates: 与values一一对应的发生日期(datetime64[D])
+    - offsets: 第i个组合的现金流为 values[offsets[i]:offsets[i+1]]
+    - names: 各组合名称
+    组合内现金流按日期升序排列，年化期限按计息惯例预先计算并缓存
+    """
+
+    def __init__(self, names, values, dates, offsets):
+        """
+        参数:
+            names (list): 组合名称列表
+            values (array): 扁平的现金流金额数组
+            dates (array): 扁平的现金流日期数组
+            offsets (array): 长度为组合数+1的偏移量数组
+        """
+        self.names = list(names)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if len(self.offsets) != len(self.names) + 1 or self.offsets[-1] != len(self.values):
+            raise ValueError("偏移量与现金流数据长度不一致")
+        if len(self.values) != len(self.dates):
+            raise ValueError("现金流金额与日期数量不一致")
+        counts = np.diff(self.offsets)
+        if (counts < 0).any():
+            raise ValueError("偏移量必须单调不减")
+        # 每笔现金流所属组合编号，用于按组合汇总
+        self.portfolio_ids = np.repeat(np.arange(len(self.names)), counts)
+        self._year_fraction_cache = {}
+
+    @classmethod
+    def from_rows(cls, portfolio_names, dates, values):
+        """
+        由逐行的（组合名称, 日期, 金额）数据构建组合集合
+        参数:
+            portfolio_names (sequence): 每行所属组合名称
+            dates (sequence): 每行日期（ISO格式字符串或datetime64）
+            values (sequence): 每行金额
+        返回:
+            CashFlowPortfolios: 组合集合（组合按首次出现顺序排列）
+        """
+        ids = {}
+        portfolio_ids = np.fromiter((ids.setdefault(name, len(ids)) for name in portfolio_names), dtype=np.int64)
+        names = sorted(ids, key=ids.get)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        values = np.asarray(values, dtype=np.float64)
+        # 先按日期、再按组合编号稳定排序，得到组合内按日期升序的扁平数组
+        order = np.lexsort((dates, portfolio_ids))
+        counts = np.bincount(portfolio_ids, minlength=len(names))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(names, values[order], dates[order], offsets)
+
+    @classmethod
+    def from_csv(cls, filename):
+        """
+        从CSV文件导入现金流，文件需包含表头：组合名称,日期,金额
+        参数:
+            filename (str): CSV文件路径
+        返回:
+            CashFlowPortfolios: 组合集合
+        """
+        with open(filename, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            missing = {"组合名称", "日期", "金额"} - set(reader.fieldnames or [])
+            if missing:
+                raise ValueError("CSV缺少列：{}".format("、".join(sorted(missing))))
+            names, dates, values = [], [], []
+            for row in reader:
+                names.append(row["组合名称"].strip())
+                dates.append(row["日期"].strip())
+                values.append(row["金额"])
+        return cls.from_rows(names, dates, values)
+
+    def to_rows(self):
+        """
+        展开为逐行数据，与from_rows互逆
+        返回:
+            tuple: (每行组合名称列表, 日期数组, 金额数组)
+        """
+        names = np.repeat(np.array(self.names, dtype=object), np.diff(self.offsets)).tolist()
+        return names, self.dates, self.values
+
+    def __len__(self):
+        """组合个数"""
+        return len(self.names)
+
+    def year_fractions(self, convention="ACT/365", valuation_date=None):
+        """
+        计算每笔现金流距折现基准日的年化期限（结果缓存复用）
+        参数:
+            convention (str): 计息天数惯例
+            valuation_date (str): 折现基准日，缺省时以各组合首笔现金流日期为基准（同Excel XNPV）
+        返回:
+            ndarray: 与values等长的年化期限数组
+        """
+        if convention not in DAY_COUNT_CONVENTIONS:
+            raise ValueError("不支持的计息惯例：{}".format(convention))
+        key = (convention, valuation_date)
+        if key not in self._year_fraction_cache:
+            if valuation_date is None:
+                counts = np.diff(self.offsets)
+                non_empty = counts > 0
+                start = np.repeat(self.dates[self.offsets[:-1][non_empty]], counts[non_empty])
+            else:
+                start = np.datetime64(valuation_date, "D")
+            self._year_fraction_cache[key] = DAY_COUNT_CONVENTIONS[convention](start, self.dates)
+        return self._year_fraction_cache[key]
+
+    def _rate_per_flow(self, rate):
+        """将标量或按组合给出的利率展开为与现金流等长的数组"""
+        rate = np.asarray(rate, dtype=np.float64)
+        if rate.ndim == 0:
+            return rate
+        if rate.shape != (len(self.names),):
+            raise ValueError("利率数组长度必须等于组合个数")
+        return rate[self.portfolio_ids]
+
+    def xnpv(self, rate, convention="ACT/365", valuation_date=None):
+        """
+        按实际日期计算各组合净现值
+        公式：
+            XNPV = Σ 金额 / (1 + r) ^ 年化期限
+        参数:
+            rate (float/array): 年折现率（小数），可为标量或每个组合一个
+            convention (str): 计息天数惯例
+            valuation_date (str): 折现基准日
+        返回:
+            ndarray: 各组合净现值
+        """
+        t = self.year_fractions(convention, valuation_date)
+        discounted = self.values * np.power(1.0 + self._rate_per_flow(rate), -t)
+        return np.bincount(self.portfolio_ids, weights=discounted, minlength=len(self.names))
+
+    def npv(self, rate):
+        """
+        按期序计算各组合净现值（每笔现金流视为一期，首笔为第0期）
+        公式：
+            NPV = Σ 金额_k / (1 + r) ^ k
+        参数:
+            rate (float/array): 每期折现率（小数），可为标量或每个组合一个
+        返回:
+            ndarray: 各组合净现值
+        """
+        periods = np.arange(len(self.values)) - np.repeat(self.offsets[:-1], np.diff(self.offsets))
+        discounted = self.values * np.power(1.0 + self._rate_per_flow(rate), -periods.astype(np.float64))
+        return np.bincount(self.portfolio_ids, weights=discounted, minlength=len(self.names))
+
+
+# ==================== 输入验证模块 ====================
+def get_valid_input(prompt, input_type=float, min_val=None):
+    """
+    获取有效输入
+    参数:
+        prompt (str): 输入提示语
+        input_type (type): 目标数据类型
+        min_val (float): 允许的最小值
+    返回:
+        value: 验证通过的有效值
+    """
+    while True:
+        try:
+            value = input_type(input(prompt).strip())
+            if min_val is not None and value < min_val:
+                print("输入值不能小于{}，请重新输入".format(min_val))
+                continue
+            return value
+        except ValueError:
+            print("输入格式错误，请重新输入")
+
+
+def input_portfolio():
+    """
+    手工录入一个现金流组合
+    返回:
+        tuple: (组合名称, 日期列表, 金额列表)
+    """
+    name = input("组合名称: ").strip()
+    if not name:
+        raise ValueError("组合名称不能为空")
+    dates, values = [], []
+    print("逐行输入 日期,金额（如 2024-01-31,-10000），空行结束")
+    while True:
+        line = input("> ").strip()
+        if not line:
+            break
+        try:
+            date_text, amount_text = line.split(",")
+            dates.append(np.datetime64(date_text.strip(), "D"))
+            values.append(float(amount_text))
+        except ValueError:
+            print("格式错误，请按 日期,金额 输入")
+    if not values:
+        raise ValueError("至少需要一笔现金流")
+    return name, dates, values
+
+
+def choose_convention():
+    """选择计息天数惯例"""
+    conventions = list(DAY_COUNT_CONVENTIONS)
+    for idx, name in enumerate(conventions, 1):
+        print("{}. {}".format(idx, name))
+    while True:
+        choice = input("请选择计息惯例(默认1): ").strip() or "1"
+        if choice.isdigit() and 1 <= int(choice) <= len(conventions):
+            return conventions[int(choice) - 1]
+        print("无效的选项，请重新输入！")
+
+
+def show_results(portfolios, results, title, limit=20):
+    """
+    显示各组合计算结果，组合较多时只显示前limit个及合计
+    """
+    print("\n【{}】".format(title))
+    print("{:<20}{:<10}{:<20}".format("组合名称", "笔数", "净现值"))
+    counts = np.diff(portfolios.offsets)
+    for idx in range(min(limit, len(portfolios))):
+        print("{:<20}{:<10}{:<+20,.2f}".format(portfolios.names[idx], counts[idx], results[idx]))
+    if len(portfolios) > limit:
+        print("... 共{}个组合，其余省略".format(len(portfolios)))
+    print("{:<30}{:<+20,.2f}".format("合计", results.sum()))
+
+
+# ==================== 主程序模块 ====================
+def main():
+    """
+    主程序入口函数
+    功能：
+    1. 录入或导入现金流组合
+    2. 选择计息惯例计算XNPV或按期序计算NPV
+    """
+    rows = ([], [], [])  # 已录入和导入的全部（组合名称, 日期, 金额），同名组合的现金流合并
+    portfolios = None
+
+    while True:
+        print("\n{:=^30}".format(" 不规则现金流折现计算 "))
+        print("1. 录入现金流组合")
+        print("2. 从CSV导入现金流")
+        print("3. 计算XNPV（按实际日期）")
+        print("4. 计算NPV（按期序）")
+        print("{:<3}{}".format("q", "退出系统"))
+
+        choice = input("\n请选择操作编号: ").strip().lower()
+
+        if choice == 'q':
+            print("\n感谢使用，再见！")
+            sys.exit()
+
+        try:
+            if choice == '1':
+                name, dates, values = input_portfolio()
+                rows[0].extend([name] * len(values))
+                rows[1].extend(dates)
+                rows[2].extend(values)
+                portfolios = CashFlowPortfolios.from_rows(*rows)
+                print("已录入组合 {}，共{}笔现金流".format(name, len(values)))
+            elif choice == '2':
+                imported = CashFlowPortfolios.from_csv(input("CSV文件路径: ").strip())
+                for column, values in zip(rows, imported.to_rows()):
+                    column.extend(values)
+                portfolios = CashFlowPortfolios.from_rows(*rows)
+                print("已导入{}个组合，共{}笔现金流（当前共{}个组合）".format(
+                    len(imported), len(imported.values), len(portfolios)))
+            elif choice in ('3', '4'):
+                if portfolios is None:
+                    print("请先录入或导入现金流")
+                    continue
+                r = get_valid_input("年利率（单位：%）: ", float, -99.99) / 100
+                if choice == '3':
+                    convention = choose_convention()
+                    valuation_date = input("折现基准日（YYYY-MM-DD，留空取各组合首笔日期）: ").strip() or None
+                    results = portfolios.xnpv(r, convention, valuation_date)
+                    show_results(portfolios, results, "XNPV {}".format(convention))
+                else:
+                    show_results(portfolios, portfolios.npv(r), "NPV")
+            else:
+                print("无效的选项，请重新输入！")
+        except (ValueError, OSError) as e:
+            print("操作失败：{}".format(str(e)))
+
+
+# ==================== 程序启动 ====================
+if __name__ == "__main__":
+    main()
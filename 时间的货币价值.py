@@ -1,8 +1,14 @@
+import csv
+import itertools
+import json
+import sys
+
+import numpy as np
+
+from money import ROUND_HALF_UP,to_cents
+
 L=['可选择的时间货币价值如下','单利终值','单利现值','复利终值','复利现值','普通年金终值',
    '普通年金现值','预付年金终值','预付年金现值','递延年金现值','永续年金现值','增长型永续年金']
-for l in L:
-    print(l)
-s=input('需要计算的时间货币价值（Q/q结束）：')
 
 #公式定义区域
 SIFV=lambda pv,r,n:pv*(1+r*n)                #单利终值
@@ -18,8 +24,227 @@ PPV=lambda A,r:A/r#永续年金现值
 GPPV=lambda A,r,g:A/(r-g)#增长型永续年金
 
 
+#定点金额区域：结果先按舍入规则转换为整数分再输出，避免浮点数表示误差
+ROUNDING=ROUND_HALF_UP      #舍入规则：ROUND_HALF_UP四舍五入，ROUND_HALF_EVEN银行家舍入（见money.py）
+MAX_CENTS=2**53         #超过该值的金额无法精确表示到分
+
+
+yuan=lambda c:'{0}{1}.{2:02d}'.format('-' if c<0 else '',*divmod(abs(int(c)),100))   #整数分→金额字符串
+
+
+#批量输入验证区域
+#每行一笔计算，formula为计算类型，rate、g为百分数，其余字段与公式参数同名
+#字段规则：(字段名, 中文名称, 是否整数, 最小值, 适用的计算类型)
+RULES=[('rate','年利率',False,None,L[1:]),
+       ('n','期限',True,1,L[1:10]),
+       ('m','每年复利的次数',True,1,['复利终值']),
+       ('m','递延期',True,0,['递延年金现值']),
+       ('pv','现值',False,0,['单利终值','复利终值']),
+       ('fv','终值',False,0,['单利现值','复利现值']),
+       ('A','年金',False,0,L[5:]),
+       ('g','固定比率',False,None,['增长型永续年金'])]
+#跨字段规则：(错误说明, 适用的计算类型, 函数)，函数接收解析后的数值字典，返回逐行是否通过
+CHECKS=[('年利率不能为0',L[5:11],lambda v:v['rate']!=0),
+        ('年利率必须大于固定比率',['增长型永续年金'],lambda v:v['rate']>v['g'])]
+
+
+def to_float(x):
+    try:
+        return float(x)
+    except (TypeError,ValueError):
+        return np.nan
+
+
+def parse_column(raw):
+    '''整列转换为浮点数组，返回(数值数组, 空值掩码)，空白或无法转换处为NaN'''
+    try:
+        values=np.fromiter(map(float,raw),dtype=float,count=len(raw))   #全部为数值或数值文本时一次转换
+        return values,np.zeros(len(raw),dtype=bool)
+    except (TypeError,ValueError):
+        pass
+    texts=np.array(['' if x is None else str(x).strip() for x in raw],dtype=object)
+    empty=texts==''
+    filled=texts[~empty].tolist()
+    values=np.full(len(texts),np.nan)
+    try:
+        values[~empty]=np.fromiter(map(float,filled),dtype=float,count=len(filled))
+    except ValueError:                            #含无法转换的值时逐个转换
+        values[~empty]=np.fromiter(map(to_float,filled),dtype=float,count=len(filled))
+    return values,empty
+
+
+def error_mask(errors,size):
+    '''逐行错误掩码：任一规则未通过的行为True'''
+    invalid=np.zeros(size,dtype=bool)
+    for mask in errors.values():
+        invalid|=mask
+    return invalid
+
+
+def validate_batch(columns):
+    '''
+    整列验证批量输入，不抛出异常
+    columns：字段名→原始值序列，缺少的字段视为整列为空
+    返回(错误字典, 数值字典)：错误说明→逐行错误掩码，字段名→数值数组（无效处为NaN），
+    数值字典中formula为计算类型在L[1:]中的序号（无效为-1）
+    '''
+    size=max((len(c) for c in columns.values()),default=0)
+    index={name:i for i,name in enumerate(L[1:])}
+    names=map(str.strip,map(str,columns.get('formula',['']*size)))
+    formula=np.fromiter(map(index.get,names,itertools.repeat(-1)),dtype=int,count=size)
+    applies_to=lambda names:np.isin(formula,[index[name] for name in names])   #计算类型在names中的行
+    errors,values,parsed={},{},{}
+    def add(message,mask):
+        if mask.any():
+            errors[message]=errors[message]|mask if message in errors else mask
+    add('计算类型取值无效',formula<0)
+    for name,label,integer,low,applies in RULES:
+        rows=applies_to(applies)
+        if name not in parsed:
+            parsed[name]=parse_column(columns.get(name,[None]*size))
+        v,empty=parsed[name]
+        bad=~np.isfinite(v)&~empty
+        if integer:
+            bad|=np.isfinite(v)&(v!=np.floor(v))
+        add(label+'不能为空',empty&rows)
+        add(label+'格式错误',bad&rows)
+        if low is not None:
+            with np.errstate(invalid='ignore'):
+                add('{0}不能小于{1}'.format(label,low),(v<low)&rows)
+        values[name]=np.where(np.isfinite(v),v,np.nan)
+    values['formula']=formula
+    invalid=error_mask(errors,size)
+    for message,applies,check in CHECKS:
+        with np.errstate(invalid='ignore'):
+            add(message,~check(values)&applies_to(applies)&~invalid)   #字段本身无效时只报告字段错误
+    return errors,values
+
+
+def error_report(errors,limit=20):
+    '''逐行错误报告，形如"第3行：期限不能小于1；年金不能为空"（行号从1开始）'''
+    invalid=error_mask(errors,len(next(iter(errors.values()))) if errors else 0)
+    return ['第{0}行：{1}'.format(row+1,'；'.join(k for k,mask in errors.items() if mask[row]))
+            for row in np.flatnonzero(invalid)[:limit]]
+
+
+#流式批量计算区域
+#用法：python 时间的货币价值.py 请求文件 [jsonl|csv]（文件名为 - 时从标准输入读取）
+#请求为JSONL（每行一个对象）或带表头的CSV，字段为FIELDS中的名称，rate、g为百分数
+#格式由第二个参数指定，缺省时按扩展名判断：.jsonl/.json为JSONL，其余（包括标准输入）为CSV
+#结果按输入顺序输出，格式与输入相同；格式错误或验证未通过的行输出错误说明，不中断处理
+FIELDS=['formula','rate','n','m','A','pv','fv','g']
+CHUNK=4096      #每批计算的请求数，批内按计算类型分组整列计算
+FORMULAS={'单利终值':lambda v:SIFV(v['pv'],v['rate'],v['n']),
+          '单利现值':lambda v:SIPV(v['fv'],v['rate'],v['n']),
+          '复利终值':lambda v:CIFV(v['pv'],v['rate'],v['n'],v['m']),
+          '复利现值':lambda v:CIPV(v['fv'],v['rate'],v['n']),
+          '普通年金终值':lambda v:OAFV(v['A'],v['rate'],v['n']),
+          '普通年金现值':lambda v:OAPV(v['A'],v['rate'],v['n']),
+          '预付年金终值':lambda v:ADFV(OAFV(v['A'],v['rate'],v['n']),v['rate']),
+          '预付年金现值':lambda v:ADPV(OAPV(v['A'],v['rate'],v['n']),v['rate']),
+          '递延年金现值':lambda v:DAPV(v['A'],v['rate'],v['n'],v['m']),
+          '永续年金现值':lambda v:PPV(v['A'],v['rate']),
+          '增长型永续年金':lambda v:GPPV(v['A'],v['rate'],v['g'])}
+
+
+def read_json(lines):
+    '''逐行解析JSONL请求，生成(行号, 请求字典或错误说明)'''
+    for no,line in lines:
+        try:
+            item=json.loads(line)
+        except ValueError:
+            yield no,'JSON格式错误'
+            continue
+        yield (no,item) if isinstance(item,dict) else (no,'JSON格式错误：每行必须是一个对象')
+
+
+def read_csv(lines,header):
+    '''逐行解析CSV请求，生成(行号, 请求字典或错误说明)'''
+    for no,line in lines:
+        row=next(csv.reader([line]))
+        yield (no,dict(zip(header,row))) if len(row)==len(header) else (no,'CSV列数与表头不一致')
+
+
+def evaluate(items):
+    '''
+    验证并计算一批请求，items为(行号, 请求字典或错误说明)列表
+    返回与items等长的(计算类型, 结果(分), 错误说明)列表，出错时结果为None
+    '''
+    rows=[i for i,(_,item) in enumerate(items) if isinstance(item,dict)]
+    errors,values=validate_batch({f:[items[i][1].get(f) for i in rows] for f in FIELDS})
+    invalid=error_mask(errors,len(rows))
+    formula=values.pop('formula')
+    v={k:a/100 if k in ('rate','g') else a for k,a in values.items()}
+    results=np.full(len(rows),np.nan)
+    for code in np.unique(formula[~invalid]):
+        group=np.flatnonzero((formula==code)&~invalid)
+        with np.errstate(all='ignore'):
+            results[group]=FORMULAS[L[code+1]]({k:a[group] for k,a in v.items()})
+    finite=np.isfinite(results)&(np.abs(results)*100<MAX_CENTS)
+    cents=to_cents(np.where(finite,results,0),ROUNDING)
+    out=[(None,None,item) for _,item in items]
+    for j,i in enumerate(rows):
+        if invalid[j]:
+            out[i]=(None,None,'；'.join(k for k,mask in errors.items() if mask[j]))
+        elif not finite[j]:
+            out[i]=(L[formula[j]+1],None,'计算结果无效')
+        else:
+            out[i]=(L[formula[j]+1],int(cents[j]),None)
+    return out
+
+
+def stream(filename,fmt=None):
+    '''流式读取请求文件，分批计算并按输入顺序输出结果，最后在标准错误输出统计；fmt为jsonl或csv'''
+    fmt=fmt or ('jsonl' if filename.lower().endswith(('.jsonl','.json')) else 'csv')
+    if fmt not in ('jsonl','csv'):
+        print('未知的文件格式：{0}（应为jsonl或csv）'.format(fmt),file=sys.stderr)
+        return False
+    try:
+        f=sys.stdin if filename=='-' else open(filename,encoding='utf-8-sig')
+    except FileNotFoundError:
+        print('请求文件不存在：{0}'.format(filename),file=sys.stderr)
+        return False
+    except OSError as e:
+        print('无法打开请求文件：{0}（{1}）'.format(filename,e.strerror),file=sys.stderr)
+        return False
+    lines=((no,line) for no,line in enumerate(f,1) if line.strip())
+    is_json=fmt=='jsonl'
+    if is_json:
+        items=read_json(lines)
+    else:
+        first=next(lines,None)
+        if first is None:
+            return True
+        items=read_csv(lines,[name.strip() for name in next(csv.reader([first[1]]))])
+        writer=csv.writer(sys.stdout,lineterminator='\n')
+        writer.writerow(['line','formula','result','error'])
+    total=failed=0
+    while True:
+        chunk=list(itertools.islice(items,CHUNK))
+        if not chunk:
+            break
+        for (no,_),(name,z,error) in zip(chunk,evaluate(chunk)):
+            if is_json:
+                record={'line':no,'formula':name,'result':z/100} if error is None else {'line':no,'error':error}
+                sys.stdout.write(json.dumps(record,ensure_ascii=False)+'\n')
+            else:
+                writer.writerow([no,name or '','' if z is None else yuan(z),error or ''])
+            failed+=error is not None
+        total+=len(chunk)
+        sys.stdout.flush()
+    if f is not sys.stdin:
+        f.close()
+    print('共{0}行，计算成功{1}行，出错{2}行'.format(total,total-failed,failed),file=sys.stderr)
+    return True
+
+
 #代码执行区域
+if len(sys.argv)>1:
+    sys.exit(0 if stream(sys.argv[1],sys.argv[2] if len(sys.argv)>2 else None) else 1)
 
+for l in L:
+    print(l)
+s=input('需要计算的时间货币价值（Q/q结束）：')
 while True:
     if s.upper()=='Q':
         print('循环结束')
@@ -62,20 +287,22 @@ while True:
                 A = float(input('每期支付金额（单位：元）:'))
                 m=int(input('递延期（单位：年）'))
                 z=DAPV(A,r,n,m)
-                print('{0}:{1:.2f}元'.format(s, float(z)))
-            print('{0}:{1:.2f}元'.format(s, float(z)))
+                print('{0}:{1}元'.format(s, yuan(to_cents(z,ROUNDING))))
+            print('{0}:{1}元'.format(s, yuan(to_cents(z,ROUNDING))))
             s = input('需要计算的时间货币价值（Q/q结束）：')
         elif s in L[10::]:
             A = float(input('每期支付金额（单位：元）:'))
             r = float(input('年利率（单位：%）:')) / 100
             if s=='永续年金现值':
                 z=PPV(A,r)
-                print('{0}:{1:.2f}元'.format(s, float(z)))
+                print('{0}:{1}元'.format(s, yuan(to_cents(z,ROUNDING))))
             elif s=='增长型永续年金':
                 g=float(input('固定比率(单位：%):'))/100
                 if r>g:
                     z=GPPV(A,r,g)
-                    print('{0}:{1:.2f}元'.format(s, float(z)))
+                    print('{0}:{1}元'.format(s, yuan(to_cents(z,ROUNDING))))
+                else:
+                    print(CHECKS[-1][0])
 
 
 
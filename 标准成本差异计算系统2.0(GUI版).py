@@ -3,82 +3,99 @@
 版本: 3.0
 功能说明：
 1. 可视化GUI操作界面
-2. 支持四种成本差异计算
+2. 支持四种成本差异计算及自定义差异类型
 3. 历史记录管理与Excel导出
 4. 系统参数配置与实时修改
 5. 完善的输入验证机制
+6. 标准参数敏感性分析与热力图
+7. 定长二进制历史文件（内存映射随机访问，崩溃安全追加）
+8. 历史记录索引搜索（按产品、类型、数量和差异范围筛选，不利差异Top-K）
+9. 月度差异汇总报表（按产品、计算类型分表小计）
+10. 差异趋势图（按像素宽度降采样，新增记录增量更新）
+11. 定点金额运算（金额以整数分计算和汇总，可选四舍五入或银行家舍入）
+12. 自定义差异类型（以公式声明，工具栏自动添加计算按钮；启动时加载当前目录下的 差异类型.json）
 """
 
+import os
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox
-from openpyxl import Workbook
+from tkinter import ttk, messagebox, filedialog
+from types import SimpleNamespace
 
-# ==================== 标准参数配置类 ====================
-class StandardParams:
-    """
-    系统标准参数存储类
-    使用类属性保存参数，支持动态修改
-    参数说明：
-    - HOURS: 标准工时（小时/件）
-    - MATERIAL_USAGE: 标准材料用量（千克/件）
-    - MATERIAL_PRICE: 标准材料单价（元/千克）
-    - LABOR_RATE: 标准人工费率（元/小时）
-    - VARIABLE_RATE: 变动制造费率（元/小时）
-    - FIXED_RATE: 固定制造费率（元/小时）
-    """
-    HOURS = 2.0
-    MATERIAL_USAGE = 5.5
-    MATERIAL_PRICE = 2.2
-    LABOR_RATE = 6.0
-    VARIABLE_RATE = 3.0
-    FIXED_RATE = 1.5
+import numpy as np
 
+from money import format_cents, to_cents, to_yuan
+from variance_core import (
+    FORMULA_FUNCTIONS, INVALID_ACTUAL_COST, PARAM_LABELS, UNIT_STANDARD_COST, VARIANCE_TYPES, VARIANCE_TYPES_FILE,
+    VARIANCE_VALIDATOR, BatchValidator, HistoryManager, ReportGenerator, SensitivityAnalyzer, StandardParams, VarianceType,
+    from_timestamp, load_variance_types, register_variance_type, save_variance_types, to_timestamp,
+    unregister_variance_type, variance_cents)
 
-# ==================== 历史记录管理类 ====================
-class HistoryManager:
-    """历史记录管理类，负责存储和导出计算记录"""
 
-    def __init__(self):
-        """初始化历史记录存储结构"""
-        self.records = []
-        self.headers = ["序号", "产品名称", "产品数量", "计算类型", "结果"]
+# ==================== 降采样函数 ====================
+# 横轴位置为记录时间（自1970-01-01起的秒数，升序），每个桶覆盖bucket_size秒，对应画布上的一个像素宽
+# 两种方法都总是保留序列的最后一点，追加记录后折线末端即为最新记录
+def _bucket_bounds(positions, bucket_size):
+    """按桶划分升序位置，返回(各非空桶的起始下标, 结束下标)"""
+    buckets = positions // bucket_size
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return starts, np.r_[starts[1:], len(positions)]
 
-    def add_record(self, product_name, quantity, calc_type, result):
-        """
-        添加新记录
-        :param product_name: 产品名称（字符串）
-        :param quantity: 生产数量（整数）
-        :param calc_type: 计算类型（字符串）
-        :param result: 计算结果（浮点数）
-        """
-        self.records.append({
-            "产品名称": product_name,
-            "产品数量": quantity,
-            "计算类型": calc_type,
-            "结果": result
-        })
-
-    def export_excel(self, filename="历史记录.xlsx"):
-        """
-        导出历史记录到Excel文件
-        :param filename: 导出文件名
-        :return: 导出成功返回True，否则返回False
-        """
-        try:
-            wb = Workbook()
-            ws = wb.active
-            ws.append(self.headers)
-            for idx, record in enumerate(self.records, 1):
-                ws.append([idx, record["产品名称"], record["产品数量"],
-                          record["计算类型"], record["结果"]])
-            # 自动调整列宽
-            for col in ws.columns:
-                max_length = max(len(str(cell.value)) for cell in col)
-                ws.column_dimensions[col[0].column_letter].width = max_length + 2
-            wb.save(filename)
-            return True
-        except Exception as e:
-            return False
+
+def minmax_downsample(positions, values, bucket_size):
+    """
+    最大最小值降采样：每个桶保留最小值点和最大值点，保证尖峰不丢失
+    :param positions: 各点的横轴位置（升序整数数组）
+    :param values: 各点的值
+    :param bucket_size: 每个桶覆盖的横轴位置数
+    :return: 保留点的下标数组（升序）
+    """
+    if not len(positions):
+        return np.zeros(0, np.int64)
+    starts, ends = _bucket_bounds(positions, bucket_size)
+    picked = [np.array([len(positions) - 1])]
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(values == np.repeat(reduce.reduceat(values, starts), ends - starts))
+        # 同一桶内有多个相同极值时只取第一个
+        groups = np.searchsorted(starts, hits, side="right")
+        picked.append(hits[np.r_[True, groups[1:] != groups[:-1]]])
+    return np.unique(np.concatenate(picked))
+
+
+def lttb_downsample(positions, values, bucket_size, anchor=None):
+    """
+    LTTB（最大三角形三桶）降采样：每个桶保留与前一保留点、后一桶均值点所成三角形面积最大的点
+    :param positions: 各点的横轴位置（升序整数数组）
+    :param values: 各点的值
+    :param bucket_size: 每个桶覆盖的横轴位置数
+    :param anchor: 前一保留点(位置, 值)，只对序列尾部增量计算时传入；None时保留第一点作为起点
+    :return: 保留点的下标数组（升序）
+    """
+    count = len(positions)
+    if not count:
+        return np.zeros(0, np.int64)
+    starts, ends = _bucket_bounds(positions, bucket_size)
+    x = positions.astype(np.float64)
+    # 各桶的均值点，最后一个桶以序列最后一点为参照
+    mean_x = np.append(np.add.reduceat(x, starts) / (ends - starts), x[-1])
+    mean_y = np.append(np.add.reduceat(values, starts) / (ends - starts), values[-1])
+    picked = []
+    if anchor is None:
+        picked.append(0)
+        anchor = (x[0], values[0])
+        starts[0] = 1
+    anchor_x, anchor_y = anchor
+    for k, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        if start >= end:
+            continue
+        area = np.abs((anchor_x - mean_x[k + 1]) * (values[start:end] - anchor_y)
+                      - (anchor_x - x[start:end]) * (mean_y[k + 1] - anchor_y))
+        best = start + int(area.argmax())
+        picked.append(best)
+        anchor_x, anchor_y = x[best], values[best]
+    if picked[-1] != count - 1:
+        picked.append(count - 1)
+    return np.array(picked, dtype=np.int64)
 
 
 # ==================== 参数修改对话框类 ====================
@@ -101,6 +118,10 @@ class ParamEditDialog(tk.Toplevel):
             ("变动制造费率（元/小时）", "VARIABLE_RATE", float, 0),
             ("固定制造费率（元/小时）", "FIXED_RATE", float, 0)
         ]
+        # 自定义差异类型新增的标准参数
+        builtin = {attr_name for _, attr_name, _, _ in self.params_config}
+        self.params_config += [(label_text, attr_name, float, 0)
+                               for attr_name, label_text in PARAM_LABELS.items() if attr_name not in builtin]
         self.entries = {}
         self._create_widgets()
         self._setup_layout()
@@ -135,78 +156,61 @@ class ParamEditDialog(tk.Toplevel):
         self.btn_cancel.grid(row=len(self.params_config), column=1, pady=10, sticky=tk.W)
 
     def _validate_input(self):
-        """输入验证与处理"""
-        try:
-            for attr_name, (entry, data_type, min_val) in self.entries.items():
-                input_value = entry.get().strip()
-                if not input_value:
-                    raise ValueError("参数值不能为空")
-
-                # 类型转换验证
-                try:
-                    converted_value = data_type(input_value)
-                except ValueError:
-                    raise ValueError("请输入有效的{}值".format(data_type.__name__))
-
-                # 范围验证
-                if converted_value < min_val:
-                    raise ValueError("数值不能小于 {:.2f}".format(min_val))
-
-                # 更新参数
-                setattr(StandardParams, attr_name, converted_value)
-
-            messagebox.showinfo("成功", "参数修改已生效")
-            self.destroy()
-            self.parent.show_params()  # 刷新参数显示
-        except ValueError as e:
-            messagebox.showerror("输入错误", str(e))
+        """输入验证与处理，全部参数通过验证后才统一生效"""
+        validator = BatchValidator([(label_text, data_type, min_val, None, None)
+                                    for label_text, _, data_type, min_val in self.params_config])
+        result = validator.validate({label_text: [self.entries[attr_name][0].get()]
+                                     for label_text, attr_name, _, _ in self.params_config})
+        if result.errors:
+            messagebox.showerror("输入错误", "\n".join(result.errors))
+            return
+
+        for label_text, attr_name, data_type, _ in self.params_config:
+            setattr(StandardParams, attr_name, data_type(result.values[label_text][0]))
+        messagebox.showinfo("成功", "参数修改已生效")
+        self.destroy()
+        self.parent.show_params()  # 刷新参数显示
 
 
 # ==================== 主应用程序类 ====================
 class CostAnalysisApp(tk.Tk):
     """主应用程序类，负责界面布局和功能协调"""
 
+    HISTORY_VIEW_LIMIT = 1000  # 表格中最多显示的记录数
+    TOP_K = 100  # 不利差异Top-K的条数
+
     def __init__(self):
         """初始化主窗口"""
         super().__init__()
         self.title("标准成本差异分析系统 v3.0")
         self.geometry("900x650")
         self.history = HistoryManager()
+        self.trend_dialog = None  # 打开的趋势图对话框，新增记录时增量更新
+        self.type_buttons = []  # 各差异类型的计算按钮
         self._create_widgets()
         self._setup_layout()
+        if os.path.exists(VARIANCE_TYPES_FILE):
+            try:
+                load_variance_types()
+            except (OSError, ValueError) as e:
+                messagebox.showerror("加载失败", "加载自定义差异类型失败：{}".format(str(e)))
+            self._refresh_types()
 
     def _create_widgets(self):
         """创建界面组件"""
         # 工具栏
         self.toolbar = ttk.Frame(self)
 
-        # 功能按钮
-        self.btn_material = ttk.Button(
-            self.toolbar,
-            text="材料成本差异",
-            command=lambda: self._show_calculator("材料")
-        )
-        self.btn_labor = ttk.Button(
-            self.toolbar,
-            text="人工成本差异",
-            command=lambda: self._show_calculator("人工")
-        )
-        self.btn_variable = ttk.Button(
-            self.toolbar,
-            text="变动费用差异",
-            command=lambda: self._show_calculator("变动")
-        )
-        self.btn_fixed = ttk.Button(
-            self.toolbar,
-            text="固定费用差异",
-            command=lambda: self._show_calculator("固定")
-        )
-
-        # 系统功能按钮
+        # 系统功能按钮（各差异类型的计算按钮由_refresh_types创建）
+        self.btn_define = ttk.Button(self.toolbar, text="自定义类型", command=self._show_define_dialog)
         self.btn_history = ttk.Button(self.toolbar, text="历史记录", command=self._show_history)
+        self.btn_open = ttk.Button(self.toolbar, text="打开历史文件", command=self._open_history_file)
         self.btn_export = ttk.Button(self.toolbar, text="导出Excel", command=self._export_data)
+        self.btn_report = ttk.Button(self.toolbar, text="月度报表", command=self._export_report)
         self.btn_params = ttk.Button(self.toolbar, text="查看参数", command=self.show_params)
         self.btn_edit = ttk.Button(self.toolbar, text="修改参数", command=self._show_edit_dialog)
+        self.btn_sensitivity = ttk.Button(self.toolbar, text="敏感性分析", command=self._show_sensitivity_dialog)
+        self.btn_trend = ttk.Button(self.toolbar, text="趋势图", command=self._show_trend_dialog)
         self.btn_exit = ttk.Button(self.toolbar, text="退出系统", command=self.destroy)
 
         # 历史记录表格
@@ -214,21 +218,78 @@ class CostAnalysisApp(tk.Tk):
         for col in self.history.headers:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=120, anchor="center")
+        self.lbl_status = ttk.Label(self, text="历史记录保存在内存中")
+
+        # 搜索栏
+        self.search_bar = ttk.Frame(self)
+        self.ent_search_product = ttk.Entry(self.search_bar, width=12)
+        self.ent_search_product.bind("<Return>", lambda event: self._search())
+        self.cmb_search_type = ttk.Combobox(
+            self.search_bar,
+            values=["全部类型"] + list(UNIT_STANDARD_COST),
+            state="readonly",
+            width=16
+        )
+        self.cmb_search_type.current(0)
+        self.ent_quantity_min = ttk.Entry(self.search_bar, width=6)
+        self.ent_quantity_max = ttk.Entry(self.search_bar, width=6)
+        self.ent_result_min = ttk.Entry(self.search_bar, width=8)
+        self.ent_result_max = ttk.Entry(self.search_bar, width=8)
+        self.var_sort = tk.BooleanVar(value=False)
+        self.chk_sort = ttk.Checkbutton(self.search_bar, text="按差异绝对值排序", variable=self.var_sort)
+        self.btn_search = ttk.Button(self.search_bar, text="搜索", command=self._search)
+        self.btn_top = ttk.Button(self.search_bar, text="不利差异Top", command=lambda: self._search(top=True))
+        self.btn_reset = ttk.Button(self.search_bar, text="重置", command=self._reset_search)
 
     def _setup_layout(self):
         """布局管理"""
         # 工具栏布局
         self.toolbar.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
         buttons = [
-            self.btn_material, self.btn_labor, self.btn_variable, self.btn_fixed,
-            self.btn_history, self.btn_export, self.btn_params, self.btn_edit, self.btn_exit
+            self.btn_define, self.btn_history, self.btn_open, self.btn_export, self.btn_report, self.btn_params,
+            self.btn_edit, self.btn_sensitivity, self.btn_trend, self.btn_exit
         ]
         for btn in buttons:
             btn.pack(side=tk.LEFT, padx=2)
+        self._refresh_types()
+
+        # 搜索栏布局
+        self.search_bar.pack(side=tk.TOP, fill=tk.X, padx=5)
+        search_widgets = [
+            ttk.Label(self.search_bar, text="产品："), self.ent_search_product, self.cmb_search_type,
+            ttk.Label(self.search_bar, text="数量："), self.ent_quantity_min,
+            ttk.Label(self.search_bar, text="~"), self.ent_quantity_max,
+            ttk.Label(self.search_bar, text="差异："), self.ent_result_min,
+            ttk.Label(self.search_bar, text="~"), self.ent_result_max,
+            self.chk_sort, self.btn_search, self.btn_top, self.btn_reset
+        ]
+        for widget in search_widgets:
+            widget.pack(side=tk.LEFT, padx=2)
 
         # 历史记录表格
+        self.lbl_status.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
         self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
+    def _refresh_types(self):
+        """按已注册的差异类型重建工具栏计算按钮和搜索栏类型列表"""
+        for btn in self.type_buttons:
+            btn.destroy()
+        self.type_buttons = [
+            ttk.Button(self.toolbar, text=variance_type.label,
+                       command=lambda name=name: self._show_calculator(name))
+            for name, variance_type in VARIANCE_TYPES.items()
+        ]
+        for btn in self.type_buttons:
+            btn.pack(side=tk.LEFT, padx=2, before=self.btn_define)
+        self.cmb_search_type["values"] = ["全部类型"] + list(UNIT_STANDARD_COST)
+
+    def _show_define_dialog(self):
+        """显示自定义差异类型对话框"""
+        dialog = VarianceTypeDialog(self)
+        self.wait_window(dialog)
+        if dialog.result:
+            self._refresh_types()
+
     def _show_calculator(self, calc_type):
         """显示计算对话框"""
         dialog = CalculationDialog(self, calc_type)
@@ -236,67 +297,195 @@ class CostAnalysisApp(tk.Tk):
         if dialog.result:
             self.history.add_record(*dialog.result)
             self._update_history()
-            result_msg = "产品：{0}\n类型：{1}\n差异金额：￥{2:+,.2f}".format(
+            if self.trend_dialog is not None and self.trend_dialog.winfo_exists():
+                self.trend_dialog.refresh()
+            result_msg = "产品：{0}\n类型：{1}\n差异金额：￥{2}".format(
                 dialog.result[0],
                 dialog.result[2],
-                dialog.result[3]
+                format_cents(to_cents(dialog.result[3]))
             )
             messagebox.showinfo("计算结果", result_msg)
 
     def _update_history(self):
-        """更新历史记录表格"""
+        """更新历史记录表格（只读取最近的记录，历史文件无需整体解析）"""
+        total = len(self.history.records)
+        start = max(0, total - self.HISTORY_VIEW_LIMIT)
+        source = self.history.store.filename if self.history.store is not None else "内存"
+        self.lbl_status.config(text="历史记录：{0}，共{1}条，显示最近{2}条".format(source, total, total - start))
+        self._fill_tree(range(start, total))
+
+    def _fill_tree(self, rows):
+        """
+        在表格中显示指定记录
+        :param rows: 记录行号序列（从0开始）
+        """
         for item in self.tree.get_children():
             self.tree.delete(item)
-        for idx, record in enumerate(self.history.records, 1):
+        for row in rows:
+            record = self.history.records[int(row)]
             self.tree.insert("", "end", values=(
-                idx,
+                int(row) + 1,
                 record["产品名称"],
                 record["产品数量"],
                 record["计算类型"],
-                "￥{:+,.2f}".format(record["结果"])
+                "￥" + format_cents(to_cents(record["结果"]))
             ))
 
+    @staticmethod
+    def _optional_number(entry, data_type):
+        """
+        读取可留空的数字输入框
+        :param entry: 输入框
+        :param data_type: 目标数据类型
+        :return: 转换后的值，留空时返回None
+        """
+        value = entry.get().strip()
+        if not value:
+            return None
+        try:
+            return data_type(value)
+        except ValueError:
+            raise ValueError("请输入有效的{}值".format(data_type.__name__))
+
+    def _search(self, top=False):
+        """
+        按搜索栏条件查询历史记录
+        :param top: 为True时显示差异金额最大的不利差异
+        """
+        try:
+            conditions = {
+                "product": self.ent_search_product.get().strip() or None,
+                "calc_type": self.cmb_search_type.get() if self.cmb_search_type.current() > 0 else None,
+                "quantity_range": (self._optional_number(self.ent_quantity_min, int),
+                                   self._optional_number(self.ent_quantity_max, int)),
+                "result_range": (self._optional_number(self.ent_result_min, float),
+                                 self._optional_number(self.ent_result_max, float))
+            }
+        except ValueError as e:
+            messagebox.showerror("输入错误", str(e))
+            return
+        started = time.perf_counter()
+        if top:
+            rows = self.history.index.top_unfavorable(self.TOP_K, **conditions)
+            total = len(rows)
+        else:
+            rows, total = self.history.index.query(
+                sort_by_magnitude=self.var_sort.get(),
+                limit=self.HISTORY_VIEW_LIMIT,
+                **conditions
+            )
+        elapsed = (time.perf_counter() - started) * 1000
+        self._fill_tree(rows)
+        self.lbl_status.config(text="搜索结果：共{0}条满足条件，显示{1}条，耗时{2:.1f}毫秒".format(
+            total, len(rows), elapsed))
+
+    def _reset_search(self):
+        """清空搜索条件并显示最近记录"""
+        for entry in (self.ent_search_product, self.ent_quantity_min, self.ent_quantity_max,
+                      self.ent_result_min, self.ent_result_max):
+            entry.delete(0, tk.END)
+        self.cmb_search_type.current(0)
+        self.var_sort.set(False)
+        self._update_history()
+
     def _show_history(self):
         """显示历史记录"""
         self._update_history()
 
+    def _open_history_file(self):
+        """打开或新建二进制历史文件，内存中已有的记录追加到该文件"""
+        filename = filedialog.asksaveasfilename(
+            title="打开或新建历史文件",
+            defaultextension=".hkh",
+            filetypes=[("历史记录文件", "*.hkh")],
+            confirmoverwrite=False
+        )
+        if not filename:
+            return
+        try:
+            history = HistoryManager(filename)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("打开失败", str(e))
+            return
+        if self.history.store is None and self.history.records:
+            history.store.append_many(
+                (record["产品名称"], record["产品数量"], record["计算类型"], record["结果"], record["实际成本"],
+                 record["时间"])
+                for record in self.history.records
+            )
+        if self.trend_dialog is not None and self.trend_dialog.winfo_exists():
+            self.trend_dialog.destroy()
+        self.history.close()
+        self.history = history
+        self._update_history()
+
     def _export_data(self):
         """导出数据到Excel"""
-        if self.history.export_excel():
-            messagebox.showinfo("导出成功", "已成功导出到 历史记录.xlsx")
+        try:
+            self.history.export_excel()
+        except Exception as e:
+            messagebox.showerror("导出失败", str(e))
         else:
-            messagebox.showerror("导出失败", "导出过程中发生错误")
+            messagebox.showinfo("导出成功", "已成功导出到 历史记录.xlsx")
+
+    def _export_report(self):
+        """生成月度差异汇总报表"""
+        filename = filedialog.asksaveasfilename(
+            title="保存月度报表",
+            initialfile="差异月报.xlsx",
+            defaultextension=".xlsx",
+            filetypes=[("Excel文件", "*.xlsx")]
+        )
+        if not filename:
+            return
+        try:
+            sheets = ReportGenerator(self.history).generate(filename)
+        except Exception as e:
+            messagebox.showerror("报表生成失败", str(e))
+            return
+        messagebox.showinfo("报表生成成功", "已生成 {0}，共{1}个月度工作表".format(filename, sheets))
 
     def show_params(self):
         """显示当前系统参数"""
-        params = [
-            ("标准工时", StandardParams.HOURS),
-            ("标准材料用量", StandardParams.MATERIAL_USAGE),
-            ("标准材料单价", StandardParams.MATERIAL_PRICE),
-            ("标准人工费率", StandardParams.LABOR_RATE),
-            ("变动制造费率", StandardParams.VARIABLE_RATE),
-            ("固定制造费率", StandardParams.FIXED_RATE)
-        ]
-        param_list = ["{0}: {1:.2f}".format(name, value) for name, value in params]
+        param_list = ["{0}: {1:.2f}".format(name, getattr(StandardParams, attr_name))
+                      for attr_name, name in PARAM_LABELS.items()]
         messagebox.showinfo("系统参数", "\n".join(param_list))
 
     def _show_edit_dialog(self):
         """显示参数修改对话框"""
         ParamEditDialog(self)
 
+    def _show_sensitivity_dialog(self):
+        """显示敏感性分析对话框"""
+        if not self.history.records:
+            messagebox.showwarning("提示", "暂无历史记录，无法进行敏感性分析")
+            return
+        SensitivityDialog(self, self.history)
+
+    def _show_trend_dialog(self):
+        """显示差异趋势图对话框"""
+        if not self.history.records:
+            messagebox.showwarning("提示", "暂无历史记录，无法绘制趋势图")
+            return
+        if self.trend_dialog is not None and self.trend_dialog.winfo_exists():
+            self.trend_dialog.lift()
+            return
+        self.trend_dialog = TrendDialog(self, self.history)
+
 
 # ==================== 计算对话框类 ====================
 class CalculationDialog(tk.Toplevel):
-    """成本计算对话框，用于收集计算参数"""
+    """成本计算对话框，按差异类型声明的输入字段收集计算参数"""
 
     def __init__(self, parent, calc_type):
         """
         初始化对话框
         :param parent: 父窗口对象
-        :param calc_type: 计算类型（材料/人工/变动/固定）
+        :param calc_type: 差异类型名称
         """
         super().__init__(parent)
-        self.title("{0}成本差异计算".format(calc_type))
+        self.variance_type = VARIANCE_TYPES[calc_type]
+        self.title("{0}计算".format(self.variance_type.label))
         self.calc_type = calc_type
         self.result = None
         self._create_widgets()
@@ -311,17 +500,11 @@ class CalculationDialog(tk.Toplevel):
         self.lbl_quantity = ttk.Label(self, text="生产数量：")
         self.ent_quantity = ttk.Entry(self)
 
-        # 根据计算类型创建特定字段
-        if self.calc_type == "材料":
-            self.lbl_field1 = ttk.Label(self, text="实际材料用量（kg）：")
-            self.lbl_field2 = ttk.Label(self, text="实际材料单价（元/kg）：")
-            self.ent_field1 = ttk.Entry(self)
-            self.ent_field2 = ttk.Entry(self)
-        else:
-            self.lbl_field1 = ttk.Label(self, text="实际费用（元）：")
-            self.ent_field1 = ttk.Entry(self)
-            self.lbl_field2 = None
-            self.ent_field2 = None
+        # 根据差异类型的输入字段创建特定字段
+        self.fields = [
+            (field, ttk.Label(self, text="{0}：".format(prompt)), ttk.Entry(self))
+            for field, prompt in self.variance_type.inputs.items()
+        ]
 
         self.btn_calculate = ttk.Button(self, text="计算", command=self._validate_input)
 
@@ -329,11 +512,8 @@ class CalculationDialog(tk.Toplevel):
         """布局管理"""
         rows = [
             (self.lbl_product, self.ent_product),
-            (self.lbl_quantity, self.ent_quantity),
-            (self.lbl_field1, self.ent_field1)
-        ]
-        if self.calc_type == "材料":
-            rows.append((self.lbl_field2, self.ent_field2))
+            (self.lbl_quantity, self.ent_quantity)
+        ] + [(lbl, ent) for _, lbl, ent in self.fields]
 
         for i, (lbl, ent) in enumerate(rows):
             lbl.grid(row=i, column=0, padx=5, pady=5, sticky=tk.E)
@@ -342,59 +522,518 @@ class CalculationDialog(tk.Toplevel):
         self.btn_calculate.grid(row=len(rows), columnspan=2, pady=10)
 
     def _validate_input(self):
-        """输入验证与计算"""
+        """输入验证与计算，所有字段的错误一次性提示"""
+        columns = {
+            "产品名称": [self.ent_product.get()],
+            "计算类型": [self.calc_type],
+            "生产数量": [self.ent_quantity.get()]
+        }
+        for field, _, ent in self.fields:
+            columns[field] = [ent.get()]
+
+        validation = VARIANCE_VALIDATOR.validate(columns)
+        if validation.errors:
+            messagebox.showerror("输入错误", "\n".join(validation.errors))
+            return
+
+        values = validation.values
+        quantity = int(values["生产数量"][0])
+        with np.errstate(all="ignore"):
+            actual_cost = self.variance_type.actual_kernel(
+                {field: values[field][0] for field in self.variance_type.inputs})
+        if not np.isfinite(actual_cost):
+            messagebox.showerror("输入错误", INVALID_ACTUAL_COST)
+            return
+        result = to_yuan(variance_cents(actual_cost, quantity, self.calc_type))
+        actual_cost = to_yuan(to_cents(actual_cost))
+
+        self.result = (
+            values["产品名称"][0],
+            quantity,
+            self.calc_type,
+            result,
+            actual_cost
+        )
+        self.destroy()
+
+
+# ==================== 自定义差异类型对话框类 ====================
+class VarianceTypeDialog(tk.Toplevel):
+    """自定义差异类型对话框，公式验证通过后注册并保存到差异类型文件"""
+
+    def __init__(self, parent):
+        """
+        初始化对话框
+        :param parent: 父窗口对象
+        """
+        super().__init__(parent)
+        self.title("自定义差异类型")
+        self.result = None
+        self._create_widgets()
+        self._setup_layout()
+
+    def _create_widgets(self):
+        """创建界面组件"""
+        self.entries = [
+            (ttk.Label(self, text=label_text), ttk.Entry(self, width=40))
+            for label_text in ("类型名称：", "按钮文字：", "实际成本公式：", "新增标准参数：", "单位标准成本公式（元/件）：")
+        ]
+        self.lbl_help = ttk.Label(self, justify=tk.LEFT, text=(
+            "实际成本公式引用输入字段名（如 实际耗电量 * 实际电价），输入字段由公式自动识别\n"
+            "单位标准成本公式引用标准参数：{0}\n"
+            "新增标准参数格式：属性名 中文名称 取值，多个参数以分号分隔\n"
+            "公式支持 + - * / **（指数为常数）、括号及 {1} 函数"
+        ).format("、".join(PARAM_LABELS), "/".join(FORMULA_FUNCTIONS)))
+        self.btn_confirm = ttk.Button(self, text="添加", command=self._validate_input)
+        self.btn_cancel = ttk.Button(self, text="取消", command=self.destroy)
+
+    def _setup_layout(self):
+        """布局管理"""
+        for i, (lbl, ent) in enumerate(self.entries):
+            lbl.grid(row=i, column=0, padx=5, pady=5, sticky=tk.E)
+            ent.grid(row=i, column=1, padx=5, pady=5, sticky=tk.W)
+        self.lbl_help.grid(row=len(self.entries), columnspan=2, padx=5, pady=5, sticky=tk.W)
+        self.btn_confirm.grid(row=len(self.entries) + 1, column=0, pady=10, sticky=tk.E)
+        self.btn_cancel.grid(row=len(self.entries) + 1, column=1, pady=10, sticky=tk.W)
+
+    def _validate_input(self):
+        """解析参数并验证公式，通过后注册差异类型"""
+        name, label, actual, params_text, standard = (ent.get().strip() for _, ent in self.entries)
         try:
-            # 基础验证
-            product_name = self.ent_product.get().strip()
-            if not product_name:
-                raise ValueError("产品名称不能为空")
-
-            quantity = self._validate_number(self.ent_quantity.get(), int, 1)
-
-            # 根据计算类型进行验证
-            if self.calc_type == "材料":
-                usage = self._validate_number(self.ent_field1.get(), float, 0)
-                price = self._validate_number(self.ent_field2.get(), float, 0)
-                result = usage * price - quantity * StandardParams.MATERIAL_USAGE * StandardParams.MATERIAL_PRICE
-            elif self.calc_type == "人工":
-                wages = self._validate_number(self.ent_field1.get(), float, 0)
-                result = wages - quantity * StandardParams.HOURS * StandardParams.LABOR_RATE
-            else:
-                cost = self._validate_number(self.ent_field1.get(), float, 0)
-                rate = StandardParams.VARIABLE_RATE if self.calc_type == "变动" else StandardParams.FIXED_RATE
-                result = cost - quantity * StandardParams.HOURS * rate
-
-            self.result = (
-                product_name,
-                quantity,
-                "直接{0}成本差异".format(self.calc_type),
-                result
-            )
-            self.destroy()
+            params = {}
+            for item in params_text.replace("；", ";").split(";"):
+                if not item.strip():
+                    continue
+                parts = item.split()
+                if len(parts) != 3:
+                    raise ValueError("新增标准参数格式错误：{0}".format(item.strip()))
+                params[parts[0]] = [parts[1], parts[2]]
+            variance_type = VarianceType(name, actual, standard, params=params, label=label or None)
+            register_variance_type(variance_type)
         except ValueError as e:
-            messagebox.showerror("输入错误", str(e))
+            messagebox.showerror("声明失败", str(e))
+            return
+        try:
+            save_variance_types()
+        except OSError as e:
+            unregister_variance_type(variance_type.name)
+            messagebox.showerror("保存失败", "未添加差异类型：{0}".format(str(e)))
+            return
+        messagebox.showinfo("成功", "已添加差异类型 {0}，输入字段：{1}".format(
+            variance_type.name, "、".join(variance_type.inputs)))
+        self.result = variance_type
+        self.destroy()
+
 
-    def _validate_number(self, value, data_type, min_val):
+# ==================== 敏感性分析对话框类 ====================
+class SensitivityDialog(tk.Toplevel):
+    """敏感性分析对话框，以热力图显示两参数网格上的总差异，并列出龙卷风排序"""
+
+    HEATMAP_SIZE = 500  # 热力图画布边长（像素）
+
+    def __init__(self, parent, history):
         """
-        通用数字验证方法
-        :param value: 输入值
-        :param data_type: 目标数据类型
-        :param min_val: 最小值
-        :return: 转换后的有效值
+        初始化对话框
+        :param parent: 父窗口对象
+        :param history: 历史记录管理器
         """
-        value = value.strip()
-        if not value:
-            raise ValueError("数值不能为空")
+        super().__init__(parent)
+        self.title("标准参数敏感性分析")
+        self.analyzer = SensitivityAnalyzer(history)
+        self.names = list(PARAM_LABELS)
+        self.image = None  # 保留PhotoImage引用，避免被垃圾回收
+        self._create_widgets()
+        self._setup_layout()
+        self._show_tornado()
+
+    def _create_widgets(self):
+        """创建界面组件"""
+        self.form = ttk.Frame(self)
+        labels = [PARAM_LABELS[name] for name in self.names]
+        self.axis_widgets = []
+        for idx, (axis_text, default_name) in enumerate((("横轴参数：", "MATERIAL_PRICE"),
+                                                          ("纵轴参数：", "MATERIAL_USAGE"))):
+            lbl = ttk.Label(self.form, text=axis_text)
+            combo = ttk.Combobox(self.form, values=labels, state="readonly", width=12)
+            combo.current(self.names.index(default_name))
+            combo.bind("<<ComboboxSelected>>", lambda event, i=idx: self._fill_range(i))
+            ent_min = ttk.Entry(self.form, width=10)
+            ent_max = ttk.Entry(self.form, width=10)
+            self.axis_widgets.append((lbl, combo, ent_min, ent_max))
+            self._fill_range(idx)
+
+        self.lbl_steps = ttk.Label(self.form, text="取值点数：")
+        self.ent_steps = ttk.Entry(self.form, width=10)
+        self.ent_steps.insert(0, "500")
+        self.btn_calculate = ttk.Button(self.form, text="计算", command=self._calculate)
+
+        self.canvas = tk.Canvas(self, width=self.HEATMAP_SIZE, height=self.HEATMAP_SIZE, bg="white")
+        self.lbl_summary = ttk.Label(self, text="", justify=tk.LEFT)
+
+        columns = ("参数", "下浮10%", "上浮10%", "波动幅度")
+        self.tornado_tree = ttk.Treeview(self, columns=columns, show="headings", height=len(self.names))
+        for col in columns:
+            self.tornado_tree.heading(col, text=col)
+            self.tornado_tree.column(col, width=100, anchor="center")
+
+    def _setup_layout(self):
+        """布局管理"""
+        self.form.grid(row=0, column=0, columnspan=2, padx=5, pady=5, sticky=tk.W)
+        for row, (lbl, combo, ent_min, ent_max) in enumerate(self.axis_widgets):
+            lbl.grid(row=row, column=0, padx=5, pady=2, sticky=tk.E)
+            combo.grid(row=row, column=1, padx=5, pady=2)
+            ent_min.grid(row=row, column=2, padx=2, pady=2)
+            ttk.Label(self.form, text="至").grid(row=row, column=3)
+            ent_max.grid(row=row, column=4, padx=2, pady=2)
+        self.lbl_steps.grid(row=2, column=0, padx=5, pady=2, sticky=tk.E)
+        self.ent_steps.grid(row=2, column=1, padx=5, pady=2, sticky=tk.W)
+        self.btn_calculate.grid(row=2, column=4, padx=5, pady=2)
+
+        self.canvas.grid(row=1, column=0, rowspan=2, padx=10, pady=10)
+        self.tornado_tree.grid(row=1, column=1, padx=10, pady=10, sticky=tk.N)
+        self.lbl_summary.grid(row=2, column=1, padx=10, pady=10, sticky=tk.NW)
+
+    def _fill_range(self, idx):
+        """按所选参数的当前值填充默认取值范围（±50%）"""
+        _, combo, ent_min, ent_max = self.axis_widgets[idx]
+        value = getattr(StandardParams, self.names[combo.current()])
+        for entry, bound in ((ent_min, value * 0.5), (ent_max, value * 1.5)):
+            entry.delete(0, tk.END)
+            entry.insert(0, "{:.4g}".format(bound))
+
+    def _show_tornado(self):
+        """显示龙卷风排序"""
+        for item in self.tornado_tree.get_children():
+            self.tornado_tree.delete(item)
+        for name, low, high, swing in self.analyzer.tornado():
+            self.tornado_tree.insert("", "end", values=(
+                PARAM_LABELS[name],
+                "{:+,.2f}".format(low),
+                "{:+,.2f}".format(high),
+                "{:,.2f}".format(swing)
+            ))
+
+    def _calculate(self):
+        """读取输入并计算、绘制热力图"""
         try:
-            converted = data_type(value)
-        except ValueError:
-            raise ValueError("请输入有效的{}值".format(data_type.__name__))
-        if converted < min_val:
-            raise ValueError("数值不能小于 {}".format(min_val))
-        return converted
+            axes = []
+            for _, combo, ent_min, ent_max in self.axis_widgets:
+                low = float(ent_min.get())
+                high = float(ent_max.get())
+                if not 0 <= low < high:
+                    raise ValueError("取值范围应满足 0 ≤ 最小值 < 最大值")
+                axes.append((self.names[combo.current()], low, high))
+            steps = int(self.ent_steps.get())
+            if not 2 <= steps <= 2000:
+                raise ValueError("取值点数应在2到2000之间")
+            (x_name, x_low, x_high), (y_name, y_low, y_high) = axes
+            x_values = np.linspace(x_low, x_high, steps)
+            y_values = np.linspace(y_low, y_high, steps)
+            surface = self.analyzer.grid(x_name, x_values, y_name, y_values)
+        except ValueError as e:
+            messagebox.showerror("输入错误", str(e), parent=self)
+            return
+
+        self._draw_heatmap(surface)
+        lines = ["当前参数总差异：￥{:+,.2f}".format(self.analyzer.baseline())]
+        for title, flat_idx in (("最小", surface.argmin()), ("最大", surface.argmax())):
+            row, col = np.unravel_index(flat_idx, surface.shape)
+            lines.append("{}：￥{:+,.2f}\n  {}={:.4g}，{}={:.4g}".format(
+                title, surface[row, col], PARAM_LABELS[x_name], x_values[col],
+                PARAM_LABELS[y_name], y_values[row]))
+        lines.append("横轴：{}，纵轴：{}（向上递增）".format(PARAM_LABELS[x_name], PARAM_LABELS[y_name]))
+        lines.append("红色为不利差异，绿色为有利差异")
+        self.lbl_summary.config(text="\n".join(lines))
+
+    @staticmethod
+    def _palette():
+        """以0为中心的256级红绿色阶：0级为最深绿色，255级为最深红色"""
+        t = np.linspace(-1, 1, 256)
+        fade = (255 * (1 - np.abs(t))).astype(int)
+        red = np.where(t > 0, 255, fade)
+        green = np.where(t < 0, 255, fade)
+        return np.array(["#{:02x}{:02x}{:02x}".format(r, g, b) for r, g, b in zip(red, green, fade)])
+
+    def _draw_heatmap(self, surface):
+        """
+        将差异曲面绘制为热力图
+        :param surface: 总差异曲面，行对应纵轴，列对应横轴
+        """
+        # 网格大于画布时按步长抽样，保证每个像素只对应一个网格点
+        step = -(-max(surface.shape) // self.HEATMAP_SIZE)
+        surface = surface[::step, ::step]
+        rows, cols = surface.shape
+        limit = np.abs(surface).max() or 1.0
+        levels = np.rint((surface / limit + 1) * 127.5).astype(int)
+        colors = self._palette()[levels[::-1]]  # 纵轴向上递增，图像首行对应最大值
+        self.image = tk.PhotoImage(width=cols, height=rows)
+        self.image.put(" ".join("{" + " ".join(row) + "}" for row in colors))
+        zoom = max(1, self.HEATMAP_SIZE // max(rows, cols))
+        if zoom > 1:
+            self.image = self.image.zoom(zoom)
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image)
+
+
+# ==================== 趋势图类 ====================
+class TrendChart(tk.Canvas):
+    """
+    差异趋势图画布
+    横轴为记录时间（按日期标注），纵轴为差异金额，每个计算类型一条折线；未记录时间的记录不绘制
+    折线按像素宽度降采样；追加记录时只重算序列最后两个桶并更新折线坐标，
+    新记录超出坐标范围时才整体重绘（横轴预留余量，整体重绘的次数随时间跨度对数增长）
+    """
+    MARGIN = (70, 30, 20, 30)  # 左、上、右、下边距（像素）
+    COLORS = ("#d62728", "#1f77b4", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b")
+    METHODS = {"LTTB": lttb_downsample, "最大最小值": minmax_downsample}
+    HEADROOM = 1.25  # 整体重绘时横轴容量为当前时间跨度的倍数
+
+    def __init__(self, parent, history, width=800, height=400):
+        """
+        :param parent: 父窗口对象
+        :param history: 历史记录管理器
+        :param width: 画布宽度（像素）
+        :param height: 画布高度（像素）
+        """
+        super().__init__(parent, width=width, height=height, bg="white")
+        self.history = history
+        self.product = None
+        self.calc_types = []
+        self.method = "LTTB"
+        self.series = {}  # 计算类型 → 序列(positions时间秒数, values差异, picked保留点下标, item折线)
+        self.total = 0  # 已处理的历史记录数
+        self.start = 0  # 横轴起点（秒数，bucket_size的整数倍）
+        self.capacity = 1  # 横轴覆盖的秒数
+        self.y_range = (-1.0, 1.0)
+
+    def _plot_size(self):
+        """绘图区宽、高（像素）"""
+        left, top, right, bottom = self.MARGIN
+        return int(self["width"]) - left - right, int(self["height"]) - top - bottom
+
+    @property
+    def bucket_size(self):
+        """每个像素宽对应的秒数"""
+        return max(1, -(-self.capacity // self._plot_size()[0]))
+
+    def show(self, product, calc_types, method="LTTB"):
+        """
+        绘制指定产品的差异趋势
+        :param product: 产品名称
+        :param calc_types: 要绘制的计算类型列表
+        :param method: 降采样方法，METHODS中的键
+        """
+        index = self.history.index
+        index.refresh()
+        product_rows = index.exact_rows("product", product)
+        self.product, self.calc_types, self.method = product, list(calc_types), method
+        self.series = {}
+        for calc_type in self.calc_types:
+            rows = np.intersect1d(product_rows, index.exact_rows("calc_type", calc_type), assume_unique=True)
+            rows = rows[index.data["timestamp"][rows] != 0]
+            if len(rows):
+                # 记录大体按时间追加，导入的记录可能更早，按时间稳定排序
+                rows = rows[np.argsort(index.data["timestamp"][rows], kind="stable")]
+                self.series[calc_type] = SimpleNamespace(
+                    positions=index.data["timestamp"][rows].astype(np.int64),
+                    values=index.data["result"][rows].astype(np.float64), picked=None, item=None)
+        self.total = len(self.history.records)
+        self.redraw()
+
+    def redraw(self):
+        """重新确定坐标范围，整体降采样并重绘"""
+        self.delete("all")
+        if not self.series:
+            self.create_text(int(self["width"]) // 2, int(self["height"]) // 2, text="没有符合条件的记录")
+            return
+        first = min(int(series.positions[0]) for series in self.series.values())
+        last = max(int(series.positions[-1]) for series in self.series.values())
+        self.capacity = max(self._plot_size()[0], int((last - first) * self.HEADROOM) + 1)
+        # 起点对齐到桶边界，桶与像素一一对应
+        self.start = first // self.bucket_size * self.bucket_size
+        low = min(0.0, min(series.values.min() for series in self.series.values()))
+        high = max(0.0, max(series.values.max() for series in self.series.values()))
+        padding = (high - low) * 0.1 or 1.0
+        self.y_range = (low - padding, high + padding)
+        self._draw_axes()
+        for idx, (calc_type, series) in enumerate(self.series.items()):
+            color = self.COLORS[idx % len(self.COLORS)]
+            series.picked = self.METHODS[self.method](series.positions, series.values, self.bucket_size)
+            series.item = self.create_line(0, 0, 0, 0, fill=color)
+            self._update_line(series)
+            left, top = self.MARGIN[:2]
+            self.create_line(left + 10 + idx * 150, top / 2, left + 30 + idx * 150, top / 2, fill=color, width=2)
+            self.create_text(left + 35 + idx * 150, top / 2, text=calc_type, anchor=tk.W)
+
+    def _draw_axes(self):
+        """绘制边框、零线和坐标标注"""
+        left, top = self.MARGIN[:2]
+        width, height = self._plot_size()
+        low, high = self.y_range
+        self.create_rectangle(left, top, left + width, top + height, outline="gray")
+        for value in (low, 0.0, high):
+            y = top + (high - value) / (high - low) * height
+            if value == 0.0:
+                self.create_line(left, y, left + width, y, fill="gray", dash=(4, 2))
+            self.create_text(left - 5, y, text="{:+,.0f}".format(value), anchor=tk.E)
+        # 横轴跨度不足两天时标注到分钟
+        date_format = "%Y-%m-%d" if self.capacity >= 2 * 86400 else "%m-%d %H:%M"
+        for fraction in (0, 0.5, 1):
+            moment = from_timestamp(self.start + int(fraction * (self.capacity - 1)))
+            self.create_text(left + fraction * width, top + height + 5,
+                             text=moment.strftime(date_format) if moment else "", anchor=tk.N)
+
+    def _update_line(self, series):
+        """按保留点更新折线坐标"""
+        left, top = self.MARGIN[:2]
+        width, height = self._plot_size()
+        low, high = self.y_range
+        picked = series.picked if len(series.picked) > 1 else np.repeat(series.picked, 2)
+        xs = left + (series.positions[picked] - self.start) / self.capacity * width
+        ys = top + (high - series.values[picked]) / (high - low) * height
+        self.coords(series.item, *np.column_stack((xs, ys)).ravel().tolist())
+
+    def append(self):
+        """
+        历史记录追加后增量更新
+        新记录属于已绘制的序列、在坐标范围内且不早于序列末点时只重算该序列尾部，否则整体重绘
+        """
+        total = len(self.history.records)
+        if self.product is None:
+            self.total = total
+            return
+        low, high = self.y_range
+        need_redraw = False
+        touched = {}  # 计算类型 → 追加前的点数
+        for row in range(self.total, total):
+            record = self.history.records[row]
+            calc_type = record["计算类型"]
+            if record["产品名称"] != self.product or calc_type not in self.calc_types or record["时间"] is None:
+                continue
+            moment = to_timestamp(record["时间"])
+            series = self.series.get(calc_type)
+            if series is None:
+                series = self.series[calc_type] = SimpleNamespace(
+                    positions=np.zeros(0, np.int64), values=np.zeros(0), picked=None, item=None)
+                need_redraw = True
+            touched.setdefault(calc_type, len(series.positions))
+            # 按时间插入，保持序列升序
+            at = int(np.searchsorted(series.positions, moment, side="right"))
+            need_redraw = need_redraw or at < len(series.positions)
+            series.positions = np.insert(series.positions, at, moment)
+            series.values = np.insert(series.values, at, record["结果"])
+            need_redraw = (need_redraw or not self.start <= moment < self.start + self.capacity
+                           or not low <= record["结果"] <= high)
+        self.total = total
+        if need_redraw:
+            self.redraw()
+            return
+        for calc_type, old_count in touched.items():
+            self._extend(self.series[calc_type], old_count)
+
+    def _extend(self, series, old_count):
+        """
+        序列追加点后只重算最后两个非空桶
+        （最后一个桶的保留点以序列末点为参照，倒数第二个桶的保留点以最后一个桶的均值点为参照，
+        其余桶的保留点不受追加影响）
+        :param series: 序列
+        :param old_count: 追加前的点数
+        """
+        bucket_size = self.bucket_size
+        positions = series.positions
+        first = np.searchsorted(positions, positions[old_count - 1] // bucket_size * bucket_size)
+        if first > 0:
+            first = np.searchsorted(positions, positions[first - 1] // bucket_size * bucket_size)
+        kept = series.picked[:np.searchsorted(series.picked, first)]
+        method = self.METHODS[self.method]
+        if method is lttb_downsample and len(kept):
+            tail = method(positions[first:], series.values[first:], bucket_size,
+                          anchor=(positions[kept[-1]], series.values[kept[-1]]))
+        else:
+            tail = method(positions[first:], series.values[first:], bucket_size)
+        series.picked = np.concatenate((kept, first + tail))
+        self._update_line(series)
+
+    def point_counts(self):
+        """
+        :return: (原始点数, 绘制点数)
+        """
+        return (sum(len(series.positions) for series in self.series.values()),
+                sum(len(series.picked) for series in self.series.values() if series.picked is not None))
+
+
+# ==================== 趋势图对话框类 ====================
+class TrendDialog(tk.Toplevel):
+    """差异趋势图对话框，按产品和计算类型绘制差异随时间的变化"""
+
+    def __init__(self, parent, history):
+        """
+        初始化对话框
+        :param parent: 父窗口对象
+        :param history: 历史记录管理器
+        """
+        super().__init__(parent)
+        self.title("差异趋势图")
+        self.history = history
+        self._create_widgets()
+        self._setup_layout()
+
+    def _create_widgets(self):
+        """创建界面组件"""
+        self.form = ttk.Frame(self)
+        self.cmb_product = ttk.Combobox(self.form, values=self.history.index.names("product"),
+                                        state="readonly", width=16)
+        self.cmb_type = ttk.Combobox(self.form, values=["全部类型"] + list(UNIT_STANDARD_COST),
+                                     state="readonly", width=16)
+        self.cmb_type.current(0)
+        self.cmb_method = ttk.Combobox(self.form, values=list(TrendChart.METHODS), state="readonly", width=10)
+        self.cmb_method.current(0)
+        self.btn_draw = ttk.Button(self.form, text="绘制", command=self._draw)
+        self.chart = TrendChart(self, self.history)
+        self.lbl_status = ttk.Label(self, text="")
+
+    def _setup_layout(self):
+        """布局管理"""
+        self.form.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        form_widgets = [
+            ttk.Label(self.form, text="产品："), self.cmb_product,
+            ttk.Label(self.form, text="类型："), self.cmb_type,
+            ttk.Label(self.form, text="降采样："), self.cmb_method, self.btn_draw
+        ]
+        for widget in form_widgets:
+            widget.pack(side=tk.LEFT, padx=2)
+        self.chart.pack(padx=10, pady=5)
+        self.lbl_status.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
+
+    def _draw(self):
+        """按所选条件绘制趋势图"""
+        product = self.cmb_product.get()
+        if not product:
+            messagebox.showwarning("提示", "请选择产品", parent=self)
+            return
+        calc_types = list(UNIT_STANDARD_COST) if self.cmb_type.current() == 0 else [self.cmb_type.get()]
+        start = time.perf_counter()
+        self.chart.show(product, calc_types, self.cmb_method.get())
+        self._update_status(time.perf_counter() - start)
+
+    def refresh(self):
+        """历史记录追加后增量更新图表，新产品加入产品列表"""
+        start = time.perf_counter()
+        self.chart.append()
+        product = self.history.records[len(self.history.records) - 1]["产品名称"]
+        if product not in self.cmb_product["values"]:
+            self.cmb_product["values"] = sorted(self.cmb_product["values"] + (product,))
+        if self.chart.product is not None:
+            self._update_status(time.perf_counter() - start)
+
+    def _update_status(self, seconds):
+        """显示点数与绘制耗时"""
+        raw, shown = self.chart.point_counts()
+        self.lbl_status.config(text="原始{0}点，降采样后绘制{1}点，耗时{2:.3f}秒".format(raw, shown, seconds))
 
 
 # ==================== 程序入口 ====================
 if __name__ == "__main__":
     app = CostAnalysisApp()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
+    app.history.close()
\ No newline at end of file
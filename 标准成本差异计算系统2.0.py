@@ -6,31 +6,46 @@
 2. 记录计算历史
 3. 支持数据导出Excel
 4. 参数配置管理
+5. 标准参数敏感性分析（参数网格 + 龙卷风排序）
+6. 定长二进制历史文件（内存映射随机访问，崩溃安全追加）
+7. 历史记录索引查询（按产品、类型、数量和差异范围筛选，不利差异Top-K）
+8. 月度差异汇总报表（按产品、计算类型分表小计）
+9. CSV批量计算（整列验证输入，返回逐行错误报告；按块内容缓存结果，重复运行只计算变化的部分）
+10. 定点金额运算（金额以整数分计算和汇总，可选四舍五入或银行家舍入）
+11. 自定义差异类型（以公式声明，编译为NumPy函数后用于单条和批量计算）
+12. 生产日志实时监控（跟踪增长中的CSV/JSONL日志，按产品滑动窗口汇总差异，超过阈值时告警）
+
+用法:
+    python 标准成本差异计算系统2.0.py [历史文件.hkh]
+    指定历史文件时记录保存在二进制文件中，否则只保存在内存中
+    当前目录下的 差异类型.json 中声明的自定义差异类型在启动时自动加载
+    python 标准成本差异计算系统2.0.py --benchmark-money [记录数]
+    开发用：比较浮点数、整数分和Decimal的金额运算速度
 """
 
+import asyncio
+import csv
+import ctypes
+import decimal
+import hashlib
+import itertools
+import json
+import os
+import struct
 import sys
-from openpyxl import Workbook
+import time
+from collections import deque
+from datetime import datetime
+from types import SimpleNamespace
 
+import numpy as np
 
-# ==================== 标准参数配置类 ====================
-class StandardParams:
-    """
-    存储系统标准参数的静态类
-    所有参数使用类属性方式存储，便于集中管理
-    参数说明：
-    - HOURS: 每件产品标准工时(小时/件)
-    - MATERIAL_USAGE: 每件产品标准材料用量(千克/件)
-    - MATERIAL_PRICE: 标准材料单价(元/千克)
-    - LABOR_RATE: 标准人工费率(元/小时)
-    - VARIABLE_RATE: 变动制造费用标准费率(元/小时)
-    - FIXED_RATE: 固定制造费用标准费率(元/小时)
-    """
-    HOURS = 2  # (小时/件)
-    MATERIAL_USAGE = 5.5  # (千克/件)
-    MATERIAL_PRICE = 2.2  # (元/千克)
-    LABOR_RATE = 6  # (元/小时)
-    VARIABLE_RATE = 3  # (元/小时)
-    FIXED_RATE = 1.5  # (元/小时)
+from money import CENTS_PER_YUAN, MONEY_ROUNDING, format_cents, group_sum, to_cents, to_yuan
+from variance_core import (
+    FORMULA_FUNCTIONS, INVALID_ACTUAL_COST, PARAM_LABELS, UNIT_STANDARD_COST, VARIANCE_TYPES, VARIANCE_TYPES_FILE,
+    VARIANCE_VALIDATOR, HistoryManager, ReportGenerator, SensitivityAnalyzer, StandardParams, VarianceType,
+    load_variance_types, register_variance_type, save_variance_types, unregister_variance_type, variance_cents,
+    variance_fields)
 
 
 # ==================== 输入验证模块 ====================
@@ -77,172 +92,1097 @@ def get_valid_input(prompt, input_type=float, min_val=None, max_val=None):
             print("发生未知错误：{}".format(str(e)))
 
 
+def get_optional_input(prompt, input_type=float):
+    """
+    获取可留空的输入
+    返回:
+        value: 转换后的值，留空时返回None
+    """
+    while True:
+        raw = input(prompt).strip()
+        if not raw:
+            return None
+        try:
+            return input_type(raw)
+        except ValueError:
+            print("输入格式错误，请重新输入")
+
+
+# ==================== 差异类型模块 ====================
+def run_define_type():
+    """交互式声明自定义差异类型，注册后保存到差异类型文件"""
+    print("\n【自定义差异类型】")
+    print("实际成本公式引用输入字段名（如 实际耗电量 * 实际电价），输入字段由公式自动识别")
+    print("单位标准成本公式引用标准参数：{}".format("、".join(PARAM_LABELS)))
+    print("公式支持 + - * / **（指数为常数）、括号及 {} 函数".format("/".join(FORMULA_FUNCTIONS)))
+    try:
+        name = input("差异类型名称: ").strip()
+        actual = input("实际成本公式: ").strip()
+        params = {}
+        while True:
+            text = input("新增标准参数（属性名 中文名称 取值，直接回车结束）: ").strip()
+            if not text:
+                break
+            parts = text.split()
+            if len(parts) != 3:
+                print("格式错误，示例：ENERGY_PRICE 标准电价 0.8")
+                continue
+            params[parts[0]] = [parts[1], parts[2]]
+        standard = input("单位标准成本公式(元/件): ").strip()
+        register_variance_type(VarianceType(name, actual, standard, params=params))
+    except ValueError as e:
+        print("声明失败：{}".format(str(e)))
+        return
+    try:
+        save_variance_types()
+    except OSError as e:
+        unregister_variance_type(name)
+        print("保存失败，未添加差异类型：{}".format(str(e)))
+        return
+    print("已添加差异类型 {}，输入字段：{}（已保存到 {}）".format(
+        name, "、".join(VARIANCE_TYPES[name].inputs), VARIANCE_TYPES_FILE))
+
+
 # ==================== 成本计算模块 ====================
 class CostCalculator:
     """
     成本差异计算器类
-    包含各种成本差异计算的静态方法
-    所有方法接收生产数量参数，返回差异计算结果
+    按差异类型声明的公式计算，返回差异计算结果（整分金额）
     """
 
     @staticmethod
-    def material(cp_number):
+    def calculate(type_name, cp_number):
         """
-        计算直接材料成本差异
+        计算一条成本差异
         公式：
-            差异 = 实际用量 × 实际单价 - 标准用量 × 标准单价 × 产量
+            差异 = 实际成本（按类型的实际成本公式） - 单位标准成本 × 产量
         参数:
+            type_name (str): 差异类型名称
             cp_number (int): 产品数量
         返回:
-            float: 成本差异金额
+            float: 成本差异金额（实际成本与标准成本各自舍入到分后相减）
+        异常:
+            ValueError: 实际成本不是有限数（如公式中除以零）
         """
-        sj_use = get_valid_input("实际耗用材料(千克): ", float, 0)
-        cl_price = get_valid_input("材料实际单价(元/千克): ", float, 0)
-        return sj_use * cl_price - StandardParams.MATERIAL_USAGE * StandardParams.MATERIAL_PRICE * cp_number
+        variance_type = VARIANCE_TYPES[type_name]
+        # 按numpy浮点数计算，除以零得到inf/nan而不是抛出ZeroDivisionError，与批量计算一致
+        values = {field: np.float64(get_valid_input("{}: ".format(prompt), float, 0))
+                  for field, prompt in variance_type.inputs.items()}
+        with np.errstate(all="ignore"):
+            actual_cost = variance_type.actual_kernel(values)
+        if not np.isfinite(actual_cost):
+            raise ValueError(INVALID_ACTUAL_COST)
+        return to_yuan(variance_cents(actual_cost, cp_number, type_name))
 
-    @staticmethod
-    def labor(cp_number):
+
+# ==================== 历史记录模块 ====================
+def show_history(history, rows=None):
+    """
+    格式化显示历史记录
+    参数:
+        history (HistoryManager): 历史记录管理器
+        rows (array): 要显示的记录行号（从0开始），缺省显示全部记录
+    """
+    print("\n【历史记录】")
+    # 使用format进行列对齐格式化
+    # {:<5}表示左对齐，占5字符宽度
+    print("{:<5}{:<10}{:<10}{:<20}{:<15}".format(*history.headers))
+    if rows is None:
+        numbered = enumerate(history.records, 1)
+    else:
+        numbered = ((int(row) + 1, history.records[int(row)]) for row in rows)
+    for idx, record in numbered:
+        print("{:<5}{:<10}{:<10}{:<20}{:<15}".format(idx, record["产品名称"], record["产品数量"], record["计算类型"],
+            format_cents(to_cents(record["结果"]))))
+
+
+def run_query(history):
+    """
+    交互式筛选历史记录
+    所有条件均可留空表示不限
+    """
+    conditions = {
+        "product": input("产品名称关键字: ").strip() or None,
+        "calc_type": input("计算类型关键字: ").strip() or None,
+        "quantity_range": (get_optional_input("最小数量: ", int), get_optional_input("最大数量: ", int)),
+        "result_range": (get_optional_input("最小差异: "), get_optional_input("最大差异: "))}
+    mode = input("1.按记录顺序  2.按差异绝对值排序  3.不利差异Top-K（默认1）: ").strip() or "1"
+    limit = get_optional_input("显示条数(默认20): ", int)
+    while limit is not None and limit < 1:
+        print("显示条数不能小于1")
+        limit = get_optional_input("显示条数(默认20): ", int)
+    limit = limit or 20
+    started = time.perf_counter()
+    if mode == "3":
+        rows = history.index.top_unfavorable(limit, **conditions)
+        total = len(rows)
+    else:
+        rows, total = history.index.query(sort_by_magnitude=(mode == "2"), limit=limit, **conditions)
+    elapsed = (time.perf_counter() - started) * 1000
+    show_history(history, rows)
+    print("共{}条记录满足条件，显示{}条，耗时{:.1f}毫秒".format(total, len(rows), elapsed))
+
+
+# ==================== 报表生成模块 ====================
+def run_report(history):
+    """交互式生成月度差异汇总报表"""
+    year = get_optional_input("统计年度(留空统计全部): ", int)
+    filename = input("报表文件名(默认 差异月报.xlsx): ").strip() or "差异月报.xlsx"
+    started = time.perf_counter()
+    try:
+        sheets = ReportGenerator(history).generate(filename, year)
+    except Exception as e:
+        print("报表生成失败：{}".format(str(e)))
+        return
+    print("成功生成 {}，共{}个月度工作表，耗时{:.1f}秒".format(filename, sheets, time.perf_counter() - started))
+
+
+# ==================== 批量计算模块 ====================
+def csv_columns(header, rows):
+    """
+    CSV各行按表头转换为列，不做任何转换，由BatchValidator统一验证
+    参数:
+        header (list): 表头字段名
+        rows (list): csv.reader解析出的行，列数不足的行以空字符串补齐
+    返回:
+        dict: 表头字段名 → 原始字符串列表
+    """
+    columns = list(itertools.zip_longest(*rows, fillvalue=""))
+    columns += [("",) * len(rows)] * (len(header) - len(columns))
+    return {name: list(column) for name, column in zip(header, columns)}
+
+
+def calculate_batch(result):
+    """
+    对验证通过的行整列计算成本差异
+    公式同CostCalculator：差异 = 实际成本 - 产量 × 单位标准成本，金额均为整数分
+    实际成本按各行计算类型的公式计算，结果不是有限数（如除以零）的行登记为错误行，不参与汇总
+    参数:
+        result (ValidationResult): VARIANCE_VALIDATOR的验证结果，会追加实际成本无效的错误
+    返回:
+        tuple: (行号数组, 实际成本数组(分), 差异数组(分))
+    """
+    rows = np.flatnonzero(~result.invalid)
+    codes = result.codes["计算类型"][rows]
+    variance_types = list(VARIANCE_TYPES.values())
+    actual_cost = np.zeros(len(rows))
+    # 每种类型只在本类型的行上调用一次编译好的实际成本函数
+    with np.errstate(all="ignore"):
+        for code in np.unique(codes).tolist():
+            selected = np.flatnonzero(codes == code)
+            inputs = {field: result.values[field][rows[selected]] for field in variance_types[code].inputs}
+            actual_cost[selected] = variance_types[code].actual_kernel(inputs)
+    finite = np.isfinite(actual_cost)
+    if not finite.all():
+        mask = np.zeros(result.size, dtype=bool)
+        mask[rows[~finite]] = True
+        result.add_error(INVALID_ACTUAL_COST, mask)
+        rows, codes, actual_cost = rows[finite], codes[finite], actual_cost[finite]
+    variance = variance_cents(actual_cost, result.values["生产数量"][rows], codes)
+    return rows, to_cents(actual_cost), variance
+
+
+class BatchCache:
+    """
+    批量计算的内容寻址增量缓存
+    - 输入CSV按固定行数分块，每块以 表头 + 块内容 + 标准参数快照 + 差异类型公式 + 舍入规则 的哈希为键，
+      内容和参数都未变化的块直接复用上次的计算结果
+    - 只在文件末尾追加行时，只有原来最后一个不完整的块和新增的块需要重新计算
+    - 每块的计算结果保存为npz文件，汇总信息保存在索引文件中，只需汇总时不读取npz
+    - 缓存总大小超过上限时，按最近使用时间从旧到新淘汰
+    注意：按物理行分块，字段内不能含换行符
+    """
+    VERSION = 1  # 计算逻辑或缓存格式变化时递增，使旧缓存全部失效
+    CHUNK_ROWS = 65536  # 每块的数据行数
+    INDEX_NAME = "index.json"
+
+    def __init__(self, directory="批量计算缓存", max_bytes=256 << 20):
         """
-        计算直接人工成本差异
-        公式：
-            差异 = 实际工资总额 - 标准工时 × 标准费率 × 产量
         参数:
-            cp_number (int): 产品数量
+            directory (str): 缓存目录
+            max_bytes (int): 缓存文件总大小上限（字节）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, self.INDEX_NAME)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    @staticmethod
+    def params_snapshot():
+        """
         返回:
-            float: 成本差异金额
+            bytes: 影响计算结果的全部设置（标准参数、差异类型公式、舍入规则）的规范化表示
         """
-        actual_wages = get_valid_input("实际支付工资总额(元): ", float, 0)
-        return actual_wages - cp_number * StandardParams.HOURS * StandardParams.LABOR_RATE
+        snapshot = {
+            "version": BatchCache.VERSION,
+            "params": {name: repr(float(getattr(StandardParams, name))) for name in PARAM_LABELS},
+            "types": [variance_type.to_dict() for variance_type in VARIANCE_TYPES.values()],
+            "rounding": MONEY_ROUNDING}
+        return json.dumps(snapshot, sort_keys=True).encode("utf-8")
 
     @staticmethod
-    def variable(cp_number):
+    def chunk_key(snapshot, header, chunk):
         """
-        计算变动制造费用差异
-        公式：
-            差异 = 实际费用 - 标准工时 × 标准费率 × 产量
         参数:
-            cp_number (int): 产品数量
+            snapshot (bytes): params_snapshot()的结果
+            header (bytes): 表头行原始字节
+            chunk (bytes): 块内全部数据行的原始字节
         返回:
-            float: 成本差异金额
+            str: 块的缓存键
         """
-        actual_cost = get_valid_input("实际发生变动制造费用(元): ", float, 0)
-        return actual_cost - cp_number * StandardParams.HOURS * StandardParams.VARIABLE_RATE
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (snapshot, header, chunk):
+            digest.update(struct.pack("<Q", len(part)))
+            digest.update(part)
+        return digest.hexdigest()
 
-    @staticmethod
-    def fixed(cp_number):
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
         """
-        计算固定制造费用差异
-        公式：
-            差异 = 实际费用 - 标准工时 × 标准费率 × 产量
+        查找缓存块的汇总信息
         参数:
-            cp_number (int): 产品数量
+            key (str): 缓存键
+        返回:
+            dict: 汇总信息，未命中（或结果文件已丢失）时返回None
+        """
+        entry = self.index.get(key)
+        if entry is None or not os.path.exists(self._path(key)):
+            return None
+        entry["used"] = time.time()
+        return entry["meta"]
+
+    def load(self, key):
+        """
+        读取缓存块的计算结果
         返回:
-            float: 成本差异金额
+            dict: 数组名 → 数组
         """
-        actual_cost = get_valid_input("实际发生固定制造费用(元): ", float, 0)
-        return actual_cost - cp_number * StandardParams.HOURS * StandardParams.FIXED_RATE
+        with np.load(self._path(key)) as data:
+            return {name: data[name] for name in data.files}
+
+    def put(self, key, arrays, meta):
+        """
+        保存一个块的计算结果和汇总信息
+        参数:
+            key (str): 缓存键
+            arrays (dict): 数组名 → 数组
+            meta (dict): 可JSON序列化的汇总信息
+        """
+        path = self._path(key)
+        temp_path = path + ".tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, path)
+        self.index[key] = {"size": os.path.getsize(path), "used": time.time(), "meta": meta}
+
+    def save(self):
+        """按大小上限淘汰最久未使用的块，并写回索引文件"""
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.index.pop(key)["size"]
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
 
 
-# ==================== 历史记录管理模块 ====================
-class HistoryManager:
+def compute_chunk(header, rows):
     """
-    历史记录管理类
-    功能：
-    1. 存储计算记录
-    2. 显示历史记录
-    3. 导出Excel文件
+    验证并计算一个数据块
+    参数:
+        header (list): 表头字段名
+        rows (list): csv.reader解析出的行
+    返回:
+        tuple: (计算结果数组字典, 汇总信息字典)
+    """
+    result = VARIANCE_VALIDATOR.validate(csv_columns(header, rows))
+    valid_rows, actual_cost, variance = calculate_batch(result)
+    codes = result.codes["计算类型"][valid_rows].astype(np.int64)
+    arrays = {
+        "rows": valid_rows,
+        "product": result.values["产品名称"][valid_rows].astype(str),
+        "quantity": result.values["生产数量"][valid_rows].astype(np.int64),
+        "calc_type": codes,
+        "variance": variance,
+        "actual_cost": actual_cost}
+    type_totals = group_sum(codes, variance, len(UNIT_STANDARD_COST))
+    meta = {
+        "rows": result.size,
+        "valid": len(valid_rows),
+        "type_totals": dict(zip(UNIT_STANDARD_COST, type_totals.tolist())),
+        "errors": result.summary(),
+        "row_errors": result.row_errors()}
+    return arrays, meta
+
+
+def written_rows(ledger, snapshot, header_bytes, position, key, lines):
+    """
+    数据块中已写入历史记录的行数
+    按 文件路径#块序号 查找登记，同一位置的块内容未变时全部已写入；文件追加行后最后一块变长，
+    登记过的前缀未变时只有之后的行是新增的。内容相同的其他文件或其他块不算已写入（缓存复用按内容，写入按位置）
+    参数:
+        ledger (dict): HistoryManager.batch_ledger
+        snapshot (bytes): BatchCache.params_snapshot()的结果
+        header_bytes (bytes): 表头行原始字节
+        position (str): 文件路径#块序号
+        key (str): 数据块的缓存键
+        lines (list): 数据块的各行原始字节
+    返回:
+        int: 已写入的行数（从块首开始连续）
+    """
+    entry = ledger.get(position)
+    if entry is None:
+        return 0
+    if entry[0] == key:
+        return len(lines)
+    if entry[1] < len(lines) and BatchCache.chunk_key(snapshot, header_bytes, b"".join(lines[:entry[1]])) == entry[0]:
+        return entry[1]
+    return 0
+
+
+def run_batch_job(filename, cache, history=None, report_limit=20):
     """
+    增量批量计算：逐块读取CSV，未变化的块复用缓存，其余块计算后写入缓存
+    整个文件计算成功后才写入历史记录，已写入过的块（及变长的最后一块中已写入的行）不重复写入
+    参数:
+        filename (str): CSV文件路径（首行为表头）
+        cache (BatchCache): 增量缓存
+        history (HistoryManager): 计算结果写入的历史记录，None表示只汇总不写入
+        report_limit (int): 错误明细最多保留的行数
+    返回:
+        SimpleNamespace: rows总行数, valid计算成功行数, type_totals各类型差异合计(分),
+                         errors错误统计, report错误明细, reused复用块数, computed计算块数, saved写入历史的记录数
+    异常:
+        OSError: 文件无法读取
+        UnicodeDecodeError: 文件不是UTF-8编码
+    """
+    snapshot = cache.params_snapshot()
+    summary = SimpleNamespace(rows=0, valid=0, type_totals=dict.fromkeys(UNIT_STANDARD_COST, 0), errors={},
+                              report=[], reused=0, computed=0, saved=0)
+    moment = datetime.now().replace(microsecond=0)
+    type_names = np.array(list(UNIT_STANDARD_COST), dtype=object)
+    path = os.path.abspath(filename)
+    pending, chunks = [], []  # 待写入历史记录的行和对应的数据块
+    try:
+        with open(filename, "rb") as f:
+            header_bytes = f.readline()
+            header = [name.strip() for name in next(csv.reader([header_bytes.decode("utf-8-sig")]), [])]
+            for number in itertools.count():
+                lines = list(itertools.islice(f, BatchCache.CHUNK_ROWS))
+                if not lines:
+                    break
+                chunk = b"".join(lines)
+                key = cache.chunk_key(snapshot, header_bytes, chunk)
+                meta = cache.get(key)
+                arrays = None
+                if meta is None:
+                    arrays, meta = compute_chunk(header, list(csv.reader(chunk.decode("utf-8").splitlines())))
+                    cache.put(key, arrays, meta)
+                    summary.computed += 1
+                else:
+                    summary.reused += 1
+                if history is not None:
+                    position = "{}#{}".format(path, number)
+                    written = written_rows(history.batch_ledger, snapshot, header_bytes, position, key, lines)
+                    if written < len(lines):
+                        chunks.append((position, key, len(lines)))
+                        if meta["valid"]:
+                            arrays = arrays or cache.load(key)
+                            new = arrays["rows"] >= written
+                            pending.extend(zip(
+                                arrays["product"][new].tolist(), arrays["quantity"][new].tolist(),
+                                type_names[arrays["calc_type"][new]].tolist(),
+                                to_yuan(arrays["variance"][new]).tolist(),
+                                to_yuan(arrays["actual_cost"][new]).tolist(), itertools.repeat(moment)))
+                for row, messages in meta["row_errors"]:
+                    if len(summary.report) < report_limit:
+                        summary.report.append("第{}行：{}".format(summary.rows + row + 1, "；".join(messages)))
+                for message, count in meta["errors"].items():
+                    summary.errors[message] = summary.errors.get(message, 0) + count
+                for name, total in meta["type_totals"].items():
+                    summary.type_totals[name] += total
+                summary.rows += meta["rows"]
+                summary.valid += meta["valid"]
+    finally:
+        cache.save()
+    if chunks:
+        summary.saved = history.add_batch(pending, chunks)
+    return summary
+
+
+def run_batch(history):
+    """
+    交互式CSV批量计算
+    CSV表头：产品名称,计算类型,生产数量,实际用量,实际单价,实际成本
+    直接材料行填写实际用量和实际单价，其余类型填写实际成本
+    """
+    filename = input("CSV文件路径: ").strip()
+    save = input("计算结果写入历史记录？(y/n，默认y): ").strip().lower() != "n"
+    started = time.perf_counter()
+    try:
+        summary = run_batch_job(filename, BatchCache(), history if save else None)
+    except OSError as e:
+        print("读取失败：{}".format(str(e)))
+        return
+    except UnicodeDecodeError as e:
+        print("读取失败：文件不是UTF-8编码")
+        return
+    elapsed = time.perf_counter() - started
+    print("\n共{}行，计算成功{}行，差异合计￥{}，耗时{:.3f}秒（复用缓存{}块，重新计算{}块）".format(
+        summary.rows, summary.valid, format_cents(sum(summary.type_totals.values())), elapsed,
+        summary.reused, summary.computed))
+    if save:
+        print("新写入历史记录{}条（此前已写入的行不重复写入）".format(summary.saved))
+    for name, total in summary.type_totals.items():
+        print("{:<20}￥{}".format(name, format_cents(total)))
+    if summary.errors:
+        print("【错误统计】")
+        for message, count in summary.errors.items():
+            print("{:<20}{}行".format(message, count))
+        print("【错误明细（前20行）】")
+        for line in summary.report:
+            print(line)
 
-    def __init__(self):
-        """初始化历史记录存储结构"""
-        self.records = []  # 存储字典格式的记录
-        self.headers = ["序号", "产品名称", "产品数量", "计算类型", "结果"]
 
-    def add_record(self, cp_name, cp_number, calc_type, result):
+# ==================== 实时监控模块 ====================
+class FileWatcher:
+    """
+    用inotify监视日志文件所在目录，日志文件被写入、截断、改名或创建时唤醒等待中的LogFollower
+    不支持inotify的平台（或监视失败）时available为False，wait退化为定时休眠
+    """
+    # IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENTS = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+    EVENT_HEADER = struct.Struct("iIII")  # struct inotify_event: wd, mask, cookie, len（其后为len字节的文件名）
+
+    def __init__(self, filename):
         """
-        添加新记录
         参数:
-            cp_name (str): 产品名称
-            cp_number (int): 产品数量
-            calc_type (str): 计算类型名称
-            result (float): 计算结果
+            filename (str): 日志文件路径（所在目录必须已存在）
         """
-        self.records.append({"产品名称": cp_name, "产品数量": cp_number, "计算类型": calc_type, "结果": result})
+        self.name = os.fsencode(os.path.basename(filename))
+        self.fd = None
+        self.loop = None
+        self.changed = asyncio.Event()
+        if not sys.platform.startswith("linux"):
+            return
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        directory = os.path.dirname(os.path.abspath(filename))
+        if libc.inotify_add_watch(fd, os.fsencode(directory), self.EVENTS) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    @property
+    def available(self):
+        return self.fd is not None
 
-    def show(self):
-        """格式化显示历史记录"""
-        print("\n【历史记录】")
-        # 使用format进行列对齐格式化
-        # {:<5}表示左对齐，占5字符宽度
-        print("{:<5}{:<10}{:<10}{:<20}{:<15}".format(*self.headers))
-        for idx, record in enumerate(self.records, 1):
-            print("{:<5}{:<10}{:<10}{:<20}{:<+15,.2f}".format(idx, record["产品名称"], record["产品数量"], record["计算类型"],
-                record["结果"]))
+    def start(self):
+        """在当前事件循环上登记inotify描述符（须在协程中调用）"""
+        if self.fd is not None:
+            self.loop = asyncio.get_running_loop()
+            self.loop.add_reader(self.fd, self._on_readable)
+
+    def _on_readable(self):
+        """读出全部事件，其中有日志文件的事件时置位changed"""
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                if data[offset:offset + length].rstrip(b"\0") == self.name:
+                    self.changed.set()
+                offset += length
+
+    async def wait(self, timeout):
+        """
+        等待日志文件变化，最长timeout秒（超时后仍由调用方检查一次文件，作为漏掉事件时的兜底）
+        参数:
+            timeout (float): 最长等待时间（秒）
+        """
+        if self.loop is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.changed.clear()
+
+    def close(self):
+        if self.fd is not None:
+            if self.loop is not None:
+                self.loop.remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = self.loop = None
+
+
+class LogFollower:
+    """
+    跟踪不断增长的生产日志（CSV或JSONL，按扩展名区分），以微批形式返回新增的完整行
+    - 每轮先检查文件状态，有新数据立即读取；没有新数据时等待FileWatcher的文件变化事件，
+      事件到达即读取，不支持inotify时即为定时轮询
+    - 等待时间最长POLL_INTERVAL秒，连续空闲超过IDLE_POLLS次后逐次加倍（最长MAX_POLL_INTERVAL），读到数据后恢复；
+      超时后也检查一次文件，漏掉事件或轮询时新行的延迟不超过MAX_POLL_INTERVAL
+    - 结束时先读完已写入的完整行
+    - 文件被轮转（路径指向新文件）时，先读完旧文件的剩余内容，再从头读取新文件
+    - 文件被截断（大小小于已读位置）时从头读取；CSV文件从头读取时重新解析表头
+    - 不完整的末行留到下次读取
+    """
+    POLL_INTERVAL = 0.01  # 刚读到数据后的等待间隔（秒）
+    MAX_POLL_INTERVAL = 0.04  # 持续空闲时的最长等待间隔（秒），不超过50毫秒的处理延迟要求
+    IDLE_POLLS = 5  # 间隔开始加倍前的连续空闲次数，数据持续到达时保持低延迟
+    READ_SIZE = 1 << 20  # 每批最多读取的字节数
 
-    def export_excel(self, filename="历史记录.xlsx"):
+    def __init__(self, filename, from_start=False):
         """
-        导出历史记录到Excel文件
         参数:
-            filename (str): 导出文件名
+            filename (str): 日志文件路径
+            from_start (bool): 是否处理文件中已有的行，否则只处理启动后新增的行
+        """
+        self.filename = filename
+        self.jsonl = os.path.splitext(filename)[1].lower() in (".jsonl", ".json")
+        self.from_start = from_start
+        self.file = None
+        self.identity = None
+        self.position = 0
+        self.pending = b""
+        self.header = None
+        self.skip_partial = False  # 从文件末尾开始跟踪时，丢弃第一个换行符之前的残行
+        self.bad_lines = 0  # 无法解析的JSONL行数
+        self.rotations = 0
+        self.truncations = 0
+
+    def _open(self, from_start):
+        """打开（或重新打开）日志文件；文件暂不存在时返回False"""
+        try:
+            f = open(self.filename, "rb")
+        except FileNotFoundError:
+            return False
+        if self.file is not None:
+            self.file.close()
+        stat = os.fstat(f.fileno())
+        self.file, self.identity = f, (stat.st_dev, stat.st_ino)
+        self.pending, self.header, self.position, self.skip_partial = b"", None, 0, False
+        if not from_start and stat.st_size:
+            if not self.jsonl:
+                self._parse_header(f.readline())
+            if stat.st_size > f.tell():
+                f.seek(stat.st_size - 1)
+                self.skip_partial = f.read(1) != b"\n"
+            self.position = f.tell()
+        return True
+
+    def _parse_header(self, line):
+        self.header = [name.strip() for name in next(csv.reader([line.decode("utf-8-sig")]), [])]
+
+    def _check_file(self):
+        """
+        检查轮转和截断
         返回:
-            bool: 导出是否成功
+            bool: 是否已切换到新文件或从头读取（需要立即再读一次）
         """
         try:
-            wb = Workbook()
-            ws = wb.active
-
-            # 设置标题行
-            ws.append(self.headers)
-
-            # 填充数据行
-            for idx, record in enumerate(self.records, 1):
-                ws.append([idx, record["产品名称"], record["产品数量"], record["计算类型"], record["结果"]])
-
-            # 自动调整列宽（需要openpyxl 2.6+）
-            for column in ws.columns:
-                max_length = 0
-                column = [cell for cell in column]
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                ws.column_dimensions[column[0].column_letter].width = adjusted_width
-
-            wb.save(filename)
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return False  # 轮转过程中旧文件已改名、新文件尚未创建，继续读旧文件
+        if (stat.st_dev, stat.st_ino) != self.identity:
+            if self._open(True):
+                self.rotations += 1
+                return True
+        elif stat.st_size < self.position:
+            self.file.seek(0)
+            self.pending, self.header, self.position, self.skip_partial = b"", None, 0, False
+            self.truncations += 1
             return True
-        except Exception as e:
-            print("导出失败：{}".format(str(e)))
-            return False
+        return False
+
+    def _read_lines(self):
+        """读取新增数据，返回完整行（字节串）列表"""
+        data = self.file.read(self.READ_SIZE)
+        if not data:
+            return []
+        self.position += len(data)
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        if self.skip_partial:
+            lines, self.skip_partial = lines[1:], False
+        return [line for line in lines if line.strip()]
+
+    def _columns(self, lines):
+        """
+        完整行转换为列，供VARIANCE_VALIDATOR验证
+        参数:
+            lines (list): 完整行（字节串）列表
+        返回:
+            dict: 字段名 → 原始值列表；没有数据行时返回None
+        """
+        if self.jsonl:
+            records = []
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    records.append(record)
+                else:
+                    self.bad_lines += 1
+            if not records:
+                return None
+            # 缺少的字段和null按空单元格处理
+            return {name: ["" if record.get(name) is None else record[name] for record in records]
+                    for name, _, _, _, _ in variance_fields()}
+        if self.header is None:
+            self._parse_header(lines[0])
+            lines = lines[1:]
+        if not lines:
+            return None
+        return csv_columns(self.header, list(csv.reader(line.decode("utf-8", "replace") for line in lines)))
+
+    def _interval(self, idle):
+        """连续空闲idle次后的等待间隔（秒）"""
+        if idle < self.IDLE_POLLS:
+            return self.POLL_INTERVAL
+        return min(self.POLL_INTERVAL * 2 ** (idle - self.IDLE_POLLS + 1), self.MAX_POLL_INTERVAL)
+
+    async def batches(self, stop=None):
+        """
+        异步逐批返回新增行
+        参数:
+            stop (asyncio.Event): 置位后结束跟踪，None表示一直跟踪
+        返回:
+            异步迭代器，每项为 字段名 → 原始值列表 的字典
+        """
+        idle = 0  # 连续空闲次数
+        watcher = FileWatcher(self.filename)
+        watcher.start()
+        try:
+            if not self._open(self.from_start):
+                # 文件尚未创建：创建后的全部行都是新增行
+                while not self._open(True):
+                    await watcher.wait(self._interval(idle))
+                    idle += 1
+            while stop is None or not stop.is_set():
+                position = self.position
+                lines = self._read_lines()
+                if lines:
+                    idle = 0
+                    columns = self._columns(lines)
+                    if columns is not None:
+                        yield columns
+                    await asyncio.sleep(0)  # 数据持续到达时也让出事件循环
+                elif self.position != position or self._check_file():
+                    idle = 0
+                else:
+                    await watcher.wait(self._interval(idle))
+                    idle += 1
+            # 结束前读完已写入的完整行
+            lines = self._read_lines()
+            while lines:
+                columns = self._columns(lines)
+                if columns is not None:
+                    yield columns
+                lines = self._read_lines()
+        finally:
+            watcher.close()
+            if self.file is not None:
+                self.file.close()
+
+
+class SlidingWindow:
+    """
+    一个产品在一个时间窗口内的差异累计
+    每个微批只入队一项（该批内该产品的合计），每项只入队、出队各一次，更新的均摊代价为O(1)
+    """
+    __slots__ = ("length", "entries", "total", "count", "alerted")
+
+    def __init__(self, length):
+        """
+        参数:
+            length (float): 窗口长度（秒）
+        """
+        self.length = length
+        self.entries = deque()  # (时刻, 差异合计(分), 行数)
+        self.total = 0
+        self.count = 0
+        self.alerted = False  # 窗口合计是否已超过阈值（只在越过阈值时告警一次）
+
+    def add(self, moment, total, count):
+        self.entries.append((moment, total, count))
+        self.total += total
+        self.count += count
+        self.expire(moment)
+
+    def expire(self, moment):
+        """移除窗口之外的项"""
+        start = moment - self.length
+        entries = self.entries
+        while entries and entries[0][0] <= start:
+            _, total, count = entries.popleft()
+            self.total -= total
+            self.count -= count
+
+
+def format_window(length):
+    """窗口长度（秒）格式化为"5分钟"等文字"""
+    for unit, seconds in (("小时", 3600), ("分钟", 60)):
+        if length >= seconds and length % seconds == 0:
+            return "{}{}".format(int(length // seconds), unit)
+    return "{:g}秒".format(length)
+
+
+class LiveMonitor:
+    """
+    实时差异监控：微批计算新增行的成本差异，按产品更新滑动窗口合计，超过阈值时告警
+    - 单笔告警：单行差异绝对值达到row_threshold
+    - 窗口告警：某产品窗口内差异合计的绝对值从阈值以下越过window_threshold（回落后再次越过时重新告警）
+    窗口按处理时刻（单调时钟）计算
+    写入历史记录的行先放入pending，由follow_log在事件循环之外批量写入
+    """
+    ALERT_LIMIT = 20  # 每个微批最多输出的单笔告警条数
+
+    def __init__(self, windows=(300, 3600), row_threshold=None, window_threshold=None, history=None, alert=print):
+        """
+        参数:
+            windows (tuple): 滑动窗口长度（秒），必须为正数
+            row_threshold (float): 单笔差异告警阈值（元），None表示不告警
+            window_threshold (float): 窗口差异合计告警阈值（元），None表示不告警
+            history (HistoryManager): 计算结果写入的历史记录，None表示不写入
+            alert (callable): 接收告警文字的函数
+        异常:
+            ValueError: 窗口长度不是正数
+        """
+        if not windows or any(length <= 0 for length in windows):
+            raise ValueError("滑动窗口长度必须为正数：{}".format(windows))
+        self.lengths = tuple(windows)
+        self.row_threshold = None if row_threshold is None else to_cents(row_threshold)
+        self.window_threshold = None if window_threshold is None else to_cents(window_threshold)
+        self.history = history
+        self.pending = []  # 待写入历史记录的行
+        self.alert = alert
+        self.windows = {}  # 产品名称 → [SlidingWindow, ...]
+        self.rows = 0
+        self.invalid = 0
+        self.alerts = 0
+        self.type_names = np.array(list(VARIANCE_TYPES), dtype=object)
+
+    def _emit(self, text):
+        self.alerts += 1
+        self.alert("[{}] 告警 {}".format(datetime.now().strftime("%H:%M:%S"), text))
+
+    def process(self, columns, moment=None):
+        """
+        处理一个微批
+        参数:
+            columns (dict): 字段名 → 原始值列表
+            moment (float): 处理时刻（单调时钟秒数），缺省为当前时刻
+        返回:
+            int: 计算成功的行数
+        """
+        moment = time.monotonic() if moment is None else moment
+        result = VARIANCE_VALIDATOR.validate(columns)
+        rows, actual_cost, variance = calculate_batch(result)
+        self.rows += result.size
+        self.invalid += result.size - len(rows)
+        if not len(rows):
+            return 0
+        products = result.values["产品名称"][rows].astype(str)
+        codes = result.codes["计算类型"][rows]
+        if self.history is not None:
+            self.pending.extend(zip(
+                products.tolist(), result.values["生产数量"][rows].astype(np.int64).tolist(),
+                self.type_names[codes].tolist(), to_yuan(variance).tolist(), to_yuan(actual_cost).tolist(),
+                itertools.repeat(datetime.now().replace(microsecond=0))))
+        if self.row_threshold is not None:
+            flagged = np.flatnonzero(np.abs(variance) >= self.row_threshold)
+            for index in flagged[:self.ALERT_LIMIT].tolist():
+                self._emit("{} {} 单笔差异￥{} 超过阈值￥{}".format(
+                    products[index], self.type_names[codes[index]], format_cents(variance[index]),
+                    format_cents(self.row_threshold, signed=False)))
+            if len(flagged) > self.ALERT_LIMIT:
+                self._emit("本批另有{}笔差异超过阈值".format(len(flagged) - self.ALERT_LIMIT))
+        # 先按产品合计，每个产品每批只更新一次窗口
+        names, inverse = np.unique(products, return_inverse=True)
+        totals = group_sum(inverse, variance, len(names))
+        counts = np.bincount(inverse)
+        for name, total, count in zip(names.tolist(), totals.tolist(), counts.tolist()):
+            windows = self.windows.get(name)
+            if windows is None:
+                windows = self.windows[name] = [SlidingWindow(length) for length in self.lengths]
+            for window in windows:
+                window.add(moment, total, count)
+                if self.window_threshold is None:
+                    continue
+                exceeded = abs(window.total) >= self.window_threshold
+                if exceeded and not window.alerted:
+                    self._emit("{} 近{}差异合计￥{} 超过阈值￥{}".format(
+                        name, format_window(window.length), format_cents(window.total),
+                        format_cents(self.window_threshold, signed=False)))
+                window.alerted = exceeded
+        return len(rows)
+
+    def take_pending(self):
+        """
+        返回:
+            list: 待写入历史记录的行（取出后清空）
+        """
+        rows, self.pending = self.pending, []
+        return rows
+
+    def flush(self):
+        """在当前线程写入全部待写入的行（事件循环结束后调用）"""
+        if self.history is not None:
+            self.history.add_records(self.take_pending())
+
+    def snapshot(self, moment=None):
+        """
+        当前各产品的窗口汇总（先移除过期项）
+        返回:
+            dict: 产品名称 → [(窗口差异合计(分), 行数), ...]，与windows顺序对应
+        """
+        moment = time.monotonic() if moment is None else moment
+        summary = {}
+        for name, windows in self.windows.items():
+            for window in windows:
+                window.expire(moment)
+            summary[name] = [(window.total, window.count) for window in windows]
+        return summary
+
+
+async def follow_log(filename, monitor, from_start=False, stop=None, status_interval=10):
+    """
+    跟踪日志并实时处理新增行
+    参数:
+        filename (str): 日志文件路径
+        monitor (LiveMonitor): 实时监控器
+        from_start (bool): 是否处理文件中已有的行
+        stop (asyncio.Event): 置位后结束，None表示一直运行
+        status_interval (float): 输出处理进度的间隔（秒），None表示不输出
+    返回:
+        LogFollower: 跟踪器（含轮转、截断次数和无法解析的行数）
+    注意:
+        结束后应调用monitor.flush()写入尚未写入历史记录的行
+    """
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    async def write_history():
+        # 历史文件写入是阻塞I/O，放到线程池执行；写入期间到达的行在下一次合并写入，保持顺序
+        while True:
+            await wake.wait()
+            wake.clear()
+            rows = monitor.take_pending()
+            if rows:
+                await loop.run_in_executor(None, monitor.history.add_records, rows)
+
+    follower = LogFollower(filename, from_start)
+    writer = asyncio.create_task(write_history()) if monitor.history is not None else None
+    last_status = time.monotonic()
+    try:
+        async for columns in follower.batches(stop):
+            monitor.process(columns)
+            if monitor.pending:
+                wake.set()
+            if status_interval is not None and time.monotonic() - last_status >= status_interval:
+                last_status = time.monotonic()
+                print("已处理{}行（验证失败{}行），产品{}个，告警{}次".format(
+                    monitor.rows, monitor.invalid, len(monitor.windows), monitor.alerts))
+    finally:
+        if writer is not None:
+            # 正在执行的写入由线程池完成；剩余的行由调用方在事件循环结束后用monitor.flush()写入
+            writer.cancel()
+    return follower
+
+
+def run_follow(history):
+    """交互式实时监控，按Ctrl+C结束并输出各产品的窗口汇总"""
+    filename = input("日志文件路径(.csv/.jsonl): ").strip()
+    if not filename:
+        print("文件路径不能为空")
+        return
+    row_threshold = get_optional_input("单笔差异告警阈值(元，直接回车不告警): ")
+    window_threshold = get_optional_input("窗口差异合计告警阈值(元，直接回车不告警): ")
+    minutes = get_optional_input("滑动窗口长度(分钟，默认5和60): ")
+    while minutes is not None and minutes <= 0:
+        print("窗口长度必须大于0")
+        minutes = get_optional_input("滑动窗口长度(分钟，默认5和60): ")
+    windows = (minutes * 60,) if minutes else (300, 3600)
+    from_start = input("处理文件中已有的行？(y/n，默认n): ").strip().lower() == "y"
+    if history.store is not None:
+        save = input("计算结果写入历史文件？(y/n，默认y): ").strip().lower() != "n"
+    else:
+        # 未打开历史文件时记录只能保存在内存中，长时间监控会持续占用内存，默认不写入
+        save = input("计算结果写入内存中的历史记录？(y/n，默认n): ").strip().lower() == "y"
+    monitor = LiveMonitor(windows, row_threshold, window_threshold, history if save else None,
+                          alert=lambda text: print("\033[31m{}\033[0m".format(text)))
+    print("开始监控 {}，按Ctrl+C结束".format(filename))
+    try:
+        asyncio.run(follow_log(filename, monitor, from_start))
+    except KeyboardInterrupt:
+        pass
+    monitor.flush()  # asyncio.run已等待线程池中的写入完成
+    print("\n共处理{}行（验证失败{}行），告警{}次".format(monitor.rows, monitor.invalid, monitor.alerts))
+    titles = "".join("{:>18}".format("近" + format_window(length)) for length in monitor.lengths)
+    print("{:<12}{}".format("产品名称", titles))
+    for name, values in sorted(monitor.snapshot().items()):
+        print("{:<12}{}".format(name, "".join("{:>18}".format(format_cents(total)) for total, _ in values)))
+
+
+# ==================== 金额运算性能测试模块 ====================
+def benchmark_money(count=1000000, decimal_count=100000, seed=0):
+    """
+    比较浮点数、整数分和decimal.Decimal三种方式计算成本差异并汇总的速度与结果
+    每种方式都计算 差异 = 实际成本 - 产量 × 单位标准成本 并求合计，Decimal较慢，只计算前decimal_count条
+    参数:
+        count (int): 记录数
+        decimal_count (int): Decimal方式计算的记录数
+        seed (int): 随机数种子
+    返回:
+        list: [(方式, 每百万条耗时(秒), 合计(元，字符串)), ...]
+    """
+    rng = np.random.default_rng(seed)
+    actual_cost = rng.integers(0, 10000000, count) / CENTS_PER_YUAN  # 整分金额
+    quantity = rng.integers(1, 1000, count)
+    unit_cost = UNIT_STANDARD_COST["直接材料成本差异"](StandardParams)
+    results = []
+
+    started = time.perf_counter()
+    total = float(np.sum(actual_cost - quantity * unit_cost))
+    results.append(("浮点数", (time.perf_counter() - started) * 1e6 / count, "{:+,.2f}".format(total)))
+
+    started = time.perf_counter()
+    total = int(np.sum(to_cents(actual_cost) - to_cents(quantity * unit_cost)))
+    results.append(("整数分", (time.perf_counter() - started) * 1e6 / count, format_cents(total)))
+
+    started = time.perf_counter()
+    cent = decimal.Decimal("0.01")
+    unit = decimal.Decimal(repr(unit_cost)).quantize(cent, decimal.ROUND_HALF_UP)
+    total = sum((decimal.Decimal(repr(cost)) - quantity_value * unit).quantize(cent, decimal.ROUND_HALF_UP)
+                for cost, quantity_value in zip(actual_cost[:decimal_count].tolist(),
+                                                quantity[:decimal_count].tolist()))
+    results.append(("Decimal", (time.perf_counter() - started) * 1e6 / decimal_count, "{:+,}".format(total)))
+    # 与Decimal核对同样记录数的整数分合计
+    check = int(np.sum(to_cents(actual_cost[:decimal_count]) - to_cents(quantity[:decimal_count] * unit_cost)))
+    results.append(("整数分（前{}条）".format(decimal_count), None, format_cents(check)))
+    return results
+
+
+def run_money_benchmark(count=1000000):
+    """
+    运行金额运算性能测试并打印结果（开发用，通过命令行参数 --benchmark-money 启动，不在菜单中）
+    参数:
+        count (int): 测试记录数
+    """
+    print("\n{:<20}{:<18}{}".format("方式", "每百万条耗时(秒)", "差异合计(元)"))
+    for name, seconds, total in benchmark_money(count, min(count, 100000)):
+        print("{:<20}{:<18}{}".format(name, "" if seconds is None else "{:.4f}".format(seconds), total))
+
+
+# ==================== 敏感性分析模块 ====================
+def run_sensitivity(history):
+    """
+    交互式敏感性分析
+    1. 显示各参数上下浮动10%的龙卷风排序
+    2. 选择两个参数及其取值范围，显示总差异曲面的极值
+    """
+    if not history.records:
+        print("暂无历史记录，无法进行敏感性分析")
+        return
+    analyzer = SensitivityAnalyzer(history)
+    print("\n【敏感性分析】当前参数下总差异：￥{:+,.2f}".format(analyzer.baseline()))
+    print("{:<10}{:<18}{:<18}{:<15}".format("参数", "下浮10%", "上浮10%", "波动幅度"))
+    for name, low, high, swing in analyzer.tornado():
+        print("{:<10}{:<+18,.2f}{:<+18,.2f}{:<15,.2f}".format(PARAM_LABELS[name], low, high, swing))
+
+    names = list(PARAM_LABELS)
+    for idx, name in enumerate(names, 1):
+        print("{}. {}".format(idx, PARAM_LABELS[name]))
+    x_name = names[get_valid_input("横轴参数编号: ", int, 1, len(names)) - 1]
+    y_name = names[get_valid_input("纵轴参数编号: ", int, 1, len(names)) - 1]
+    if x_name == y_name:
+        print("两个分析参数不能相同")
+        return
+    axes = []
+    for name in (x_name, y_name):
+        low = get_valid_input("{}最小值: ".format(PARAM_LABELS[name]), float, 0)
+        high = get_valid_input("{}最大值: ".format(PARAM_LABELS[name]), float, low)
+        axes.append((low, high))
+    steps = get_valid_input("每个参数的取值点数: ", int, 2, 5000)
+    x_values = np.linspace(axes[0][0], axes[0][1], steps)
+    y_values = np.linspace(axes[1][0], axes[1][1], steps)
+    surface = analyzer.grid(x_name, x_values, y_name, y_values)
+
+    for title, flat_idx in (("最小总差异", surface.argmin()), ("最大总差异", surface.argmax())):
+        row, col = np.unravel_index(flat_idx, surface.shape)
+        print("{}: ￥{:+,.2f}（{}={:.4g}，{}={:.4g}）".format(
+            title, surface[row, col], PARAM_LABELS[x_name], x_values[col], PARAM_LABELS[y_name], y_values[row]))
+    print("有利差异(≤0)的参数组合占比: {:.1%}".format(np.mean(surface <= 0)))
 
 
 # ==================== 主程序模块 ====================
-def main():
+def main(history_file=None):
     """
     主程序入口函数
     功能：
     1. 显示系统菜单
     2. 处理用户输入
     3. 协调各模块工作
+    参数:
+        history_file (str): 二进制历史文件路径，缺省时历史记录只保存在内存中
     """
-    history = HistoryManager()  # 初始化历史记录管理器
-    calc_map = {  # 计算类型映射表
-        '1': ("直接材料成本差异", CostCalculator.material), '2': ("直接人工标准成本差异", CostCalculator.labor),
-        '3': ("变动制造费用成本差异", CostCalculator.variable), '4': ("固定制造费用成本差异", CostCalculator.fixed)}
+    try:
+        history = HistoryManager(history_file)  # 初始化历史记录管理器
+    except (OSError, ValueError) as e:
+        print("打开历史文件失败：{}".format(str(e)))
+        return
+    if os.path.exists(VARIANCE_TYPES_FILE):
+        try:
+            print("已加载{}种自定义差异类型".format(load_variance_types()))
+        except (OSError, ValueError) as e:
+            print("加载自定义差异类型失败：{}".format(str(e)))
 
     while True:  # 主循环保持程序持续运行
+        # 计算类型映射表（按注册顺序编号，包括自定义类型）
+        calc_map = {str(key): type_name for key, type_name in enumerate(VARIANCE_TYPES, 1)}
         # 显示系统菜单
         print("\n{:=^30}".format(" 标准成本差异计算系统 "))
         # 打印计算类型选项
-        for key in sorted(calc_map.keys()):
-            print("{}. {}".format(key, calc_map[key][0]))
+        for key, type_name in calc_map.items():
+            print("{}. {}".format(key, type_name))
         # 打印系统功能选项
         print("{:<3}{}".format("q", "退出系统"))
         print("{:<3}{}".format("l", "查看历史记录"))
         print("{:<3}{}".format("c", "查看初始参数"))
         print("{:<3}{}".format("s", "导出历史记录"))
+        print("{:<3}{}".format("a", "参数敏感性分析"))
+        print("{:<3}{}".format("i", "导入Excel历史记录"))
+        print("{:<3}{}".format("f", "筛选历史记录"))
+        print("{:<3}{}".format("r", "生成月度差异报表"))
+        print("{:<3}{}".format("b", "CSV批量计算"))
+        print("{:<3}{}".format("d", "自定义差异类型"))
+        print("{:<3}{}".format("t", "实时监控生产日志"))
 
         # 获取用户输入
         choice = input("\n请选择操作编号: ").strip().lower()
@@ -254,26 +1194,58 @@ def main():
 
         # 显示历史记录
         elif choice == 'l':
-            history.show()
+            show_history(history)
 
         # 显示参数配置
         elif choice == 'c':
             print("\n【系统参数配置】")
-            params = [("标准工时", StandardParams.HOURS), ("标准材料用量", StandardParams.MATERIAL_USAGE),
-                ("标准材料单价", StandardParams.MATERIAL_PRICE), ("标准人工费率", StandardParams.LABOR_RATE),
-                ("变动制造费率", StandardParams.VARIABLE_RATE), ("固定制造费率", StandardParams.FIXED_RATE)]
             # 使用format对齐参数显示
-            for name, value in params:
-                print("{:<10}: {:<8}".format(name, value))
+            for attr_name, name in PARAM_LABELS.items():
+                print("{:<10}: {:<8}".format(name, getattr(StandardParams, attr_name)))
 
         # 导出Excel处理
         elif choice == 's':
-            if history.export_excel():
+            try:
+                history.export_excel()
                 print("成功导出到 历史记录.xlsx")
+            except Exception as e:
+                print("导出失败：{}".format(str(e)))
+
+        # 参数敏感性分析
+        elif choice == 'a':
+            run_sensitivity(history)
+
+        # 筛选历史记录
+        elif choice == 'f':
+            run_query(history)
+
+        # 生成月度差异报表
+        elif choice == 'r':
+            run_report(history)
+
+        # CSV批量计算
+        elif choice == 'b':
+            run_batch(history)
+
+        # 自定义差异类型
+        elif choice == 'd':
+            run_define_type()
+
+        # 实时监控生产日志
+        elif choice == 't':
+            run_follow(history)
+
+        # 导入Excel历史记录
+        elif choice == 'i':
+            filename = input("Excel文件名(默认 历史记录.xlsx): ").strip() or "历史记录.xlsx"
+            try:
+                print("成功导入{}条记录".format(history.import_excel(filename)))
+            except Exception as e:
+                print("导入失败：{}".format(str(e)))
 
         # 执行成本计算
         elif choice in calc_map:
-            type_name, calculator = calc_map[choice]
+            type_name = calc_map[choice]
 
             try:
                 # 获取产品信息
@@ -285,13 +1257,13 @@ def main():
                 cp_number = int(get_valid_input("生产数量(件): ", int, 1))
 
                 # 执行计算并存储结果
-                result = calculator(cp_number)
+                result = CostCalculator.calculate(type_name, cp_number)
                 history.add_record(cp_name, cp_number, type_name, result)
 
                 # 显示计算结果
                 print("\n{0} {1}:".format(cp_name, type_name))
                 # 使用ANSI转义码显示绿色文本，+号显示正负
-                print("\033[32m￥{:+,.2f}\033[0m".format(result))
+                print("\033[32m￥{}\033[0m".format(format_cents(to_cents(result))))
                 print("{:=^30}".format(""))  # 分隔线
 
             except Exception as e:
@@ -308,5 +1280,10 @@ if __name__ == "__main__":
     程序入口点说明：
     当直接运行本脚本时，执行main()函数
     当被其他模块导入时，不自动执行
+    命令行第一个参数为二进制历史文件路径（可选）
+    开发用：--benchmark-money [记录数] 运行金额运算性能测试后退出
     """
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark-money":
+        run_money_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
+    else:
+        main(sys.argv[1] if len(sys.argv) > 1 else None)
\ No newline at end of file
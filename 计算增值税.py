@@ -1,13 +1,22 @@
-def Value_added_tax(amount,rate=0.13):
+import numpy as np
+
+from money import ROUND_HALF_UP,round_cents
+
+ROUNDING=ROUND_HALF_UP#舍入规则：ROUND_HALF_UP四舍五入，ROUND_HALF_EVEN银行家舍入（见money.py）
+
+
+def Value_added_tax(amount,rate=0.13,rounding=ROUNDING):
     '''
-    定义计算增值税的函数
+    定义计算增值税的函数（以整数分计算，amount可为numpy数组）
     :param amount: 不含税金额
     :param rate: 税率（默认13%）
+    :param rounding: 舍入规则（默认四舍五入）
     :return: 税额，含税价
     '''
-    tax=amount*rate#税额=不含税金额*税率
-    Tax_inclusive=amount+tax#含税价=不含税价+税额
-    return round(tax,2),round(Tax_inclusive,2)
+    amount=round_cents(np.asarray(amount,dtype=float)*100,rounding)#不含税金额（分）
+    tax=round_cents(amount*rate,rounding)#税额=不含税金额*税率
+    Tax_inclusive=amount+tax#含税价=不含税价+税额，整数分相加没有误差
+    return tax/100,Tax_inclusive/100
 
 t=float(input("请输入不含税价（单位：元）："))
 print('(税额,含税价)')